@@ -4,10 +4,15 @@
 Launch the minder3D application
 """
 
+import logging
+import os
+
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QColor, QPalette
 from PySide6.QtWidgets import QApplication
 
+from .lib.sovCapabilities import start_capability_probe
+from .lib.sovComputeSettings import ComputeSettings, apply_compute_config
 from .minder3DWindow import Minder3DWindow
 from .parse_args import parse_args
 
@@ -22,6 +27,17 @@ def main():
 
     app = QApplication()
 
+    compute_settings = ComputeSettings()
+    compute_config = compute_settings.get_data()
+    for key in compute_config:
+        value = getattr(cli_args, key)
+        if value is not None:
+            compute_config[key] = value
+    if cli_args.save_compute_settings:
+        compute_settings.add_data(**compute_config)
+    apply_compute_config(**compute_config)
+    start_capability_probe()
+
     minder3D = Minder3DWindow()
 
     palette = QPalette()
@@ -55,6 +71,12 @@ def main():
 
     app.exec()
 
+    # Tasks still running after closing the window are not waited for,
+    # since their threads block the exit until they finish.
+    if not minder3D.task_runner.wait_for_done(0):
+        logging.shutdown()
+        os._exit(0)
+
 
 if __name__ == '__main__':
     main()
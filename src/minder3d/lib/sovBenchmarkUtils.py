@@ -0,0 +1,474 @@
+"""Benchmarks of the processing operations.
+
+Each benchmark is a sub-command, e.g.:
+
+    python -m minder3d.lib.sovBenchmarkUtils threads --threads 1 2 4 8
+
+Benchmarks run on the image given by --image or, by default, on a synthetic
+image, and print a table of their timings.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import itk
+import numpy as np
+
+from .sovCapabilities import get_capabilities
+from .sovImageProcessLogic import INTERPOLATORS, ImageProcessLogic
+from .sovOtsuLogic import OtsuLogic
+from .sovTotalSegmentatorLogic import TotalSegmentatorLogic
+from .sovTotalSegmentatorSession import TotalSegmentatorSession
+
+
+def make_test_image(size=(256, 256, 128), spacing=(0.7, 0.7, 2.0), seed=0):
+    """Make a synthetic CT-like image of blobs on a noisy background.
+
+    Args:
+        size (tuple?): The (x, y, z) size of the image.
+        spacing (tuple?): The (x, y, z) spacing of the image.
+        seed (int?): The seed of the random number generator.
+
+    Returns:
+        The float ITK image.
+    """
+    rng = np.random.default_rng(seed)
+    z, y, x = np.meshgrid(
+        np.linspace(-1, 1, size[2]),
+        np.linspace(-1, 1, size[1]),
+        np.linspace(-1, 1, size[0]),
+        indexing='ij',
+    )
+    arr = np.full(z.shape, -1000.0, dtype=np.float32)
+    arr[x**2 + y**2 + z**2 < 0.8] = 40.0
+    for _ in range(8):
+        c = rng.uniform(-0.5, 0.5, 3)
+        r = rng.uniform(0.05, 0.2)
+        inside = (x - c[0]) ** 2 + (y - c[1]) ** 2 + (z - c[2]) ** 2 < r**2
+        arr[inside] = rng.uniform(100, 1000)
+    arr += rng.normal(0, 20, arr.shape).astype(np.float32)
+    img = itk.GetImageFromArray(arr)
+    img.SetSpacing(spacing)
+    return img
+
+
+def load_benchmark_image(filename=None):
+    """Load the image given on the command line or make a synthetic one."""
+    if filename is None:
+        return make_test_image()
+    return itk.imread(filename, itk.F)
+
+
+def time_call(func, *args, repeats=3, **kwargs):
+    """Time a function call.
+
+    Args:
+        func (function): The function to be timed.
+        repeats (int?): The number of calls.  Defaults to 3.
+
+    Returns:
+        float: The fastest time of the calls, in seconds.
+    """
+    times = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        func(*args, **kwargs)
+        times.append(time.perf_counter() - start_time)
+    return min(times)
+
+
+def print_table(header, rows):
+    """Print the rows of a benchmark as an aligned table."""
+    rows = [[str(v) for v in row] for row in rows]
+    widths = [
+        max([len(header[i])] + [len(row[i]) for row in rows])
+        for i in range(len(header))
+    ]
+    print('  '.join(h.ljust(w) for h, w in zip(header, widths)))
+    print('  '.join('-' * w for w in widths))
+    for row in rows:
+        print('  '.join(v.ljust(w) for v, w in zip(row, widths)))
+
+
+def benchmark_thread_scaling(image, thread_counts, repeats=3):
+    """Time make_iso, median_filter, and Otsu over a range of thread counts.
+
+    The thread count of each operation is set using its per-operation
+    override, so the global compute settings are left unchanged.
+
+    Args:
+        image: The input image.
+        thread_counts (list): The numbers of threads to be timed.
+        repeats (int?): The number of calls per timing.  Defaults to 3.
+
+    Returns:
+        list: The (operation, threads, seconds, speedup) rows.
+    """
+    image_process_logic = ImageProcessLogic()
+    otsu_logic = OtsuLogic()
+    operations = [
+        ('make_iso', image_process_logic.make_iso, [1.0]),
+        ('median_filter', image_process_logic.median_filter, [2]),
+        ('otsu', otsu_logic.run, [2]),
+    ]
+    rows = []
+    for name, func, args in operations:
+        base_seconds = None
+        for threads in thread_counts:
+            seconds = time_call(
+                func,
+                image,
+                *args,
+                repeats=repeats,
+                number_of_threads=threads,
+            )
+            if base_seconds is None:
+                base_seconds = seconds
+            rows.append(
+                [name, threads, f'{seconds:.3f}', f'{base_seconds/seconds:.2f}']
+            )
+    return rows
+
+
+def get_peak_memory_mb():
+    """Get the peak resident memory of this process, in MB."""
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / 2**20
+    return peak / 2**10
+
+
+def run_median_variant(image_filename, radius, variant, slab_thickness):
+    """Run one variant of the median filter and print its time and memory.
+
+    This is run in its own process by benchmark_median_memory(), so the
+    peak memory of each variant is measured separately.
+    """
+    image = itk.imread(image_filename, itk.F)
+    base_memory = get_peak_memory_mb()
+    logic = ImageProcessLogic()
+    start_time = time.perf_counter()
+    if variant == 'whole':
+        logic.median_filter(image, radius, tiled=False)
+    else:
+        logic.median_filter(
+            image, radius, tiled=True, slab_thickness=slab_thickness
+        )
+    seconds = time.perf_counter() - start_time
+    print(f'{seconds} {get_peak_memory_mb() - base_memory}')
+
+
+def run_benchmark_process(image_filename, benchmark_args):
+    """Run a hidden benchmark sub-command in a new process.
+
+    Args:
+        image_filename (str): The image read by the sub-command.
+        benchmark_args (list): The sub-command and its arguments.
+
+    Returns:
+        tuple: The seconds and peak MB printed by the sub-command.
+    """
+    result = subprocess.run(
+        [sys.executable, '-m', __spec__.name, '--image', image_filename]
+        + [str(arg) for arg in benchmark_args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    seconds, peak_mb = result.stdout.split()[-2:]
+    return float(seconds), float(peak_mb)
+
+
+def benchmark_median_memory(image, radius, slab_thicknesses):
+    """Compare the time and peak memory of whole and tiled median filters.
+
+    Each variant runs in a new process that reads the image from a
+    temporary file, and reports the growth of its peak resident memory
+    during filtering.
+
+    Args:
+        image: The input image.
+        radius (int): The radius of the median filter.
+        slab_thicknesses (list): The slab thicknesses of the tiled variants.
+
+    Returns:
+        list: The (variant, seconds, peak MB) rows.
+    """
+    variants = [('whole', 0)] + [('tiled', t) for t in slab_thicknesses]
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_filename = os.path.join(tmp_dir, 'image.mha')
+        itk.imwrite(image, image_filename)
+        for variant, slab_thickness in variants:
+            seconds, peak_mb = run_benchmark_process(
+                image_filename,
+                [
+                    'median-run',
+                    '--radius',
+                    radius,
+                    '--variant',
+                    variant,
+                    '--slab-thickness',
+                    slab_thickness,
+                ],
+            )
+            if variant == 'tiled':
+                variant = f'tiled ({slab_thickness} slices)'
+            rows.append([variant, f'{seconds:.3f}', f'{peak_mb:.1f}'])
+    return rows
+
+
+def run_iso_variant(image_filename, spacing, interpolator):
+    """Run make_iso with one interpolator and print its time and memory.
+
+    This is run in its own process by benchmark_iso_interpolators().
+    """
+    image = itk.imread(image_filename, itk.F)
+    base_memory = get_peak_memory_mb()
+    logic = ImageProcessLogic()
+    start_time = time.perf_counter()
+    logic.make_iso(image, spacing, interpolator=interpolator)
+    seconds = time.perf_counter() - start_time
+    print(f'{seconds} {get_peak_memory_mb() - base_memory}')
+
+
+def benchmark_iso_interpolators(image, spacing, interpolators):
+    """Compare the time and peak memory of the make_iso interpolators.
+
+    Each interpolator runs in a new process, as in benchmark_median_memory().
+
+    Args:
+        image: The input image.
+        spacing (float): The isotropic spacing the image is resampled to.
+        interpolators (list): The interpolators to be compared.
+
+    Returns:
+        list: The (interpolator, seconds, peak MB) rows.
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_filename = os.path.join(tmp_dir, 'image.mha')
+        itk.imwrite(image, image_filename)
+        for interpolator in interpolators:
+            seconds, peak_mb = run_benchmark_process(
+                image_filename,
+                [
+                    'iso-run',
+                    '--spacing',
+                    spacing,
+                    '--interpolator',
+                    interpolator,
+                ],
+            )
+            rows.append([interpolator, f'{seconds:.3f}', f'{peak_mb:.1f}'])
+    return rows
+
+
+def benchmark_total_segmentator(
+    image, roi_subset=None, number_of_workers=0, device=None
+):
+    """Compare the time of the TotalSegmentator modes.
+
+    Each mode is run in a new TotalSegmentatorSession, bypassing the
+    segmentation cache, twice: the first run includes loading the models and
+    the second shows the time of later runs in the same session.  Use a real
+    CT (--image) for meaningful timings.
+
+    Args:
+        image: The input CT.
+        roi_subset (list?): The organs segmented by the subset modes.
+            Defaults to no subset modes.
+        number_of_workers (int?): The number of preprocessing workers.
+            Defaults to 0, for the compute settings.
+        device (str?): The device of the sessions.  Defaults to the compute
+            settings.
+
+    Returns:
+        list: The (mode, preprocess seconds, first run seconds, later run
+            seconds, preprocessed size) rows.
+    """
+    # Unlike the GUI, the benchmark waits for the dependency probe
+    get_capabilities()
+
+    modes = [('full', False, None), ('fast', True, None)]
+    if roi_subset:
+        modes += [
+            ('full subset', False, roi_subset),
+            ('fast subset', True, roi_subset),
+        ]
+    rows = []
+    for mode, fast, subset in modes:
+        logic = TotalSegmentatorLogic()
+        status, msg, ask_to_continue = logic.initialize(
+            image,
+            fast=fast,
+            roi_subset=subset,
+            number_of_workers=number_of_workers,
+        )
+        if not status and not ask_to_continue:
+            raise RuntimeError(msg)
+        start_time = time.perf_counter()
+        pre_image = logic.preprocess()
+        preprocess_seconds = time.perf_counter() - start_time
+
+        session = TotalSegmentatorSession(device=device)
+        try:
+            run_seconds = []
+            for _ in range(2):
+                start_time = time.perf_counter()
+                session.segment(
+                    pre_image,
+                    task=logic.get_task(),
+                    roi_subset=subset,
+                    number_of_workers=number_of_workers,
+                )
+                run_seconds.append(time.perf_counter() - start_time)
+        finally:
+            session.stop()
+        rows.append(
+            [
+                mode,
+                f'{preprocess_seconds:.2f}',
+                f'{run_seconds[0]:.2f}',
+                f'{run_seconds[1]:.2f}',
+                'x'.join(
+                    str(v)
+                    for v in pre_image.GetLargestPossibleRegion().GetSize()
+                ),
+            ]
+        )
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the processing operations of minder3D.'
+    )
+    parser.add_argument(
+        '--image', type=str, required=False, help='Path to image'
+    )
+    parser.add_argument(
+        '--repeats', type=int, default=3, help='Number of calls per timing'
+    )
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    threads_parser = subparsers.add_parser(
+        'threads', help='Thread scaling of make_iso, median_filter, and Otsu'
+    )
+    threads_parser.add_argument(
+        '--threads',
+        type=int,
+        nargs='+',
+        default=[
+            n for n in [1, 2, 4, 8, 16, 32, 64] if n <= (os.cpu_count() or 1)
+        ],
+        help='Thread counts to be timed',
+    )
+
+    memory_parser = subparsers.add_parser(
+        'median-memory',
+        help='Peak memory of the whole and tiled median filters',
+    )
+    memory_parser.add_argument(
+        '--radius', type=int, default=3, help='Radius of the median filter'
+    )
+    memory_parser.add_argument(
+        '--slab-thickness',
+        type=int,
+        nargs='+',
+        default=[4, 16, 64],
+        help='Slab thicknesses of the tiled variants',
+    )
+
+    iso_parser = subparsers.add_parser(
+        'interpolators',
+        help='Time and peak memory of the make_iso interpolators',
+    )
+    iso_parser.add_argument(
+        '--spacing',
+        type=float,
+        default=1.5,
+        help='Isotropic spacing the image is resampled to',
+    )
+    iso_parser.add_argument(
+        '--interpolators',
+        type=str,
+        nargs='+',
+        default=INTERPOLATORS,
+        choices=INTERPOLATORS,
+        help='Interpolators to be compared',
+    )
+
+    total_segmentator_parser = subparsers.add_parser(
+        'totalsegmentator',
+        help='Time of the full, fast, and organ subset TotalSegmentator modes',
+    )
+    total_segmentator_parser.add_argument(
+        '--roi-subset',
+        type=str,
+        nargs='*',
+        default=[],
+        help='Organs segmented by the subset modes, e.g., liver spleen',
+    )
+    total_segmentator_parser.add_argument(
+        '--workers',
+        type=int,
+        default=0,
+        help='Number of preprocessing workers',
+    )
+    total_segmentator_parser.add_argument(
+        '--device', type=str, default=None, help='cpu or cuda'
+    )
+
+    # Used by median-memory to run each variant in its own process
+    run_parser = subparsers.add_parser('median-run')
+    run_parser.add_argument('--radius', type=int, required=True)
+    run_parser.add_argument('--variant', type=str, required=True)
+    run_parser.add_argument('--slab-thickness', type=int, required=True)
+
+    # Used by interpolators to run each interpolator in its own process
+    iso_run_parser = subparsers.add_parser('iso-run')
+    iso_run_parser.add_argument('--spacing', type=float, required=True)
+    iso_run_parser.add_argument('--interpolator', type=str, required=True)
+
+    args = parser.parse_args(argv)
+
+    if args.benchmark == 'median-run':
+        run_median_variant(
+            args.image, args.radius, args.variant, args.slab_thickness
+        )
+        return
+    if args.benchmark == 'iso-run':
+        run_iso_variant(args.image, args.spacing, args.interpolator)
+        return
+
+    image = load_benchmark_image(args.image)
+    if args.benchmark == 'threads':
+        rows = benchmark_thread_scaling(image, args.threads, args.repeats)
+        print_table(['operation', 'threads', 'seconds', 'speedup'], rows)
+    elif args.benchmark == 'median-memory':
+        rows = benchmark_median_memory(image, args.radius, args.slab_thickness)
+        print_table(['variant', 'seconds', 'peak MB'], rows)
+    elif args.benchmark == 'interpolators':
+        rows = benchmark_iso_interpolators(
+            image, args.spacing, args.interpolators
+        )
+        print_table(['interpolator', 'seconds', 'peak MB'], rows)
+    elif args.benchmark == 'totalsegmentator':
+        rows = benchmark_total_segmentator(
+            image, args.roi_subset, args.workers, args.device
+        )
+        print_table(
+            ['mode', 'preprocess s', 'first run s', 'later run s', 'size'],
+            rows,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Detect the optional AI dependencies once, in the background.
+
+Importing PyTorch to check for CUDA takes seconds, and a broken CUDA setup
+can take much longer.  start_capability_probe() is called at startup and
+runs the check in a separate Python process, from a background thread, so
+neither the GUI nor its first segmentation pays for importing PyTorch.  The
+result is cached for the lifetime of the application; get_capabilities()
+waits for the probe only if it has not finished yet.
+
+Missing dependencies are reported to the user; they are never installed
+from the application.
+"""
+
+import importlib.util
+import json
+import subprocess
+import sys
+import threading
+
+from .sovUtils import sov_log
+
+# Run by the probe process; prints the capabilities as JSON
+_PROBE_SCRIPT = '''
+import importlib.util
+import json
+
+capabilities = {
+    'totalsegmentator': importlib.util.find_spec('totalsegmentator') is not None,
+    'torch': importlib.util.find_spec('torch') is not None,
+    'torch_version': '',
+    'cuda': False,
+    'cuda_device': '',
+}
+if capabilities['torch']:
+    import torch
+
+    capabilities['torch_version'] = torch.__version__
+    capabilities['cuda'] = torch.cuda.is_available()
+    if capabilities['cuda']:
+        capabilities['cuda_device'] = torch.cuda.get_device_name(0)
+print(json.dumps(capabilities))
+'''
+
+_capabilities = None
+_probe_thread = None
+_probe_done = threading.Event()
+_probe_lock = threading.Lock()
+
+
+def _probe(timeout):
+    global _capabilities
+
+    # find_spec only reads the import paths, so it is always available,
+    # even if the probe process fails
+    capabilities = {
+        'totalsegmentator': importlib.util.find_spec('totalsegmentator')
+        is not None,
+        'torch': importlib.util.find_spec('torch') is not None,
+        'torch_version': '',
+        'cuda': None,
+        'cuda_device': '',
+    }
+    try:
+        if capabilities['torch']:
+            try:
+                result = subprocess.run(
+                    [sys.executable, '-c', _PROBE_SCRIPT],
+                    capture_output=True,
+                    text=True,
+                    timeout=timeout,
+                    check=True,
+                )
+                capabilities.update(json.loads(result.stdout.splitlines()[-1]))
+            except (
+                OSError,
+                IndexError,
+                TypeError,
+                ValueError,
+                subprocess.SubprocessError,
+            ) as e:
+                sov_log(f'Could not probe PyTorch: {e}', 'warning')
+        else:
+            capabilities['cuda'] = False
+    finally:
+        # Callers waiting for the probe must never wait forever, even if it
+        # failed unexpectedly
+        _capabilities = capabilities
+        _probe_done.set()
+    sov_log(f'Capabilities: {capabilities}')
+
+
+def start_capability_probe(timeout=300):
+    """Start probing the AI dependencies in the background, if not started.
+
+    Args:
+        timeout (float?): The maximum time, in seconds, of the PyTorch probe.
+            Defaults to 300.
+    """
+    global _probe_thread
+    with _probe_lock:
+        if _probe_thread is None:
+            _probe_thread = threading.Thread(
+                target=_probe, args=(timeout,), daemon=True
+            )
+            _probe_thread.start()
+
+
+def get_capabilities(wait=True):
+    """Get the AI dependencies available.
+
+    The probe is started if needed.  The GUI must not wait for it, since
+    probing PyTorch can take minutes: it calls get_capabilities(wait=False)
+    and reports that the probe is still running if it returns None.
+
+    Args:
+        wait (bool?): Wait for the probe to finish.  Defaults to True.
+
+    Returns:
+        dict: Whether totalsegmentator and torch can be imported, the torch
+            version, whether CUDA is available (None if that could not be
+            determined), and the name of the CUDA device.  None if wait is
+            False and the probe has not finished.
+    """
+    if not _probe_done.is_set():
+        start_capability_probe()
+        if not wait:
+            return None
+        _probe_done.wait()
+    return dict(_capabilities)
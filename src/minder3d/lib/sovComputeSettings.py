@@ -0,0 +1,202 @@
+"""Control the number of threads used by ITK, VTK and NumPy.
+
+The compute settings are read from settings_compute.ini, can be overridden
+from the command line, and are applied once at startup by
+apply_compute_config().  A value of 0 (or '' for the VTK SMP backend) keeps
+the library's own default.  The thread counts are also exported as
+environment variables, so the worker processes of the ImageProcessExecutor
+inherit them.
+
+Individual operations can override the thread and work unit counts of their
+ITK filters using configure_filter().
+"""
+
+import os
+
+from PySide6.QtCore import QSettings, QStandardPaths
+
+from .sovUtils import sov_log, time_and_log
+
+_compute_config = {
+    'itk_threads': 0,
+    'itk_work_units': 0,
+    'vtk_smp_backend': '',
+    'vtk_smp_threads': 0,
+    'blas_threads': 0,
+    'ai_threads': 0,
+    'ai_device': '',
+}
+
+_blas_thread_variables = [
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+]
+
+_blas_thread_limiter = None
+
+
+def get_compute_config():
+    """Get the compute configuration currently applied.
+
+    Returns:
+        dict: The thread counts and VTK SMP backend in use.
+    """
+    return dict(_compute_config)
+
+
+@time_and_log
+def apply_compute_config(
+    itk_threads=0,
+    itk_work_units=0,
+    vtk_smp_backend='',
+    vtk_smp_threads=0,
+    blas_threads=0,
+    ai_threads=0,
+    ai_device='',
+):
+    """Apply a compute configuration to ITK, VTK and NumPy/BLAS.
+
+    The BLAS thread count is fully effective only when applied before NumPy
+    is first imported; afterwards it is applied using threadpoolctl, if it is
+    installed.
+
+    Args:
+        itk_threads (int?): ITK's global default number of threads.
+        itk_work_units (int?): The default number of work units of the ITK
+            filters created by the logic classes.
+        vtk_smp_backend (str?): The vtkSMPTools backend, e.g., 'STDThread',
+            'TBB', 'OpenMP' or 'Sequential'.
+        vtk_smp_threads (int?): The number of threads used by vtkSMPTools.
+        blas_threads (int?): The number of threads used by NumPy's BLAS.
+        ai_threads (int?): The number of threads used by PyTorch in the AI
+            segmentation session.
+        ai_device (str?): The device of the AI segmentation session, 'cpu'
+            or 'cuda'.  Defaults to CUDA when it is available.
+    """
+    global _blas_thread_limiter
+
+    _compute_config['itk_threads'] = int(itk_threads)
+    _compute_config['itk_work_units'] = int(itk_work_units)
+    _compute_config['vtk_smp_backend'] = str(vtk_smp_backend)
+    _compute_config['vtk_smp_threads'] = int(vtk_smp_threads)
+    _compute_config['blas_threads'] = int(blas_threads)
+    _compute_config['ai_threads'] = int(ai_threads)
+    _compute_config['ai_device'] = str(ai_device)
+
+    if blas_threads > 0:
+        for variable in _blas_thread_variables:
+            os.environ[variable] = str(blas_threads)
+        try:
+            from threadpoolctl import threadpool_limits
+
+            _blas_thread_limiter = threadpool_limits(
+                limits=blas_threads, user_api='blas'
+            )
+        except ImportError:
+            pass
+
+    if itk_threads > 0:
+        os.environ['ITK_GLOBAL_DEFAULT_NUMBER_OF_THREADS'] = str(itk_threads)
+        import itk
+
+        itk.MultiThreaderBase.SetGlobalDefaultNumberOfThreads(itk_threads)
+
+    if vtk_smp_backend != '' or vtk_smp_threads > 0:
+        from vtkmodules.vtkCommonCore import vtkSMPTools
+
+        if vtk_smp_backend != '':
+            os.environ['VTK_SMP_BACKEND_IN_USE'] = vtk_smp_backend
+            vtkSMPTools.SetBackend(vtk_smp_backend)
+        if vtk_smp_threads > 0:
+            os.environ['VTK_SMP_MAX_THREADS'] = str(vtk_smp_threads)
+            vtkSMPTools.Initialize(vtk_smp_threads)
+
+    sov_log(f'Compute configuration: {get_compute_config()}')
+
+
+def configure_filter(filter, number_of_threads=None, number_of_work_units=None):
+    """Set the number of threads and work units used by an ITK filter.
+
+    Args:
+        filter: The ITK filter, before it is updated.
+        number_of_threads (int?): The maximum number of threads of the
+            filter.  Defaults to ITK's global default.
+        number_of_work_units (int?): The number of work units the filter's
+            output is split into.  Defaults to the configured itk_work_units,
+            or ITK's default if that is 0.
+
+    Returns:
+        The filter.
+    """
+    if number_of_work_units is None and _compute_config['itk_work_units'] > 0:
+        number_of_work_units = _compute_config['itk_work_units']
+    if number_of_threads is not None and hasattr(filter, 'GetMultiThreader'):
+        filter.GetMultiThreader().SetMaximumNumberOfThreads(number_of_threads)
+    if number_of_work_units is not None and hasattr(
+        filter, 'SetNumberOfWorkUnits'
+    ):
+        filter.SetNumberOfWorkUnits(number_of_work_units)
+    return filter
+
+
+class ComputeSettings(QSettings):
+    def __init__(self):
+        settings_file = os.path.join(
+            QStandardPaths.writableLocation(QStandardPaths.AppDataLocation),
+            'settings_compute.ini',
+        )
+        os.makedirs(os.path.dirname(settings_file), exist_ok=True)
+        super().__init__(settings_file, QSettings.IniFormat)
+
+    @time_and_log
+    def add_data(
+        self,
+        itk_threads=0,
+        itk_work_units=0,
+        vtk_smp_backend='',
+        vtk_smp_threads=0,
+        blas_threads=0,
+        ai_threads=0,
+        ai_device='',
+    ):
+        """Store a compute configuration in the settings.
+
+        Args:
+            itk_threads (int?): ITK's global default number of threads.
+            itk_work_units (int?): The default number of work units of ITK
+                filters.
+            vtk_smp_backend (str?): The vtkSMPTools backend.
+            vtk_smp_threads (int?): The number of threads of vtkSMPTools.
+            blas_threads (int?): The number of threads of NumPy's BLAS.
+            ai_threads (int?): The number of threads of the AI session.
+            ai_device (str?): The device of the AI session.
+        """
+        self.setValue('itk_threads', int(itk_threads))
+        self.setValue('itk_work_units', int(itk_work_units))
+        self.setValue('vtk_smp_backend', str(vtk_smp_backend))
+        self.setValue('vtk_smp_threads', int(vtk_smp_threads))
+        self.setValue('blas_threads', int(blas_threads))
+        self.setValue('ai_threads', int(ai_threads))
+        self.setValue('ai_device', str(ai_device))
+        self.sync()
+
+    @time_and_log
+    def get_data(self):
+        """Get the stored compute configuration.
+
+        Returns:
+            dict: The keyword arguments of apply_compute_config().  Settings
+                that are not stored keep the library defaults.
+        """
+        return {
+            'itk_threads': int(self.value('itk_threads', 0)),
+            'itk_work_units': int(self.value('itk_work_units', 0)),
+            'vtk_smp_backend': str(self.value('vtk_smp_backend', '')),
+            'vtk_smp_threads': int(self.value('vtk_smp_threads', 0)),
+            'blas_threads': int(self.value('blas_threads', 0)),
+            'ai_threads': int(self.value('ai_threads', 0)),
+            'ai_device': str(self.value('ai_device', '')),
+        }
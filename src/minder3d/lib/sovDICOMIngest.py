@@ -0,0 +1,332 @@
+"""Import DICOM files as compressed volumes, using worker processes.
+
+Importing a directory (see sovImportDICOMPanelWidget.import_dicom_files)
+first reads the headers of its files, in chunks, in the worker processes of
+the ImageProcessExecutor.  Only the tags needed to sort the files into
+patients, studies, and series are read, and the pixel data is skipped.  The
+series are then indexed in the image catalog, and each series is imported
+by a worker: its files are hard linked, or copied if they cannot be linked,
+into the output hierarchy
+
+    <PatientName>/<StudyID>-<StudyDescription>-<StudyDate>/<Modality>/
+        <SeriesNumber>-<SeriesDescription>/<InstanceNumber>.dcm
+
+and the series is converted to a single compressed volume, named after its
+directory, '<SeriesNumber>-<SeriesDescription>.nii.gz'.  Series of a study
+that would share a directory (e.g., with the same SeriesNumber and no
+SeriesDescription) are told apart by a short hash of their
+SeriesInstanceUID, appended to their directory name.
+
+This module is imported by the worker processes, so it does not import Qt
+GUI modules; the thumbnails are returned as small arrays.
+"""
+
+import collections
+import hashlib
+import os
+import re
+import shutil
+import uuid
+
+import itk
+import numpy as np
+import pydicom
+from pydicom.errors import InvalidDicomError
+
+from .sovImageCatalog import (
+    DICOMSeriesRecord,
+    format_image_size,
+    format_image_spacing,
+)
+from .sovImageScanner import decimate_thumbnail_array, get_thumbnail_array
+
+# The tags read from the header of each file
+DICOM_HEADER_TAGS = [
+    'PatientID',
+    'PatientName',
+    'StudyInstanceUID',
+    'StudyID',
+    'StudyDescription',
+    'StudyDate',
+    'SeriesInstanceUID',
+    'SeriesNumber',
+    'SeriesDescription',
+    'Modality',
+    'InstanceNumber',
+    'ImagePositionPatient',
+    'ImageOrientationPatient',
+    'Rows',
+]
+
+# The number of files whose headers are read by a worker at a time
+DICOM_HEADER_CHUNK_SIZE = 64
+
+# The volume each series is converted to
+DICOM_VOLUME_EXTENSION = '.nii.gz'
+
+
+class DICOMInstance:
+    def __init__(self, filename, instance_number, position):
+        """Initialize the entry of a DICOM image file.
+
+        Args:
+            filename (str): The file.
+            instance_number (int): The InstanceNumber of the file, or None.
+            position (float): The position of the slice along the normal of
+                its orientation, or None if the file has no position.
+        """
+        self.filename = filename
+        self.instance_number = instance_number
+        self.position = position
+
+
+def get_tag_text(ds, keyword):
+    """Get the value of a tag as text, or '' if the tag is missing."""
+    value = ds.get(keyword, None)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def get_slice_position(ds):
+    """Get the position of a slice along the normal of its orientation.
+
+    Returns:
+        float: The position, or None if the file has no position.
+    """
+    position = ds.get('ImagePositionPatient', None)
+    orientation = ds.get('ImageOrientationPatient', None)
+    if position is None or orientation is None or len(orientation) != 6:
+        return None
+    orientation = np.array([float(v) for v in orientation])
+    normal = np.cross(orientation[:3], orientation[3:])
+    return float(np.dot(normal, [float(v) for v in position]))
+
+
+def read_dicom_headers(filenames):
+    """Read the headers of DICOM files, in a worker process.
+
+    Files that are not DICOM files, and DICOM files without an image, e.g.,
+    structured reports, are skipped.
+
+    Args:
+        filenames (list): The files.
+
+    Returns:
+        list: The (DICOMSeriesRecord, DICOMInstance) of each image file.
+            The record only holds the tags of the file's series.
+    """
+    headers = []
+    for filename in filenames:
+        try:
+            ds = pydicom.dcmread(
+                filename,
+                stop_before_pixels=True,
+                specific_tags=DICOM_HEADER_TAGS,
+            )
+        except (InvalidDicomError, OSError, ValueError, EOFError):
+            continue
+        series_uid = get_tag_text(ds, 'SeriesInstanceUID')
+        if series_uid == '' or 'Rows' not in ds:
+            continue
+        try:
+            instance_number = int(ds.get('InstanceNumber', None))
+        except (TypeError, ValueError):
+            instance_number = None
+        try:
+            position = get_slice_position(ds)
+        except (TypeError, ValueError):
+            position = None
+        record = DICOMSeriesRecord(
+            series_uid,
+            get_tag_text(ds, 'StudyInstanceUID'),
+            patient_id=get_tag_text(ds, 'PatientID'),
+            patient_name=get_tag_text(ds, 'PatientName'),
+            study_id=get_tag_text(ds, 'StudyID'),
+            study_description=get_tag_text(ds, 'StudyDescription'),
+            study_date=get_tag_text(ds, 'StudyDate'),
+            modality=get_tag_text(ds, 'Modality'),
+            series_number=get_tag_text(ds, 'SeriesNumber'),
+            series_description=get_tag_text(ds, 'SeriesDescription'),
+        )
+        headers.append(
+            (record, DICOMInstance(filename, instance_number, position))
+        )
+    return headers
+
+
+def get_path_component(text, default='Unknown'):
+    """Get a directory name from the value of a tag.
+
+    The characters that are not valid in file names, on any platform, are
+    replaced by '_'.
+    """
+    text = re.sub(r'[\x00-\x1f<>:"/\\|?*^]', '_', text).strip(' .')
+    if text == '':
+        return default
+    return text
+
+
+def get_series_dir(record, output_dir, unique=False):
+    """Get the directory a series is imported to.
+
+    Args:
+        record (DICOMSeriesRecord): The series.
+        output_dir (str): The directory the series are imported to.
+        unique (bool?): Append a short hash of the SeriesInstanceUID to the
+            name of the directory, for series sharing their directory.
+    """
+    series_name = f'{record.series_number}-{record.series_description}'
+    if unique:
+        uid_hash = hashlib.sha1(record.series_uid.encode('utf-8')).hexdigest()
+        series_name += f'-{uid_hash[:8]}'
+    return os.path.join(
+        output_dir,
+        get_path_component(record.patient_name),
+        get_path_component(
+            f'{record.study_id}-{record.study_description}'
+            f'-{record.study_date}'
+        ),
+        get_path_component(record.modality),
+        get_path_component(series_name),
+    )
+
+
+def group_dicom_series(headers, output_dir, catalog=None):
+    """Group the files read by read_dicom_headers into series.
+
+    The files of each series are sorted by their position along the normal
+    of their orientation, or by their InstanceNumber if they have no
+    position.  A series whose directory was imported to by another series,
+    or is shared by other series of the files, gets a unique directory,
+    whatever order their files are read in, so a series is imported to the
+    same directory each time and never overwrites another series.
+
+    Args:
+        headers (list): The (DICOMSeriesRecord, DICOMInstance) of each file.
+        output_dir (str): The directory the series are imported to.
+        catalog (ImageCatalog?): The catalog of the series already imported.
+            Defaults to None, only keeping the series of the files apart.
+
+    Returns:
+        list: The (DICOMSeriesRecord, instances) of each series, whose
+            record gives the directory and volume it is imported to.
+    """
+    series = dict()
+    for record, instance in headers:
+        if record.series_uid not in series:
+            series[record.series_uid] = (record, [])
+        series[record.series_uid][1].append(instance)
+
+    series_dir_counts = collections.Counter(
+        os.path.abspath(get_series_dir(record, output_dir))
+        for record, _ in series.values()
+    )
+
+    grouped = []
+    for record, instances in series.values():
+        if all(instance.position is not None for instance in instances):
+            instances.sort(
+                key=lambda instance: (
+                    instance.position,
+                    instance.instance_number or 0,
+                )
+            )
+        else:
+            instances.sort(key=lambda instance: instance.instance_number or 0)
+        record.n_instances = len(instances)
+        record.series_dir = os.path.abspath(get_series_dir(record, output_dir))
+        # The series imported to the directory keeps it
+        owner_uid = None
+        if catalog is not None:
+            owner_uid = catalog.get_dicom_series_uid(record.series_dir)
+        if owner_uid is not None:
+            unique = owner_uid != record.series_uid
+        else:
+            unique = series_dir_counts[record.series_dir] > 1
+        if unique:
+            record.series_dir = os.path.abspath(
+                get_series_dir(record, output_dir, unique=True)
+            )
+        record.volume_file = record.series_dir + DICOM_VOLUME_EXTENSION
+        grouped.append((record, instances))
+    return grouped
+
+
+def link_or_copy_file(src, dst):
+    """Hard link a file, or copy it if it cannot be linked.
+
+    Linking only writes a directory entry, and copying uses the platform's
+    bulk copy (e.g., copy_file_range or sendfile), so the data of the files
+    never passes through Python.  Files that were already imported are
+    kept.
+    """
+    if os.path.exists(dst):
+        if os.path.samefile(src, dst):
+            return
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def import_dicom_series(record, instances):
+    """Import a DICOM series, in a worker process.
+
+    The files of the series are linked into record.series_dir, then they
+    are read as one volume and written to record.volume_file.  The volume
+    is written to a temporary file that replaces the volume once it is
+    complete, so a cancelled import does not leave a truncated volume.
+
+    Args:
+        record (DICOMSeriesRecord): The series, see group_dicom_series.
+        instances (list): The sorted DICOMInstance of each file.
+
+    Returns:
+        dict: See sovImageScanner.read_image_file_information, or None if
+            the series cannot be read.
+    """
+    os.makedirs(record.series_dir, exist_ok=True)
+    filenames = []
+    names = set()
+    for i, instance in enumerate(instances):
+        stem = str(i)
+        if instance.instance_number is not None:
+            stem = str(instance.instance_number)
+        name = f'{stem}.dcm'
+        if name in names:
+            name = f'{stem}-{i}.dcm'
+        names.add(name)
+        filename = os.path.join(record.series_dir, name)
+        link_or_copy_file(instance.filename, filename)
+        filenames.append(filename)
+
+    volume_dir, volume_name = os.path.split(record.volume_file)
+    tmp_filename = os.path.join(
+        volume_dir, f'.{uuid.uuid4().hex}-{volume_name}'
+    )
+    try:
+        if len(filenames) == 1:
+            img = itk.imread(filenames[0], imageio=itk.GDCMImageIO.New())
+        else:
+            img = itk.imread(filenames, imageio=itk.GDCMImageIO.New())
+        itk.imwrite(img, tmp_filename, compression=True)
+        os.replace(tmp_filename, record.volume_file)
+    except RuntimeError:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        return None
+
+    size = list(itk.size(img))
+    spacing = list(itk.spacing(img))
+    thumbnail = None
+    if img.GetImageDimension() in (2, 3):
+        thumbnail = decimate_thumbnail_array(get_thumbnail_array(img))
+    return {
+        'size': format_image_size(size),
+        'spacing': format_image_spacing(spacing),
+        'modality': record.modality,
+        'thumbnail': thumbnail,
+        'thumbnail_spacing': spacing[:2],
+    }
@@ -0,0 +1,646 @@
+"""A SQLite catalog of the image and scene files registered in minder3D.
+
+The catalog replaces the INI array of the image table settings, which was
+rewritten in full on every change and limited to a few records.  Each file
+is a row of the 'files' table, indexed by filename, label, modality, size,
+and spacing, so the image table can page, sort, and filter tens of
+thousands of files using queries that only read the displayed rows.  Every
+update runs in its own transaction, and registering many files at once
+(see add_records) only commits once.
+
+The catalog only stores the file records; the thumbnails are stored by
+the thumbnail cache, and the catalog only stores their keys.
+
+The catalog also indexes the DICOM series imported by the Import DICOM
+panel, in the 'dicom_patients', 'dicom_studies', and 'dicom_series'
+tables, along with the volume each series was converted to.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from PySide6.QtCore import QStandardPaths
+
+from .sovUtils import time_and_log
+
+CATALOG_SCHEMA_VERSION = 3
+
+# The sort keys of query() and the expressions they order by.  The id of a
+# file gives the order files were added in.
+CATALOG_SORT_KEYS = {
+    'added': 'id',
+    'file_type': 'file_type',
+    'label': 'label COLLATE NOCASE',
+    'modality': 'modality',
+    'size': 'n_voxels',
+    'spacing': 'max_spacing',
+    'filename': 'filename',
+}
+
+
+# The columns of the files table an ImageCatalogRecord is made from
+RECORD_COLUMNS = (
+    'filename, file_type, label, modality, size, spacing, thumbnail,'
+    ' file_mtime, file_bytes'
+)
+
+
+class ImageCatalogRecord:
+    def __init__(
+        self,
+        filename,
+        file_type,
+        file_spacing='',
+        file_size='',
+        file_thumbnail='',
+        file_label='',
+        modality='',
+        file_mtime=None,
+        file_bytes=None,
+    ):
+        """Initialize the record of a cataloged file.
+
+        Args:
+            filename (str): The absolute name of the file.
+            file_type (str): 'image' or 'scene'.
+            file_spacing (str?): The formatted spacing of the file.
+            file_size (str?): The formatted size of the file.
+            file_thumbnail (str?): The key of the thumbnail in the
+                thumbnail cache.
+            file_label (str?): The short display-name of the file.
+            modality (str?): The modality of an image, e.g., 'CT'.
+            file_mtime (float?): The modification time of the file when it
+                was registered, used to skip unchanged files when its
+                directory is registered again.
+            file_bytes (int?): The size of the file, in bytes, when it was
+                registered.
+        """
+        self.filename = filename
+        self.file_type = file_type
+        self.file_spacing = file_spacing
+        self.file_size = file_size
+        self.file_thumbnail = file_thumbnail
+        self.file_label = file_label
+        self.modality = modality
+        self.file_mtime = file_mtime
+        self.file_bytes = file_bytes
+
+
+class DICOMSeriesRecord:
+    def __init__(
+        self,
+        series_uid,
+        study_uid,
+        patient_id='',
+        patient_name='',
+        study_id='',
+        study_description='',
+        study_date='',
+        modality='',
+        series_number='',
+        series_description='',
+        n_instances=0,
+        series_dir='',
+        volume_file='',
+    ):
+        """Initialize the record of an imported DICOM series.
+
+        Args:
+            series_uid (str): The SeriesInstanceUID of the series.
+            study_uid (str): The StudyInstanceUID of its study.
+            patient_id (str?): The PatientID of its patient.
+            patient_name (str?): The PatientName of its patient.
+            study_id (str?): The StudyID of its study.
+            study_description (str?): The StudyDescription of its study.
+            study_date (str?): The StudyDate of its study.
+            modality (str?): The modality of the series, e.g., 'CT'.
+            series_number (str?): The SeriesNumber of the series.
+            series_description (str?): The SeriesDescription of the series.
+            n_instances (int?): The number of image files of the series.
+            series_dir (str?): The directory the files were imported to.
+            volume_file (str?): The volume the series was converted to, or
+                '' if it was not converted.
+        """
+        self.series_uid = series_uid
+        self.study_uid = study_uid
+        self.patient_id = patient_id
+        self.patient_name = patient_name
+        self.study_id = study_id
+        self.study_description = study_description
+        self.study_date = study_date
+        self.modality = modality
+        self.series_number = series_number
+        self.series_description = series_description
+        self.n_instances = n_instances
+        self.series_dir = series_dir
+        self.volume_file = volume_file
+
+
+def format_image_size(size):
+    """Format the size of an image for display, e.g., '512x512x300'."""
+    return 'x'.join([str(s) for s in size])
+
+
+def format_image_spacing(spacing):
+    """Format the spacing of an image for display, e.g., '0.5000, 2.0000'."""
+    return ', '.join([f'{s:.4f}' for s in spacing])
+
+
+def get_size_voxels(file_size):
+    """Get the number of voxels of a formatted size, e.g., '512x512x300'.
+
+    The size of a scene is its number of objects.
+
+    Returns:
+        int: The number of voxels, or None if the size is not formatted.
+    """
+    try:
+        n_voxels = 1
+        for s in file_size.split('x'):
+            n_voxels *= int(s)
+        return n_voxels
+    except ValueError:
+        return None
+
+
+def get_max_spacing(file_spacing):
+    """Get the largest spacing of a formatted spacing, e.g., '0.5, 0.5, 2'.
+
+    Returns:
+        float: The largest spacing, or None if the spacing is not formatted.
+    """
+    try:
+        return max(float(s) for s in file_spacing.split(','))
+    except ValueError:
+        return None
+
+
+def escape_like_pattern(text):
+    """Escape the wildcards of a LIKE pattern, using '\\' as escape."""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class ImageCatalog:
+    def __init__(self, catalog_file=None):
+        """Open the catalog, creating its database if needed.
+
+        Args:
+            catalog_file (str?): The SQLite database.  Defaults to
+                'image_catalog.sqlite' in the application's data directory.
+        """
+        if catalog_file is None:
+            catalog_file = os.path.join(
+                QStandardPaths.writableLocation(QStandardPaths.AppDataLocation),
+                'image_catalog.sqlite',
+            )
+        os.makedirs(
+            os.path.dirname(os.path.abspath(catalog_file)), exist_ok=True
+        )
+        self.catalog_file = catalog_file
+        self.lock = threading.RLock()
+
+        # Files are registered by background tasks, so the connection is
+        # shared by threads, and serialized by the lock
+        self.connection = sqlite3.connect(catalog_file, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.create_tables()
+
+    def create_tables(self):
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL UNIQUE,
+                file_type TEXT NOT NULL,
+                label TEXT NOT NULL DEFAULT '',
+                modality TEXT NOT NULL DEFAULT '',
+                size TEXT NOT NULL DEFAULT '',
+                spacing TEXT NOT NULL DEFAULT '',
+                n_voxels INTEGER,
+                max_spacing REAL,
+                thumbnail TEXT NOT NULL DEFAULT '',
+                added REAL NOT NULL,
+                file_mtime REAL,
+                file_bytes INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS files_file_type ON files (file_type);
+            CREATE INDEX IF NOT EXISTS files_label
+                ON files (label COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS files_modality ON files (modality);
+            CREATE INDEX IF NOT EXISTS files_n_voxels ON files (n_voxels);
+            CREATE INDEX IF NOT EXISTS files_max_spacing
+                ON files (max_spacing);
+            CREATE TABLE IF NOT EXISTS dicom_patients (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                patient_id TEXT NOT NULL,
+                patient_name TEXT NOT NULL,
+                UNIQUE (patient_id, patient_name)
+            );
+            CREATE TABLE IF NOT EXISTS dicom_studies (
+                study_uid TEXT PRIMARY KEY,
+                patient INTEGER NOT NULL REFERENCES dicom_patients (id),
+                study_id TEXT NOT NULL DEFAULT '',
+                study_description TEXT NOT NULL DEFAULT '',
+                study_date TEXT NOT NULL DEFAULT ''
+            );
+            CREATE INDEX IF NOT EXISTS dicom_studies_patient
+                ON dicom_studies (patient);
+            CREATE TABLE IF NOT EXISTS dicom_series (
+                series_uid TEXT PRIMARY KEY,
+                study_uid TEXT NOT NULL REFERENCES dicom_studies (study_uid),
+                modality TEXT NOT NULL DEFAULT '',
+                series_number TEXT NOT NULL DEFAULT '',
+                series_description TEXT NOT NULL DEFAULT '',
+                n_instances INTEGER NOT NULL DEFAULT 0,
+                series_dir TEXT NOT NULL DEFAULT '',
+                volume_file TEXT NOT NULL DEFAULT '',
+                added REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS dicom_series_study
+                ON dicom_series (study_uid);
+            CREATE INDEX IF NOT EXISTS dicom_series_volume_file
+                ON dicom_series (volume_file);
+            CREATE INDEX IF NOT EXISTS dicom_series_dir
+                ON dicom_series (series_dir);
+            """
+        )
+        if 0 < version < 2:
+            self.connection.execute(
+                'ALTER TABLE files ADD COLUMN file_mtime REAL'
+            )
+            self.connection.execute(
+                'ALTER TABLE files ADD COLUMN file_bytes INTEGER'
+            )
+        self.connection.execute(
+            f'PRAGMA user_version = {CATALOG_SCHEMA_VERSION}'
+        )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    @time_and_log
+    def add_records(self, records):
+        """Add or update the records of files, in a single transaction.
+
+        The record of a file that is already cataloged is updated, and
+        keeps its position in the order files were added in.
+
+        Args:
+            records (list): The ImageCatalogRecord of each file.
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            for record in records:
+                filename = os.path.abspath(record.filename)
+                self.connection.execute(
+                    """
+                    INSERT INTO files (
+                        filename, file_type, label, modality, size, spacing,
+                        n_voxels, max_spacing, thumbnail, added,
+                        file_mtime, file_bytes
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (filename) DO UPDATE SET
+                        file_type = excluded.file_type,
+                        label = excluded.label,
+                        modality = excluded.modality,
+                        size = excluded.size,
+                        spacing = excluded.spacing,
+                        n_voxels = excluded.n_voxels,
+                        max_spacing = excluded.max_spacing,
+                        thumbnail = excluded.thumbnail,
+                        file_mtime = excluded.file_mtime,
+                        file_bytes = excluded.file_bytes
+                    """,
+                    (
+                        filename,
+                        record.file_type,
+                        record.file_label,
+                        record.modality,
+                        record.file_size,
+                        record.file_spacing,
+                        get_size_voxels(record.file_size),
+                        get_max_spacing(record.file_spacing),
+                        record.file_thumbnail,
+                        now,
+                        record.file_mtime,
+                        record.file_bytes,
+                    ),
+                )
+
+    def add_record(self, record):
+        """Add or update the record of a file, see add_records."""
+        self.add_records([record])
+
+    @time_and_log
+    def remove_record(self, filename):
+        """Remove the record of a file.
+
+        Returns:
+            ImageCatalogRecord: The removed record, or None if the file was
+                not cataloged.
+        """
+        record = self.get_record(filename)
+        if record is not None:
+            with self.lock, self.connection:
+                self.connection.execute(
+                    'DELETE FROM files WHERE filename = ?', (record.filename,)
+                )
+        return record
+
+    @time_and_log
+    def relabel(self, filename, new_label):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'UPDATE files SET label = ? WHERE filename = ?',
+                (new_label, os.path.abspath(filename)),
+            )
+
+    @time_and_log
+    def set_thumbnail(self, filename, thumbnail):
+        """Set the thumbnail key of a file (see sovThumbnailCache)."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                'UPDATE files SET thumbnail = ? WHERE filename = ?',
+                (thumbnail, os.path.abspath(filename)),
+            )
+
+    @time_and_log
+    def clear(self):
+        """Remove all the records."""
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM files')
+
+    def make_record(self, row):
+        """Make the record of a row selected with RECORD_COLUMNS."""
+        (
+            filename,
+            file_type,
+            label,
+            modality,
+            size,
+            spacing,
+            thumbnail,
+            file_mtime,
+            file_bytes,
+        ) = row
+        return ImageCatalogRecord(
+            filename,
+            file_type,
+            spacing,
+            size,
+            thumbnail,
+            label,
+            modality,
+            file_mtime,
+            file_bytes,
+        )
+
+    def get_record(self, filename):
+        """Get the record of a file.
+
+        Returns:
+            ImageCatalogRecord: The record, or None if the file is not
+                cataloged.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                f'SELECT {RECORD_COLUMNS} FROM files WHERE filename = ?',
+                (os.path.abspath(filename),),
+            ).fetchone()
+        if row is None:
+            return None
+        return self.make_record(row)
+
+    @time_and_log
+    def get_file_stats(self, dir):
+        """Get the registered modification times and sizes of the files of a
+        directory, and of its subdirectories.
+
+        Args:
+            dir (str): The directory.
+
+        Returns:
+            dict: The (file_mtime, file_bytes) of each filename.
+        """
+        dir = os.path.abspath(dir)
+        # The filenames starting with dir + os.sep are those in the range
+        # [dir + os.sep, dir + the character following os.sep[
+        prefix = os.path.join(dir, '')
+        end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT filename, file_mtime, file_bytes FROM files'
+                ' WHERE filename = ? OR (filename >= ? AND filename < ?)',
+                (dir, prefix, end),
+            ).fetchall()
+        return {filename: (mtime, n_bytes) for filename, mtime, n_bytes in rows}
+
+    def get_where_clause(self, text, exclude):
+        """Get the WHERE clause, and its parameters, of a query's filters."""
+        conditions = []
+        parameters = []
+        if text:
+            pattern = '%' + escape_like_pattern(text) + '%'
+            conditions.append(
+                "(label LIKE ? ESCAPE '\\' OR filename LIKE ? ESCAPE '\\'"
+                " OR modality LIKE ? ESCAPE '\\')"
+            )
+            parameters += [pattern, pattern, pattern]
+        if len(exclude) > 0:
+            conditions.append(
+                f'filename NOT IN ({", ".join("?" * len(exclude))})'
+            )
+            parameters += [os.path.abspath(f) for f in exclude]
+        if len(conditions) == 0:
+            return '', parameters
+        return ' WHERE ' + ' AND '.join(conditions), parameters
+
+    @time_and_log
+    def query(
+        self,
+        text='',
+        exclude=(),
+        sort='added',
+        descending=False,
+        offset=0,
+        limit=-1,
+    ):
+        """Get a page of the records, filtered and sorted.
+
+        Args:
+            text (str?): Only get the files whose label, filename, or
+                modality contains the text, ignoring case.
+            exclude (list?): The filenames of files not to be returned,
+                e.g., the loaded files.
+            sort (str?): The key the records are sorted by, see
+                CATALOG_SORT_KEYS.  Defaults to the order files were added.
+            descending (bool?): Sort in descending order.
+            offset (int?): The number of records skipped.
+            limit (int?): The maximum number of records, or -1 for all.
+
+        Returns:
+            list: The ImageCatalogRecord of each file.
+        """
+        where, parameters = self.get_where_clause(text, exclude)
+        order = 'DESC' if descending else 'ASC'
+        with self.lock:
+            rows = self.connection.execute(
+                f'SELECT {RECORD_COLUMNS} FROM files{where}'
+                f' ORDER BY {CATALOG_SORT_KEYS[sort]} {order}, id {order}'
+                ' LIMIT ? OFFSET ?',
+                parameters + [limit, offset],
+            ).fetchall()
+        return [self.make_record(row) for row in rows]
+
+    @time_and_log
+    def count(self, text='', exclude=()):
+        """Count the records returned by query() for the same filters."""
+        where, parameters = self.get_where_clause(text, exclude)
+        with self.lock:
+            return self.connection.execute(
+                f'SELECT COUNT(*) FROM files{where}', parameters
+            ).fetchone()[0]
+
+    @time_and_log
+    def add_dicom_series(self, records):
+        """Add or update the records of DICOM series, and of their patients
+        and studies, in a single transaction.
+
+        Args:
+            records (list): The DICOMSeriesRecord of each series.
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            for record in records:
+                self.connection.execute(
+                    'INSERT OR IGNORE INTO dicom_patients'
+                    ' (patient_id, patient_name) VALUES (?, ?)',
+                    (record.patient_id, record.patient_name),
+                )
+                patient = self.connection.execute(
+                    'SELECT id FROM dicom_patients'
+                    ' WHERE patient_id = ? AND patient_name = ?',
+                    (record.patient_id, record.patient_name),
+                ).fetchone()[0]
+                self.connection.execute(
+                    """
+                    INSERT INTO dicom_studies (
+                        study_uid, patient, study_id, study_description,
+                        study_date
+                    ) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (study_uid) DO UPDATE SET
+                        patient = excluded.patient,
+                        study_id = excluded.study_id,
+                        study_description = excluded.study_description,
+                        study_date = excluded.study_date
+                    """,
+                    (
+                        record.study_uid,
+                        patient,
+                        record.study_id,
+                        record.study_description,
+                        record.study_date,
+                    ),
+                )
+                self.connection.execute(
+                    """
+                    INSERT INTO dicom_series (
+                        series_uid, study_uid, modality, series_number,
+                        series_description, n_instances, series_dir,
+                        volume_file, added
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (series_uid) DO UPDATE SET
+                        study_uid = excluded.study_uid,
+                        modality = excluded.modality,
+                        series_number = excluded.series_number,
+                        series_description = excluded.series_description,
+                        n_instances = excluded.n_instances,
+                        series_dir = excluded.series_dir,
+                        volume_file = excluded.volume_file
+                    """,
+                    (
+                        record.series_uid,
+                        record.study_uid,
+                        record.modality,
+                        record.series_number,
+                        record.series_description,
+                        record.n_instances,
+                        record.series_dir,
+                        record.volume_file,
+                        now,
+                    ),
+                )
+
+    @time_and_log
+    def set_dicom_series_volume(self, series_uid, volume_file):
+        """Set the volume a DICOM series was converted to."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                'UPDATE dicom_series SET volume_file = ? WHERE series_uid = ?',
+                (volume_file, series_uid),
+            )
+
+    def get_dicom_series_uid(self, series_dir):
+        """Get the DICOM series imported to a directory.
+
+        Returns:
+            str: The SeriesInstanceUID of the series, or None if no series
+                was imported to the directory.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT series_uid FROM dicom_series WHERE series_dir = ?',
+                (series_dir,),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def get_dicom_series(self, series_uid):
+        """Get the record of a DICOM series.
+
+        Returns:
+            DICOMSeriesRecord: The record, or None if the series was not
+                imported.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                """
+                SELECT
+                    s.series_uid, s.study_uid, p.patient_id, p.patient_name,
+                    t.study_id, t.study_description, t.study_date,
+                    s.modality, s.series_number, s.series_description,
+                    s.n_instances, s.series_dir, s.volume_file
+                FROM dicom_series AS s
+                JOIN dicom_studies AS t ON t.study_uid = s.study_uid
+                JOIN dicom_patients AS p ON p.id = t.patient
+                WHERE s.series_uid = ?
+                """,
+                (series_uid,),
+            ).fetchone()
+        if row is None:
+            return None
+        return DICOMSeriesRecord(*row)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_image_catalog():
+    """Get the application's image catalog, opening it if needed.
+
+    Returns:
+        ImageCatalog: The catalog shared by the image table and the import
+            panels.
+    """
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ImageCatalog()
+        return _catalog
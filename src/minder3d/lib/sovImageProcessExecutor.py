@@ -0,0 +1,301 @@
+"""Run ImageProcessLogic operations in worker processes.
+
+The ITK/TubeTK filters release the GIL unevenly, so running several of them
+in threads rarely uses more than one core.  The ImageProcessExecutor runs
+them in a pool of worker processes instead.  Voxel buffers are passed to and
+from the workers through multiprocessing.shared_memory blocks, never
+pickled; only the geometry (size, spacing, origin, direction) and the name of
+the shared block travel as metadata.
+"""
+
+import concurrent.futures
+import multiprocessing
+import os
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+import itk
+import numpy as np
+
+from .sovComputeSettings import apply_compute_config, get_compute_config
+from .sovImageProcessLogic import ImageProcessLogic
+from .sovTaskRunner import TaskCancelledError, task_cancelled, task_progress
+from .sovUtils import time_and_log
+
+
+def create_shared_memory(size, name=None, track=True):
+    """Create a shared memory block, optionally untracked.
+
+    Python 3.13 added the track argument of SharedMemory.  Earlier versions
+    register every block with the resource tracker of the process, so an
+    untracked block is unregistered after it is created, under the private
+    name it was registered with (on POSIX only, where blocks are tracked).
+
+    Args:
+        size (int): The size of the block, in bytes.
+        name (str?): The name of the block.  Defaults to a unique name.
+        track (bool?): Let the resource tracker unlink the block if it is
+            leaked.  Defaults to True.
+
+    Returns:
+        shared_memory.SharedMemory: The block.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(
+            name=name, create=True, size=size, track=track
+        )
+    shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    if not track and os.name == 'posix':
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def share_image(image, track=True, name=None):
+    """Copy the voxels of an image into a new shared memory block.
+
+    Args:
+        image: The ITK image to be shared.
+        track (bool?): Let this process' resource tracker unlink the block if
+            it is leaked.  Worker processes hand their blocks over to the
+            main process, so they must not track them.  Defaults to True.
+        name (str?): The name of the block, so that the process receiving
+            it can unlink it even if the worker is stopped before handing it
+            over.  Defaults to a unique name.
+
+    Returns:
+        tuple: The SharedMemory block, to be closed and unlinked by the
+            caller, and the metadata needed to rebuild the image from it.
+    """
+    image_array = itk.GetArrayViewFromImage(image)
+    shm = create_shared_memory(
+        max(1, image_array.nbytes), name=name, track=track
+    )
+    shared_array = np.ndarray(
+        image_array.shape, dtype=image_array.dtype, buffer=shm.buf
+    )
+    shared_array[...] = image_array
+    del shared_array
+    metadata = {
+        'name': shm.name,
+        'shape': image_array.shape,
+        'dtype': image_array.dtype.str,
+        'is_vector': image.GetNumberOfComponentsPerPixel() > 1,
+        'spacing': tuple(image.GetSpacing()),
+        'origin': tuple(image.GetOrigin()),
+        'direction': itk.array_from_matrix(image.GetDirection()).tolist(),
+    }
+    return shm, metadata
+
+
+def image_from_shared(metadata):
+    """Rebuild an image from a shared memory block.
+
+    The voxels are copied out of the block, so the block can be closed (and
+    unlinked) as soon as this function returns.
+
+    Args:
+        metadata (dict): The metadata returned by share_image().
+
+    Returns:
+        The ITK image.
+    """
+    shm = shared_memory.SharedMemory(name=metadata['name'])
+    try:
+        shared_array = np.ndarray(
+            metadata['shape'], dtype=metadata['dtype'], buffer=shm.buf
+        )
+        image = itk.GetImageFromArray(
+            shared_array, is_vector=metadata['is_vector']
+        )
+        del shared_array
+    finally:
+        shm.close()
+    image.SetSpacing(metadata['spacing'])
+    image.SetOrigin(metadata['origin'])
+    image.SetDirection(
+        itk.matrix_from_array(np.array(metadata['direction'], dtype=float))
+    )
+    return image
+
+
+def release_shared(metadata):
+    """Unlink the shared memory block described by metadata.
+
+    Args:
+        metadata (dict): The metadata returned by share_image().
+    """
+    try:
+        shm = shared_memory.SharedMemory(name=metadata['name'])
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _run_in_worker(method_name, input_metadata, args, kwargs):
+    """Run an ImageProcessLogic method on a shared image in a worker.
+
+    Returns:
+        dict: The metadata of the shared memory block holding the output.
+    """
+    input_image = image_from_shared(input_metadata)
+    logic = ImageProcessLogic()
+    output_image = getattr(logic, method_name)(input_image, *args, **kwargs)
+    output_shm, output_metadata = share_image(output_image, track=False)
+    output_shm.close()
+    return output_metadata
+
+
+def get_worker_compute_config(max_workers):
+    """Get the compute configuration of the worker processes.
+
+    The workers run at the same time, so each one is limited to its share
+    of the cores, rather than using every core for ITK's threads.  The
+    workers do not use VTK, so its settings are not applied.
+
+    Args:
+        max_workers (int): The number of worker processes.
+
+    Returns:
+        dict: The keyword arguments of apply_compute_config().
+    """
+    compute_config = get_compute_config()
+    compute_config['vtk_smp_backend'] = ''
+    compute_config['vtk_smp_threads'] = 0
+    worker_threads = max(1, (os.cpu_count() or 1) // max_workers)
+    if (
+        compute_config['itk_threads'] == 0
+        or compute_config['itk_threads'] > worker_threads
+    ):
+        compute_config['itk_threads'] = worker_threads
+    return compute_config
+
+
+def _initialize_worker(compute_config):
+    apply_compute_config(**compute_config)
+
+
+class ImageProcessExecutor:
+    def __init__(self, max_workers=None):
+        """Initialize the executor.
+
+        The worker processes are started the first time an operation is
+        submitted.
+
+        Args:
+            max_workers (int?): The number of worker processes.  Defaults to
+                the number of cores.
+        """
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        self.max_workers = max_workers
+        self.pool = None
+
+    def get_pool(self):
+        """Get the pool of worker processes, starting it if necessary.
+
+        Workers are spawned, rather than forked, so they do not inherit the
+        Qt and VTK state of the GUI process.  Each worker applies the
+        application's compute configuration, with its ITK threads limited
+        to its share of the cores (see get_worker_compute_config).
+
+        Returns:
+            concurrent.futures.ProcessPoolExecutor: The pool.
+        """
+        if self.pool is None:
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_initialize_worker,
+                initargs=(get_worker_compute_config(self.max_workers),),
+            )
+        return self.pool
+
+    @time_and_log
+    def run(self, method_name, image, *args, **kwargs):
+        """Run an ImageProcessLogic method on an image in a worker process.
+
+        Args:
+            method_name (str): The name of the ImageProcessLogic method.
+            image: The input image, passed as the first argument of the method.
+            args: The remaining arguments of the method.
+
+        Returns:
+            The output image of the method.
+        """
+        return self.map(method_name, [image], *args, **kwargs)[0]
+
+    @time_and_log
+    def map(self, method_name, images, *args, image_kwargs=None, **kwargs):
+        """Run an ImageProcessLogic method on several images in parallel.
+
+        Each image is processed by its own worker process, using the same
+        args.  When called from a task, progress is reported as each image
+        is completed and pending images are dropped if the task is cancelled.
+
+        Args:
+            method_name (str): The name of the ImageProcessLogic method.
+            images (list): The input images.
+            args: The remaining arguments of the method.
+            image_kwargs (list?): The keyword arguments specific to each
+                image (e.g., its roi), added to kwargs.
+
+        Returns:
+            list: The output images, in the order of images.
+        """
+        if image_kwargs is None:
+            image_kwargs = [{}] * len(images)
+        pool = self.get_pool()
+        shared_inputs = [share_image(image) for image in images]
+        futures = []
+        output_images = []
+        try:
+            for (_, input_metadata), extra_kwargs in zip(
+                shared_inputs, image_kwargs
+            ):
+                futures.append(
+                    pool.submit(
+                        _run_in_worker,
+                        method_name,
+                        input_metadata,
+                        args,
+                        {**kwargs, **extra_kwargs},
+                    )
+                )
+            for i, future in enumerate(futures):
+                while not future.done():
+                    if task_cancelled():
+                        raise TaskCancelledError()
+                    concurrent.futures.wait([future], timeout=0.1)
+                output_metadata = future.result()
+                try:
+                    output_images.append(image_from_shared(output_metadata))
+                finally:
+                    release_shared(output_metadata)
+                task_progress(
+                    (i + 1) / len(futures),
+                    f'{method_name}: {i + 1} of {len(futures)} images',
+                )
+        finally:
+            for future in futures[len(output_images) :]:
+                if future.cancel():
+                    continue
+                try:
+                    release_shared(future.result())
+                except Exception:
+                    pass
+            for input_shm, _ in shared_inputs:
+                input_shm.close()
+                input_shm.unlink()
+        return output_images
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes, cancelling operations not yet started.
+
+        Args:
+            wait (bool?): Wait for the running operations to finish.
+                Defaults to True.
+        """
+        if self.pool is not None:
+            self.pool.shutdown(wait=wait, cancel_futures=True)
+            self.pool = None
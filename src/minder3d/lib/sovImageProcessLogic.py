@@ -1,46 +1,114 @@
+import concurrent.futures
+import math
+import os
+
 import itk
 import numpy as np
 from itk import TubeTK as tube
 
+from .sovComputeSettings import configure_filter
+from .sovROIUtils import (
+    extract_roi,
+    get_image_size,
+    get_roi_array_slices,
+    paste_roi,
+)
+
+# The interpolators of TubeTK's ResampleImage, fastest first
+INTERPOLATORS = ['NearestNeighbor', 'Linear', 'BSpline', 'Sinc']
+
+
+def check_interpolator(interpolator):
+    if interpolator not in INTERPOLATORS:
+        raise ValueError(
+            f'Unknown interpolator {interpolator}, use one of {INTERPOLATORS}'
+        )
+
 
 class ImageProcessLogic:
-    def make_high_res_iso(self, inputImage):
+    def make_high_res_iso(
+        self,
+        inputImage,
+        number_of_threads=None,
+        number_of_work_units=None,
+        roi=None,
+        interpolator='Sinc',
+    ):
         """Make a high resolution isotropic image from the input image.
 
         This function creates a high resolution isotropic image from the input image using resampling and interpolation.
 
         Args:
             inputImage: The input image to be processed.
+            number_of_threads (int?): The maximum number of threads used.
+                Defaults to the global compute settings.
+            number_of_work_units (int?): The number of work units used.
+                Defaults to the global compute settings.
+            roi (list?): The region of interest to be resampled.  The
+                output covers only that region.  Defaults to the whole image.
+            interpolator (str?): One of INTERPOLATORS.  Defaults to 'Sinc'.
 
         Returns:
             The high resolution isotropic image.
         """
 
+        check_interpolator(interpolator)
+        inputImage = extract_roi(inputImage, roi)
         isoImageFilter = tube.ResampleImage.New(Input=inputImage)
         isoImageFilter.SetMakeHighResIso(True)
-        isoImageFilter.SetInterpolator('Sinc')
+        isoImageFilter.SetInterpolator(interpolator)
+        configure_filter(
+            isoImageFilter, number_of_threads, number_of_work_units
+        )
         isoImageFilter.Update()
         return isoImageFilter.GetOutput()
 
-    def make_low_res_iso(self, inputImage):
+    def make_low_res_iso(
+        self,
+        inputImage,
+        number_of_threads=None,
+        number_of_work_units=None,
+        roi=None,
+        interpolator='Sinc',
+    ):
         """Make the input image isotropic with low resolution.
 
-        This function resamples the input image to make it isotropic with low resolution using the Sinc interpolator.
+        This function resamples the input image to make it isotropic with low resolution using the given interpolator.
 
         Args:
             inputImage: The input image to be made isotropic with low resolution.
+            number_of_threads (int?): The maximum number of threads used.
+                Defaults to the global compute settings.
+            number_of_work_units (int?): The number of work units used.
+                Defaults to the global compute settings.
+            roi (list?): The region of interest to be resampled.  The
+                output covers only that region.  Defaults to the whole image.
+            interpolator (str?): One of INTERPOLATORS.  Defaults to 'Sinc'.
 
         Returns:
             The isotropic low resolution image.
         """
 
+        check_interpolator(interpolator)
+        inputImage = extract_roi(inputImage, roi)
         isoImageFilter = tube.ResampleImage.New(Input=inputImage)
         isoImageFilter.SetMakeIsotropic(True)
-        isoImageFilter.SetInterpolator('Sinc')
+        isoImageFilter.SetInterpolator(interpolator)
+        configure_filter(
+            isoImageFilter, number_of_threads, number_of_work_units
+        )
         isoImageFilter.Update()
         return isoImageFilter.GetOutput()
 
-    def make_iso(self, inputImage, spacingX):
+    def make_iso(
+        self,
+        inputImage,
+        spacingX,
+        number_of_threads=None,
+        number_of_work_units=None,
+        roi=None,
+        interpolator='Sinc',
+    ):
         """Resamples the input image to have isotropic spacing.
 
         This function resamples the input image to have isotropic spacing in all three dimensions.
@@ -48,6 +116,13 @@ class ImageProcessLogic:
         Args:
             inputImage: The input image to be resampled.
             spacingX (float): The desired isotropic spacing value.
+            number_of_threads (int?): The maximum number of threads used.
+                Defaults to the global compute settings.
+            number_of_work_units (int?): The number of work units used.
+                Defaults to the global compute settings.
+            roi (list?): The region of interest to be resampled.  The
+                output covers only that region.  Defaults to the whole image.
+            interpolator (str?): One of INTERPOLATORS.  Defaults to 'Sinc'.
 
         Returns:
             vtkImageData: The resampled image with isotropic spacing.
@@ -55,28 +130,178 @@ class ImageProcessLogic:
 
         spacing = [spacingX, spacingX, spacingX]
 
+        check_interpolator(interpolator)
+        inputImage = extract_roi(inputImage, roi)
         isoImageFilter = tube.ResampleImage.New(Input=inputImage)
         isoImageFilter.SetSpacing(spacing)
-        isoImageFilter.SetInterpolator('Sinc')
+        isoImageFilter.SetInterpolator(interpolator)
+        configure_filter(
+            isoImageFilter, number_of_threads, number_of_work_units
+        )
         isoImageFilter.Update()
         return isoImageFilter.GetOutput()
 
-    def clip_window_level(self, inputImage, inputArray, imin, imax):
+    def clip_window_level(self, inputImage, inputArray, imin, imax, roi=None):
         flip = False
         if imin > imax:
             tmp = imin
             imin = imax
             imax = tmp
             flip = True
-        image_array = np.clip(inputArray, imin, imax)
-        if flip:
-            image_array = imax - image_array
+        if roi is None:
+            image_array = np.clip(inputArray, imin, imax)
+            if flip:
+                image_array = imax - image_array
+        else:
+            roi_slices = get_roi_array_slices(roi, get_image_size(inputImage))
+            image_array = inputArray.copy()
+            roi_array = np.clip(inputArray[roi_slices], imin, imax)
+            if flip:
+                roi_array = imax - roi_array
+            image_array[roi_slices] = roi_array
         img = itk.GetImageFromArray(image_array)
         img.CopyInformation(inputImage)
         return img
 
-    def median_filter(self, inputImage, radius):
-        medFilter = itk.MedianImageFilter.New(Input=inputImage)
-        medFilter.SetRadius(radius)
-        medFilter.Update()
-        return medFilter.GetOutput()
+    def process_in_slabs(
+        self,
+        inputImage,
+        slab_filter,
+        halo,
+        slab_thickness=None,
+        max_workers=None,
+    ):
+        """Apply a neighbourhood filter to an image one z-slab at a time.
+
+        The image is split into z-slabs that are extended by halo slices on
+        each side, so the filter sees the same neighbourhood at the slab
+        borders as it would for the whole image.  The slabs are filtered in
+        parallel and the centre of each filtered slab is written into an
+        output image allocated up front, so at most max_workers slabs are in
+        memory beyond the input and output images.
+
+        Tiling does not reduce the peak memory of filters that only allocate
+        their output, e.g., the median filter: the filtered slabs in flight
+        are added to the same input and output images.  It is useful for
+        filters that scale poorly across threads, or that allocate large
+        intermediate images.
+
+        Args:
+            inputImage: The image to be filtered.
+            slab_filter (function): Called with the ITK image of a slab and
+                returns the filtered slab, with the same size and pixel type.
+            halo (int): The number of slices the filter's neighbourhood
+                extends in z, e.g., its radius.
+            slab_thickness (int?): The number of output slices per slab.
+                Defaults to splitting the image into 4 slabs per worker.
+            max_workers (int?): The number of slabs filtered at once.
+                Defaults to the number of cores.
+
+        Returns:
+            The filtered image.
+        """
+        input_array = itk.GetArrayViewFromImage(inputImage)
+        num_slices = input_array.shape[0]
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if slab_thickness is None:
+            slab_thickness = math.ceil(num_slices / (4 * max_workers))
+        slab_thickness = max(1, slab_thickness)
+
+        outputImage = type(inputImage).New()
+        outputImage.SetRegions(inputImage.GetLargestPossibleRegion())
+        outputImage.CopyInformation(inputImage)
+        outputImage.Allocate()
+        output_array = itk.GetArrayViewFromImage(outputImage)
+
+        origin = np.array(inputImage.GetOrigin())
+        slice_offset = (
+            itk.array_from_matrix(inputImage.GetDirection())[:, 2]
+            * inputImage.GetSpacing()[2]
+        )
+
+        def filter_slab(slab_start):
+            slab_end = min(num_slices, slab_start + slab_thickness)
+            halo_start = max(0, slab_start - halo)
+            halo_end = min(num_slices, slab_end + halo)
+            slab_image = itk.GetImageViewFromArray(
+                input_array[halo_start:halo_end]
+            )
+            slab_image.SetSpacing(inputImage.GetSpacing())
+            slab_image.SetDirection(inputImage.GetDirection())
+            slab_image.SetOrigin(origin + halo_start * slice_offset)
+            filtered_image = slab_filter(slab_image)
+            filtered_array = itk.GetArrayViewFromImage(filtered_image)
+            output_array[slab_start:slab_end] = filtered_array[
+                slab_start - halo_start : slab_end - halo_start
+            ]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            list(
+                executor.map(filter_slab, range(0, num_slices, slab_thickness))
+            )
+
+        return outputImage
+
+    def median_filter(
+        self,
+        inputImage,
+        radius,
+        number_of_threads=None,
+        number_of_work_units=None,
+        tiled=False,
+        slab_thickness=None,
+        roi=None,
+    ):
+        """Apply a median filter to an image.
+
+        Args:
+            inputImage: The image to be filtered.
+            radius (int or list): The radius of the median's neighbourhood.
+            number_of_threads (int?): The maximum number of threads used.
+                Defaults to the global compute settings.
+            number_of_work_units (int?): The number of work units used per
+                slab. Defaults to the global compute settings.
+            tiled (bool?): Filter the image in z-slabs, one thread per slab
+                (see process_in_slabs).  The median filter only allocates
+                its output, so tiling does not reduce its peak memory; the
+                'median-memory' benchmark compares both variants.  Defaults
+                to False.
+            slab_thickness (int?): The number of slices per slab.  Defaults
+                to the choice of process_in_slabs().
+            roi (list?): The region of interest to be filtered.  Voxels
+                outside of it are left unchanged.  Defaults to the whole
+                image.
+
+        Returns:
+            The filtered image.
+        """
+
+        def filter_image(image, number_of_threads):
+            medFilter = itk.MedianImageFilter.New(Input=image)
+            medFilter.SetRadius(radius)
+            configure_filter(medFilter, number_of_threads, number_of_work_units)
+            medFilter.Update()
+            return medFilter.GetOutput()
+
+        # The region is padded by the radius so that the voxels at its border
+        # see the same neighbourhood as they would in the whole image.
+        roiImage = extract_roi(inputImage, roi, pad=radius)
+
+        if not tiled:
+            outputImage = filter_image(roiImage, number_of_threads)
+        else:
+            # Each slab is filtered by a single thread; the parallelism
+            # comes from filtering several slabs at once.
+            halo = radius[2] if np.ndim(radius) > 0 else radius
+            outputImage = self.process_in_slabs(
+                roiImage,
+                lambda image: filter_image(image, 1),
+                halo,
+                slab_thickness=slab_thickness,
+                max_workers=number_of_threads,
+            )
+
+        if roi is None:
+            return outputImage
+        return paste_roi(inputImage, outputImage, roi, pad=radius)
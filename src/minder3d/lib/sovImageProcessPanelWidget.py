@@ -1,3 +1,5 @@
+import os
+
 from PySide6.QtWidgets import QWidget
 
 from .sovImageProcessLogic import ImageProcessLogic
@@ -29,47 +31,149 @@ class ImageProcessPanelWidget(QWidget, Ui_ImageProcessPanelWidget):
         self.imageProcessMedianFilterButton.clicked.connect(self.median_filter)
 
     @time_and_log
-    def make_high_res_iso(self):
-        img = self.logic.make_high_res_iso(
-            self.state.image[self.state.current_image_num]
+    def submit_image_task(self, name, func, *args, update_overlay=True):
+        """Run an image processing function on the current image as a task.
+
+        Args:
+            name (str): The name of the task, shown in the status bar.
+            func (function): The logic function, called with the current image
+                followed by args.
+            update_overlay (bool?): Resample the overlay to match the new
+                image. Defaults to True.
+        """
+        src_img = self.state.image[self.state.current_image_num]
+        self.gui.task_runner.submit(
+            func,
+            src_img,
+            *args,
+            name=name,
+            on_result=lambda img: self.image_task_done(
+                img, src_img, update_overlay
+            ),
         )
-        if self.imageProcessCreateNewImageCheckBox.isChecked():
-            self.gui.create_new_image(img)
+
+    @time_and_log
+    def submit_image_process(
+        self, name, method_name, *args, update_overlay=True
+    ):
+        """Run an ImageProcessLogic method in the worker processes as a task.
+
+        The current image, or every loaded image if "Process All Images" is
+        checked, is processed.  Multiple images are processed in parallel.
+        Each image is processed within its region of interest, if it has one.
+
+        Args:
+            name (str): The name of the task, shown in the status bar.
+            method_name (str): The name of the ImageProcessLogic method,
+                called with an image followed by args.
+            update_overlay (bool?): Resample the overlay to match the new
+                image. Defaults to True.
+        """
+        if self.imageProcessAllImagesCheckBox.isChecked():
+            img_nums = list(range(len(self.state.image)))
         else:
-            self.gui.replace_image(img)
+            img_nums = [self.state.current_image_num]
+        src_imgs = [self.state.image[num] for num in img_nums]
+        self.gui.task_runner.submit(
+            self.gui.image_process_executor.map,
+            method_name,
+            src_imgs,
+            *args,
+            image_kwargs=[{'roi': self.state.roi[num]} for num in img_nums],
+            name=name,
+            on_result=lambda imgs: self.images_task_done(
+                imgs, src_imgs, method_name, update_overlay
+            ),
+        )
+
+    def find_image(self, img):
+        """Find the number of a loaded image.
+
+        Images can be loaded, unloaded, or replaced while a task runs, so
+        tasks identify the images they process by the image objects.
+
+        Returns:
+            int: The number of the image, or -1 if it is no longer loaded.
+        """
+        for num, loaded_img in enumerate(self.state.image):
+            if loaded_img is img:
+                return num
+        return -1
+
+    @time_and_log
+    def images_task_done(self, imgs, src_imgs, tag, update_overlay=True):
+        """Add or replace the images produced by an image processing task.
+
+        Args:
+            imgs (list): The images produced by the task.
+            src_imgs (list): The images that were processed.
+            tag (str): The tag appended to the filenames of new images when
+                more than one image was processed.
+            update_overlay (bool?): Resample the overlays to match the new
+                images. Defaults to True.
+        """
+        if len(imgs) == 1:
+            self.image_task_done(imgs[0], src_imgs[0], update_overlay)
+            return
+
+        current_image_num = self.state.current_image_num
+        for img, src_img in zip(imgs, src_imgs):
+            img_num = self.find_image(src_img)
+            if img_num < 0:
+                self.gui.log('Processed image was unloaded.', 'warning')
+                continue
+            if self.imageProcessCreateNewImageCheckBox.isChecked():
+                filename, fileext = os.path.splitext(
+                    self.state.image_filename[img_num]
+                )
+                self.gui.create_new_image(img, f'{filename}_{tag}{fileext}')
+            else:
+                self.state.current_image_num = img_num
+                self.gui.replace_image(img, update_overlay=update_overlay)
+        self.state.current_image_num = current_image_num
 
         self.gui.update_image()
-        if self.gui.state.view2D_overlay_auto_update:
+        if update_overlay and self.gui.state.view2D_overlay_auto_update:
             self.gui.update_overlay()
 
     @time_and_log
-    def make_low_res_iso(self):
-        img = self.logic.make_low_res_iso(
-            self.state.image[self.state.current_image_num]
-        )
+    def image_task_done(self, img, src_img, update_overlay=True):
+        """Add or replace the image produced by an image processing task.
+
+        Args:
+            img: The image produced by the task.
+            src_img: The image that was processed.
+            update_overlay (bool?): Resample the overlay to match the new
+                image. Defaults to True.
+        """
         if self.imageProcessCreateNewImageCheckBox.isChecked():
             self.gui.create_new_image(img)
         else:
-            self.gui.replace_image(img)
+            img_num = self.find_image(src_img)
+            if img_num < 0:
+                self.gui.log('Processed image was unloaded.', 'warning')
+                return
+            self.state.current_image_num = img_num
+            self.gui.replace_image(img, update_overlay=update_overlay)
 
         self.gui.update_image()
-        if self.gui.state.view2D_overlay_auto_update:
+        if update_overlay and self.gui.state.view2D_overlay_auto_update:
             self.gui.update_overlay()
 
     @time_and_log
-    def make_iso(self):
-        spacingX = self.imageProcessIsoSpinBox.value()
-        img = self.logic.make_low_res_iso(
-            self.state.image[self.state.current_image_num], spacingX
+    def make_high_res_iso(self):
+        self.submit_image_process(
+            'Make High-Res Isotropic', 'make_high_res_iso'
         )
-        if self.imageProcessCreateNewImageCheckBox.isChecked():
-            self.gui.create_new_image(img)
-        else:
-            self.gui.replace_image(img)
 
-        self.gui.update_image()
-        if self.gui.state.view2D_overlay_auto_update:
-            self.gui.update_overlay()
+    @time_and_log
+    def make_low_res_iso(self):
+        self.submit_image_process('Make Low-Res Isotropic', 'make_low_res_iso')
+
+    @time_and_log
+    def make_iso(self):
+        spacingX = self.imageProcessIsoSpinBox.value()
+        self.submit_image_process('Make Isotropic', 'make_iso', spacingX)
 
     @time_and_log
     def clip_window_level(self):
@@ -79,28 +183,22 @@ class ImageProcessPanelWidget(QWidget, Ui_ImageProcessPanelWidget):
         imax = self.state.view2D_intensity_window_max[
             self.state.current_image_num
         ]
-        img = self.logic.clip_window_level(
-            self.state.image[self.state.current_image_num],
+        self.submit_image_task(
+            'Clip to Window and Level',
+            self.logic.clip_window_level,
             self.state.image_array[self.state.current_image_num],
             imin,
             imax,
+            self.state.roi[self.state.current_image_num],
+            update_overlay=False,
         )
-        if self.imageProcessCreateNewImageCheckBox.isChecked():
-            self.gui.create_new_image(img)
-        else:
-            self.gui.replace_image(img, update_overlay=False)
-
-        self.gui.update_image()
 
     @time_and_log
     def median_filter(self):
         radius = self.imageProcessMedianRadiusSpinBox.value()
-        img = self.logic.median_filter(
-            self.state.image[self.state.current_image_num], radius
+        self.submit_image_process(
+            'Median Filter',
+            'median_filter',
+            radius,
+            update_overlay=False,
         )
-        if self.imageProcessCreateNewImageCheckBox.isChecked():
-            self.gui.create_new_image(img)
-        else:
-            self.gui.replace_image(img, update_overlay=False)
-
-        self.gui.update_image()
@@ -0,0 +1,189 @@
+"""Multi-resolution pyramids of the loaded images.
+
+The levels of a pyramid are downsampled copies of an image array.  They are
+built lazily, on first request, from the next finer level, so that an image
+that is never viewed zoomed-out never pays for its pyramid.
+"""
+
+import numpy as np
+
+from .sovUtils import time_and_log
+
+
+@time_and_log
+def downsample_array(input_array, factors):
+    """Downsample an array by averaging non-overlapping blocks of voxels.
+
+    Voxels at the far edge of an axis that do not fill a complete block are
+    dropped.
+
+    Args:
+        input_array (np.ndarray): The (z, y, x) array to be downsampled.
+        factors (list): The integer block size along each array axis.
+
+    Returns:
+        np.ndarray: The downsampled array.
+    """
+    shape = [
+        max(1, input_array.shape[i] // factors[i]) for i in range(len(factors))
+    ]
+    cropped_array = input_array[
+        : shape[0] * factors[0],
+        : shape[1] * factors[1],
+        : shape[2] * factors[2],
+    ]
+    blocks = cropped_array.reshape(
+        shape[0], factors[0], shape[1], factors[1], shape[2], factors[2]
+    )
+    return blocks.mean(axis=(1, 3, 5), dtype=np.float32)
+
+
+def get_level_offset(size, level_size, factor, flipped=False):
+    """Get the position of the first displayed voxel of a level.
+
+    The levels are displayed in full resolution voxel coordinates, so that
+    the index picked in a view does not depend on the level displayed.
+    Voxel j of a level averages the full resolution voxels j * factor to
+    (j + 1) * factor - 1, so its center is (factor - 1) / 2 voxels after that
+    of voxel j * factor.  Flipped axes are displayed from their last voxel,
+    and the voxels dropped at the far edge (see downsample_array) are then
+    at the start of the displayed axis.
+
+    Args:
+        size (int): The full resolution size of the axis.
+        level_size (int): The size of the axis in the level.
+        factor (int): The downsampling factor of the axis in the level.
+        flipped (bool?): Whether the axis is displayed flipped.  Defaults to
+            False.
+
+    Returns:
+        float: The position of the center of the first displayed voxel, in
+            full resolution voxels.
+    """
+    offset = (factor - 1) / 2
+    if flipped:
+        offset += size - level_size * factor
+    return offset
+
+
+def get_view_index(position, size, spacing, flipped=False):
+    """Get the full resolution index of a position along a displayed axis.
+
+    Args:
+        position (float): The position in the view, see get_level_offset.
+        size (int): The full resolution size of the axis.
+        spacing (float): The full resolution spacing of the axis.
+        flipped (bool?): Whether the axis is displayed flipped.  Defaults to
+            False.
+
+    Returns:
+        int: The index of the voxel displayed at that position.
+    """
+    index = int(np.floor(position / spacing + 0.5))
+    if flipped:
+        index = size - index - 1
+    return index
+
+
+class ImagePyramid:
+    def __init__(self, image_array, factors=(2, 4, 8)):
+        """Initialize the pyramid of an image array.
+
+        Only the full resolution level exists after initialization.  The
+        downsampled levels are built when they are first requested.
+
+        Args:
+            image_array (np.ndarray): The full resolution (z, y, x) array.
+            factors (tuple?): The downsampling factors of the coarser levels.
+                Defaults to (2, 4, 8).
+        """
+        self.factors = [1] + sorted(factors)
+        self.image_array = image_array
+        self.levels = dict()
+        self.level_factors = dict()
+
+    def get_level(self, factor, axis=0):
+        """Get the array of a level, building it if necessary.
+
+        The levels are displayed one slice at a time, so they are only
+        downsampled in-plane: the axis the slices are taken along keeps its
+        full resolution, and scrolling still moves one slice at a time.
+        Each level is built from the next finer level with the same slicing
+        axis.  Axes that are too short to be downsampled further keep their
+        current resolution.
+
+        Args:
+            factor (int): The downsampling factor of the level.
+            axis (int?): The array axis the displayed slices are taken
+                along, which is not downsampled.  Defaults to 0 (z).
+
+        Returns:
+            np.ndarray: The array of the level.
+        """
+        if factor == 1:
+            return self.image_array
+        if (factor, axis) not in self.levels:
+            finer_factor = self.factors[self.factors.index(factor) - 1]
+            finer_array = self.get_level(finer_factor, axis)
+            relative_factor = factor // finer_factor
+            axis_factors = [
+                relative_factor if i != axis and s >= relative_factor else 1
+                for i, s in enumerate(finer_array.shape)
+            ]
+            self.levels[(factor, axis)] = downsample_array(
+                finer_array, axis_factors
+            )
+            self.level_factors[(factor, axis)] = tuple(
+                self.get_level_factors(finer_factor, axis)[i] * axis_factors[i]
+                for i in range(3)
+            )
+        return self.levels[(factor, axis)]
+
+    def get_level_factors(self, factor, axis=0):
+        """Get the effective (z, y, x) downsampling factors of a level.
+
+        Args:
+            factor (int): The downsampling factor of the level.
+            axis (int?): The array axis the slices are taken along, see
+                get_level.  Defaults to 0 (z).
+
+        Returns:
+            tuple: The downsampling factor along each array axis.
+        """
+        if factor == 1:
+            return (1, 1, 1)
+        self.get_level(factor, axis)
+        return self.level_factors[(factor, axis)]
+
+    def get_coarsest_level(self, axis=0):
+        """Get the array of the coarsest level, building it if necessary.
+
+        Args:
+            axis (int?): The array axis that is not downsampled, see
+                get_level.  Defaults to 0 (z).
+
+        Returns:
+            np.ndarray: The array of the coarsest level.
+        """
+        return self.get_level(self.factors[-1], axis)
+
+    def select_factor(self, pixels_per_voxel):
+        """Select the level that best matches the screen resolution.
+
+        The coarsest level whose voxels still span at most one screen pixel
+        is selected, so the downsampling is never visible.  When zoomed in
+        (a full resolution voxel spans a pixel or more) the full resolution
+        level is selected.
+
+        Args:
+            pixels_per_voxel (float): The number of screen pixels spanned by
+                a full resolution voxel.
+
+        Returns:
+            int: The downsampling factor of the selected level.
+        """
+        selected_factor = 1
+        for factor in self.factors:
+            if factor * pixels_per_voxel <= 1.0:
+                selected_factor = factor
+        return selected_factor
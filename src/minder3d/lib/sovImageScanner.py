@@ -0,0 +1,320 @@
+"""Read the information needed to register image files, without their voxels.
+
+Registering a directory lists its image files and DICOM series, then reads
+the information of each one in a worker process (see
+sovImageTablePanelWidget.register_image_files).  The size, spacing, and
+modality are read from the headers only, using ImageIO's
+ReadImageInformation(), and the thumbnail is made from the middle slice of
+the image, which is the only slice read when the file format supports
+streaming (e.g., MetaImage and NIfTI).  The voxels of a DICOM series are
+only read from its middle file.
+
+This module is imported by the worker processes, so it does not import Qt
+GUI modules; the thumbnails are returned as small arrays.
+"""
+
+import os
+
+import itk
+import numpy as np
+
+from .sovImageCatalog import format_image_size, format_image_spacing
+
+# The thumbnail arrays returned by the workers are decimated to at most
+# twice the size of the thumbnails, which are then smoothly scaled by Qt
+THUMBNAIL_SIZE = 100
+
+# The extensions of the image files registered, besides DICOM files.  Files
+# with other extensions (e.g., the .raw and .img data files of MetaImage,
+# NRRD, and Analyze headers, or reports) are not read, since they would be
+# read again each time their directory is registered.
+IMAGE_FILE_EXTENSIONS = (
+    '.mha',
+    '.mhd',
+    '.nrrd',
+    '.nhdr',
+    '.nii',
+    '.nii.gz',
+    '.hdr',
+    '.gipl',
+    '.gipl.gz',
+    '.vtk',
+    '.mnc',
+    '.mnc2',
+    '.mrc',
+    '.rec',
+    '.hdf5',
+    '.h5',
+    '.tif',
+    '.tiff',
+    '.png',
+    '.jpg',
+    '.jpeg',
+    '.bmp',
+)
+
+
+class ImageFileEntry:
+    def __init__(self, filename, is_dicom, file_mtime, file_bytes):
+        """Initialize the entry of a file, or DICOM series, to be registered.
+
+        Args:
+            filename (str): The image file, or the directory of the series.
+            is_dicom (bool): The entry is the DICOM series of a directory.
+            file_mtime (float): The modification time of the file, or the
+                latest modification time of the files of the series.
+            file_bytes (int): The size of the file(s), in bytes.
+        """
+        self.filename = filename
+        self.is_dicom = is_dicom
+        self.file_mtime = file_mtime
+        self.file_bytes = file_bytes
+
+
+def is_dicom_file(filename):
+    """Check if a file is a DICOM file.
+
+    Files ending with '.dcm' are DICOM files, and files without an
+    extension are DICOM files if they have the 'DICM' magic number.
+    """
+    if filename.lower().endswith('.dcm'):
+        return True
+    if os.path.splitext(filename)[1] != '':
+        return False
+    try:
+        with open(filename, 'rb') as f:
+            f.seek(128)
+            return f.read(4) == b'DICM'
+    except OSError:
+        return False
+
+
+def list_image_files(dir):
+    """List the files of a directory, and its subdirectories, to be registered.
+
+    The DICOM files of a directory are registered as one series, named
+    after the directory, as itk.imread() reads them; its other image files
+    (see IMAGE_FILE_EXTENSIONS) are registered individually.
+
+    Args:
+        dir (str): The directory.
+
+    Returns:
+        list: The ImageFileEntry of each file and series.
+    """
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(dir):
+        dirnames.sort()
+        dicom_mtime = None
+        dicom_bytes = 0
+        for name in sorted(filenames):
+            filename = os.path.join(dirpath, name)
+            is_dicom = is_dicom_file(filename)
+            if not is_dicom and not name.lower().endswith(
+                IMAGE_FILE_EXTENSIONS
+            ):
+                continue
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            if is_dicom:
+                if dicom_mtime is None or stat.st_mtime > dicom_mtime:
+                    dicom_mtime = stat.st_mtime
+                dicom_bytes += stat.st_size
+            else:
+                entries.append(
+                    ImageFileEntry(filename, False, stat.st_mtime, stat.st_size)
+                )
+        if dicom_mtime is not None:
+            entries.append(
+                ImageFileEntry(dirpath, True, dicom_mtime, dicom_bytes)
+            )
+    return entries
+
+
+def get_thumbnail_array(img, arr=None):
+    """Get the normalized middle slice of an image, for its thumbnail.
+
+    Args:
+        img: The image, used for its direction.
+        arr (np.ndarray?): The voxels to be used.  Defaults to the voxels
+            of img, but a downsampled array of the image, or a slab around
+            its middle slice, is sufficient.
+
+    Returns:
+        np.ndarray: The uint8 slice, in display orientation.
+    """
+    if arr is None:
+        arr = itk.GetArrayViewFromImage(img)
+    flipX = int(np.sign(np.sum(img.GetDirection(), axis=1)[0])) or 1
+    flipY = int(np.sign(np.sum(img.GetDirection(), axis=1)[1])) or 1
+    if img.GetImageDimension() == 2:
+        thumb_array = arr[::flipY, ::flipX]
+    else:
+        thumb_array = arr[arr.shape[0] // 2, ::flipY, ::flipX]
+    if len(thumb_array.shape) == 3:
+        thumb_array = thumb_array.mean(axis=2)
+    auto_range = np.quantile(thumb_array, [0.05, 0.95])
+    if auto_range[1] <= auto_range[0]:
+        auto_range[1] = auto_range[0] + 1
+    thumb_array = np.clip(thumb_array, auto_range[0], auto_range[1])
+    thumb_array = (
+        (thumb_array - auto_range[0]) / (auto_range[1] - auto_range[0]) * 255
+    ).astype(np.uint8)
+    return np.ascontiguousarray(thumb_array)
+
+
+def decimate_thumbnail_array(thumb_array):
+    """Decimate a thumbnail array to at most twice the thumbnail size."""
+    step = max(1, int(np.ceil(max(thumb_array.shape) / (2 * THUMBNAIL_SIZE))))
+    return np.ascontiguousarray(thumb_array[::step, ::step])
+
+
+def read_middle_slice(filename, image_io):
+    """Read the middle slice of an image file, streaming it if possible.
+
+    Multi-component (e.g., RGB) pixels are converted to their luminance.
+
+    Args:
+        filename (str): The image file.
+        image_io: The ImageIO of the file, whose information was read.
+
+    Returns:
+        itk.Image: The middle slice of a 3D image, or the whole 2D image.
+    """
+    dimension = image_io.GetNumberOfDimensions()
+    ImageType = itk.Image[itk.F, dimension]
+    image_io.SetUseStreamedReading(True)
+    reader = itk.ImageFileReader[ImageType].New(
+        FileName=filename, ImageIO=image_io
+    )
+    if dimension == 2:
+        reader.Update()
+        return reader.GetOutput()
+
+    reader.UpdateOutputInformation()
+    region = reader.GetOutput().GetLargestPossibleRegion()
+    index = region.GetIndex()
+    size = region.GetSize()
+    index[2] += size[2] // 2
+    size[2] = 1
+    region.SetIndex(index)
+    region.SetSize(size)
+    # The extraction region is propagated to the reader, which only reads
+    # that slice if its ImageIO can stream
+    extract = itk.ExtractImageFilter[ImageType, ImageType].New(
+        Input=reader.GetOutput(), ExtractionRegion=region
+    )
+    extract.Update()
+    return extract.GetOutput()
+
+
+def read_image_file_information(filename):
+    """Read the information of an image file.
+
+    Returns:
+        dict: The formatted 'size' and 'spacing' of the image, its
+            'modality', and its 'thumbnail' array, or None if the file is
+            not an image.
+    """
+    image_io = itk.ImageIOFactory.CreateImageIO(
+        filename, itk.CommonEnums.IOFileMode_ReadMode
+    )
+    if image_io is None:
+        return None
+    image_io.SetFileName(filename)
+    image_io.ReadImageInformation()
+    dimension = image_io.GetNumberOfDimensions()
+    size = [image_io.GetDimensions(i) for i in range(dimension)]
+    spacing = [image_io.GetSpacing(i) for i in range(dimension)]
+
+    thumbnail = None
+    if dimension in (2, 3):
+        middle_slice = read_middle_slice(filename, image_io)
+        thumbnail = decimate_thumbnail_array(get_thumbnail_array(middle_slice))
+
+    return {
+        'size': format_image_size(size),
+        'spacing': format_image_spacing(spacing),
+        'modality': '',
+        'thumbnail': thumbnail,
+        'thumbnail_spacing': spacing[:2],
+    }
+
+
+def read_dicom_series_information(dir):
+    """Read the information of the DICOM series of a directory.
+
+    The series is the one itk.imread() reads from the directory.  Only the
+    headers of its first and last files are read, and the voxels of its
+    middle file.
+
+    Returns:
+        dict: See read_image_file_information, or None if the directory
+            has no readable series.
+    """
+    names_generator = itk.GDCMSeriesFileNames.New()
+    names_generator.SetUseSeriesDetails(True)
+    names_generator.AddSeriesRestriction('0008|0021')
+    names_generator.SetGlobalWarningDisplay(False)
+    names_generator.SetDirectory(dir)
+    series_uids = names_generator.GetSeriesUIDs()
+    if len(series_uids) == 0:
+        return None
+    filenames = names_generator.GetFileNames(series_uids[0])
+
+    image_io = itk.GDCMImageIO.New()
+    image_io.SetFileName(filenames[0])
+    image_io.ReadImageInformation()
+    size = [image_io.GetDimensions(0), image_io.GetDimensions(1)]
+    spacing = [image_io.GetSpacing(0), image_io.GetSpacing(1)]
+    modality = image_io.GetValueFromTag('0008|0060', '')[1].strip()
+    if len(filenames) > 1:
+        first_origin = np.array([image_io.GetOrigin(i) for i in range(3)])
+        last_io = itk.GDCMImageIO.New()
+        last_io.SetFileName(filenames[-1])
+        last_io.ReadImageInformation()
+        last_origin = np.array([last_io.GetOrigin(i) for i in range(3)])
+        slice_spacing = np.linalg.norm(last_origin - first_origin) / (
+            len(filenames) - 1
+        )
+        size.append(len(filenames))
+        spacing.append(float(slice_spacing) or image_io.GetSpacing(2))
+    else:
+        size.append(image_io.GetDimensions(2))
+        spacing.append(image_io.GetSpacing(2))
+
+    middle_io = itk.GDCMImageIO.New()
+    middle_slice = itk.imread(
+        filenames[len(filenames) // 2], itk.F, imageio=middle_io
+    )
+
+    return {
+        'size': format_image_size(size),
+        'spacing': format_image_spacing(spacing),
+        'modality': modality,
+        'thumbnail': decimate_thumbnail_array(
+            get_thumbnail_array(middle_slice)
+        ),
+        'thumbnail_spacing': spacing[:2],
+    }
+
+
+def read_image_information(filename, is_dicom):
+    """Read the information of a file, or DICOM series, in a worker process.
+
+    Args:
+        filename (str): The image file, or the directory of the series.
+        is_dicom (bool): Read the DICOM series of the directory.
+
+    Returns:
+        dict: See read_image_file_information, or None if the file cannot
+            be read.
+    """
+    try:
+        if is_dicom:
+            return read_dicom_series_information(filename)
+        return read_image_file_information(filename)
+    except RuntimeError:
+        return None
@@ -0,0 +1,445 @@
+"""The model of the image table.
+
+The image table lists the loaded images, the loaded scene, and the files
+recorded in the image catalog.  Rather than rebuilding the whole
+table whenever something changes, ImageTableModel.refresh() compares the
+new rows to the displayed ones, and only inserts, removes, or repaints the
+rows that differ.  The thumbnails of the recorded files are decoded when
+their rows are first painted, by the thumbnail cache.
+
+The catalog can hold tens of thousands of files, so its records are
+fetched a page at a time as the table is scrolled, and are sorted and
+filtered by catalog queries.
+"""
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PySide6.QtGui import QIcon
+
+from .sovImageTableSettings import (
+    ImageTableSettings,
+    get_image_size_str,
+    get_image_spacing_str,
+)
+from .sovUtils import time_and_log
+
+IMAGE_TABLE_COLUMNS = [
+    'Selected',
+    'Loaded',
+    'Type',
+    'Thumbnail',
+    'Label',
+    'Modality',
+    'Size',
+    'Spacing',
+    'Filename',
+]
+COL_SELECTED = 0
+COL_LOADED = 1
+COL_FILETYPE = 2
+COL_THUMBNAIL = 3
+COL_LABEL = 4
+COL_MODALITY = 5
+COL_SIZE = 6
+COL_SPACING = 7
+COL_FILENAME = 8
+
+# The catalog sort keys of the columns (see sovImageCatalog.query)
+IMAGE_TABLE_SORT_KEYS = {
+    COL_FILETYPE: 'file_type',
+    COL_LABEL: 'label',
+    COL_MODALITY: 'modality',
+    COL_SIZE: 'size',
+    COL_SPACING: 'spacing',
+    COL_FILENAME: 'filename',
+}
+
+# The number of records fetched at a time, as the table is scrolled
+IMAGE_TABLE_PAGE_SIZE = 200
+
+CHECKED = '\u25a3'
+UNCHECKED = '\u25a1'
+
+
+class ImageTableRow:
+    def __init__(
+        self,
+        file_type,
+        filename,
+        loaded,
+        label='',
+        size='',
+        spacing='',
+        modality='',
+        thumbnail=None,
+        thumbnail_file='',
+    ):
+        """Initialize a row of the image table.
+
+        Args:
+            file_type (str): 'Image' or 'Scene'.
+            filename (str): The name of the file.
+            loaded (bool): The file is loaded.
+            label (str?): The short display-name of the file.
+            size (str?): The formatted size of the file.
+            spacing (str?): The formatted spacing of the file.
+            modality (str?): The modality of an image.
+            thumbnail (QPixmap?): The thumbnail of a loaded file.
+            thumbnail_file (str?): The thumbnail key of a recorded file (see
+                sovThumbnailCache), decoded when the row is painted.
+        """
+        self.file_type = file_type
+        self.filename = filename
+        self.loaded = loaded
+        self.label = label
+        self.size = size
+        self.spacing = spacing
+        self.modality = modality
+        self.thumbnail = thumbnail
+        self.thumbnail_file = thumbnail_file
+
+    def key(self):
+        """Identify the file of the row, to match rows across refreshes."""
+        return (self.file_type, self.filename, self.loaded)
+
+    def values(self):
+        """Get what is displayed by the row, to detect changed rows."""
+        thumbnail_key = (
+            self.thumbnail.cacheKey() if self.thumbnail is not None else None
+        )
+        return (
+            self.label,
+            self.size,
+            self.spacing,
+            self.modality,
+            thumbnail_key,
+            self.thumbnail_file,
+        )
+
+
+class ImageTableModel(QAbstractTableModel):
+    def __init__(self, state, settings=None, parent=None):
+        """Initialize the model of the image table.
+
+        Args:
+            state: The state object for the application.
+            settings (ImageTableSettings?): The records of the files
+                registered in the table.  Defaults to the application's
+                image catalog.
+            parent: The parent object (default is None).
+        """
+        super().__init__(parent)
+
+        self.state = state
+        if settings is None:
+            settings = ImageTableSettings()
+        self.settings = settings
+
+        self.rows = []
+        self.selected = []
+
+        self.settings.thumbnail_cache.thumbnail_ready.connect(
+            self.set_record_thumbnail
+        )
+
+        self.filter_text = ''
+        self.sort_key = 'added'
+        self.sort_descending = False
+        self.n_fetched_records = 0
+        self.n_records = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(IMAGE_TABLE_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return IMAGE_TABLE_COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+        row = self.rows[index.row()]
+        col = index.column()
+        if role == Qt.DisplayRole:
+            if col == COL_SELECTED:
+                return CHECKED if index.row() in self.selected else UNCHECKED
+            elif col == COL_LOADED:
+                return CHECKED if row.loaded else ' '
+            elif col == COL_FILETYPE:
+                return row.file_type
+            elif col == COL_LABEL:
+                return row.label
+            elif col == COL_MODALITY:
+                return row.modality
+            elif col == COL_SIZE:
+                return row.size
+            elif col == COL_SPACING:
+                return row.spacing
+            elif col == COL_FILENAME:
+                return row.filename
+        elif role == Qt.DecorationRole and col == COL_THUMBNAIL:
+            thumbnail = self.get_row_thumbnail(row)
+            if thumbnail is not None:
+                return QIcon(thumbnail)
+        return None
+
+    def get_row_thumbnail(self, row):
+        """Get the thumbnail of a row from the thumbnail cache.
+
+        The thumbnail of an image that is not in the cache is made in the
+        background, and its row is repainted once it is ready (see
+        set_record_thumbnail).
+
+        Returns:
+            QPixmap: The thumbnail, or None if the row has none (yet).
+        """
+        if row.thumbnail is not None:
+            return row.thumbnail
+        thumbnail_cache = self.settings.thumbnail_cache
+        thumbnail = thumbnail_cache.get_pixmap(row.thumbnail_file)
+        if thumbnail is None and row.file_type == 'Image':
+            thumbnail_cache.request(row.filename)
+        return thumbnail
+
+    def set_record_thumbnail(self, filename, thumbnail_key):
+        """Set the thumbnail of a record once it was made in the background."""
+        self.settings.catalog.set_thumbnail(filename, thumbnail_key)
+        for row_num, row in enumerate(self.rows):
+            if not row.loaded and row.filename == filename:
+                row.thumbnail_file = thumbnail_key
+                self.redraw_row(row_num)
+
+    def get_row(self, row_num):
+        """Get the ImageTableRow displayed at a row of the table."""
+        return self.rows[row_num]
+
+    def get_loaded_filenames(self):
+        """Get the filenames of the loaded files, not listed as records."""
+        filenames = list(self.state.image_filename)
+        if self.state.scene_filename:
+            filenames.append(self.state.scene_filename)
+        return filenames
+
+    def get_modality(self, filename):
+        record = self.settings.catalog.get_record(filename)
+        if record is None:
+            return ''
+        return record.modality
+
+    def make_loaded_rows(self):
+        """Make the rows of the loaded images and of the loaded scene."""
+        rows = []
+        for img_num, img in enumerate(self.state.image):
+            filename = self.state.image_filename[img_num]
+            rows.append(
+                ImageTableRow(
+                    'Image',
+                    filename,
+                    True,
+                    str(self.state.image_label[img_num]),
+                    get_image_size_str(img),
+                    get_image_spacing_str(img),
+                    self.get_modality(filename),
+                    thumbnail=self.state.image_thumbnail[img_num],
+                )
+            )
+        if self.state.scene.GetNumberOfChildren() > 0:
+            rows.append(
+                ImageTableRow(
+                    'Scene',
+                    str(self.state.scene_filename),
+                    True,
+                    self.state.scene_label,
+                    str(self.state.scene.GetNumberOfChildren()),
+                    'N/A',
+                    thumbnail=self.state.scene_thumbnail,
+                )
+            )
+        return rows
+
+    def make_record_rows(self, offset, limit):
+        """Make the rows of a page of the catalog records.
+
+        The records are filtered and sorted by the catalog, and exclude the
+        loaded files.
+
+        Args:
+            offset (int): The number of records skipped.
+            limit (int): The maximum number of records.
+        """
+        records = self.settings.catalog.query(
+            text=self.filter_text,
+            exclude=self.get_loaded_filenames(),
+            sort=self.sort_key,
+            descending=self.sort_descending,
+            offset=offset,
+            limit=limit,
+        )
+        return [
+            ImageTableRow(
+                record.file_type.capitalize(),
+                record.filename,
+                False,
+                record.file_label,
+                record.file_size,
+                record.file_spacing if record.file_type == 'image' else 'N/A',
+                record.modality,
+                thumbnail_file=record.file_thumbnail,
+            )
+            for record in records
+        ]
+
+    def make_rows(self):
+        """Make the rows of the loaded files and of the fetched records.
+
+        As many records as were fetched are listed, and at least a page.
+        """
+        rows = self.make_loaded_rows()
+        record_rows = self.make_record_rows(
+            0, max(self.n_fetched_records, IMAGE_TABLE_PAGE_SIZE)
+        )
+        self.n_fetched_records = len(record_rows)
+        self.n_records = self.settings.catalog.count(
+            text=self.filter_text, exclude=self.get_loaded_filenames()
+        )
+        return rows + record_rows
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self.n_fetched_records < self.n_records
+
+    @time_and_log
+    def fetchMore(self, parent=QModelIndex()):
+        """Append the next page of records, as the table is scrolled."""
+        if parent.isValid():
+            return
+        record_rows = self.make_record_rows(
+            self.n_fetched_records, IMAGE_TABLE_PAGE_SIZE
+        )
+        if len(record_rows) == 0:
+            self.n_records = self.n_fetched_records
+            return
+        self.beginInsertRows(
+            QModelIndex(),
+            len(self.rows),
+            len(self.rows) + len(record_rows) - 1,
+        )
+        self.rows += record_rows
+        self.n_fetched_records += len(record_rows)
+        self.endInsertRows()
+
+    @time_and_log
+    def reset(self):
+        """List the first page of records again, e.g., once resorted."""
+        self.beginResetModel()
+        self.selected = []
+        self.n_fetched_records = 0
+        self.rows = self.make_rows()
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Sort the records by a column.
+
+        The loaded files are listed first, in the order they were loaded,
+        since their rows are the indexes of the images.  Columns that cannot
+        be sorted list the records in the order they were added.
+        """
+        self.sort_key = IMAGE_TABLE_SORT_KEYS.get(column, 'added')
+        self.sort_descending = order == Qt.DescendingOrder
+        self.reset()
+
+    def set_filter(self, text):
+        """Only list the records whose label, filename, or modality contain
+        the text."""
+        self.filter_text = text
+        self.reset()
+
+    @time_and_log
+    def refresh(self):
+        """Update the table to match the state and the settings records.
+
+        The rows shared by the beginning and the end of the old and new
+        tables are kept, and only repainted if their values changed; the
+        rows in between are removed and inserted.  Loading, unloading,
+        adding, or removing a file therefore only changes its own rows.
+        """
+        new_rows = self.make_rows()
+        old_keys = [row.key() for row in self.rows]
+        new_keys = [row.key() for row in new_rows]
+
+        n_prefix = 0
+        n_common = min(len(old_keys), len(new_keys))
+        while n_prefix < n_common and old_keys[n_prefix] == new_keys[n_prefix]:
+            n_prefix += 1
+        n_suffix = 0
+        while (
+            n_suffix < n_common - n_prefix
+            and old_keys[-1 - n_suffix] == new_keys[-1 - n_suffix]
+        ):
+            n_suffix += 1
+
+        old_changed_end = len(old_keys) - n_suffix
+        new_changed_end = len(new_keys) - n_suffix
+
+        changed_rows = [
+            row_num
+            for row_num in range(n_prefix)
+            if self.rows[row_num].values() != new_rows[row_num].values()
+        ]
+
+        if old_changed_end > n_prefix:
+            self.beginRemoveRows(QModelIndex(), n_prefix, old_changed_end - 1)
+            del self.rows[n_prefix:old_changed_end]
+            self.endRemoveRows()
+        if new_changed_end > n_prefix:
+            self.beginInsertRows(QModelIndex(), n_prefix, new_changed_end - 1)
+            self.rows[n_prefix:n_prefix] = new_rows[n_prefix:new_changed_end]
+            self.endInsertRows()
+
+        for row_num in range(new_changed_end, len(new_rows)):
+            if self.rows[row_num].values() != new_rows[row_num].values():
+                changed_rows.append(row_num)
+        self.rows = new_rows
+
+        self.selected = [
+            row_num for row_num in self.selected if row_num < len(self.rows)
+        ]
+
+        for row_num in changed_rows:
+            self.redraw_row(row_num)
+
+    def redraw_row(self, row_num):
+        """Repaint all the cells of a row."""
+        self.dataChanged.emit(
+            self.index(row_num, 0),
+            self.index(row_num, len(IMAGE_TABLE_COLUMNS) - 1),
+        )
+
+    def redraw_selected_cell(self, row_num):
+        """Repaint the selection checkbox of a row."""
+        index = self.index(row_num, COL_SELECTED)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+    def toggle_selected(self, row_num):
+        """Select or deselect a row, repainting its checkbox only."""
+        if row_num in self.selected:
+            self.selected.remove(row_num)
+        else:
+            self.selected.append(row_num)
+        self.redraw_selected_cell(row_num)
+
+    def clear_selected(self):
+        """Deselect all the rows, repainting their checkboxes only."""
+        selected = self.selected
+        self.selected = []
+        for row_num in selected:
+            if row_num < len(self.rows):
+                self.redraw_selected_cell(row_num)
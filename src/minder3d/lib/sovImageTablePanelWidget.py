@@ -1,32 +1,34 @@
 """This module provides the ImageTablePanelWidget class."""
 
+import concurrent.futures
 import os
 
-from itk import imread
-from PySide6.QtCore import QSize
-from PySide6.QtGui import QIcon, QPixmap
-from PySide6.QtWidgets import (
-    QHeaderView,
-    QInputDialog,
-    QTableWidget,
-    QTableWidgetItem,
-    QWidget,
-)
-
-from .sovImageTableSettings import ImageTableSettings
-from .sovUtils import time_and_log
+from PySide6.QtCore import QSize, Qt
+from PySide6.QtWidgets import QHeaderView, QInputDialog, QTableView, QWidget
+
+from .sovImageCatalog import ImageCatalogRecord
+from .sovImageScanner import list_image_files, read_image_information
+from .sovImageTableModel import COL_SELECTED, ImageTableModel
+from .sovTaskRunner import TaskCancelledError, task_cancelled, task_progress
+from .sovThumbnailCache import get_thumbnail_qimage_from_array
+from .sovUtils import sov_log, time_and_log
 from .ui_sovImageTablePanelWidget import Ui_ImageTablePanelWidget
 
+# The number of registered images added to the catalog at a time
+REGISTRATION_BATCH_SIZE = 100
+
 
 class ImageTablePanelWidget(QWidget, Ui_ImageTablePanelWidget):
     @time_and_log
-    def __init__(self, gui, state, parent=None):
+    def __init__(self, gui, state, parent=None, model=None):
         """Initialize the GUI and state for the application.
 
         Args:
             gui: The graphical user interface object.
             state: The state object for the application.
             parent: The parent widget (default is None).
+            model (ImageTableModel?): The model displayed by the table, to
+                share it with another table.  Defaults to a new model.
         """
 
         super().__init__(parent)
@@ -35,30 +37,15 @@ class ImageTablePanelWidget(QWidget, Ui_ImageTablePanelWidget):
         self.gui = gui
         self.state = state
 
-        self.settings = ImageTableSettings()
-
-        self.selected = []
-
-        self.imageTableWidget.setRowCount(0)
-        self.imageTableWidget.setColumnCount(8)
-        self.imageTableWidget.setHorizontalHeaderLabels(
-            [
-                'Selected',
-                'Loaded',
-                'Type',
-                'Thumbnail',
-                'Label',
-                'Size',
-                'Spacing',
-                'Filename',
-            ]
-        )
-        self.col_filetype = 2
-        self.col_label = 4
-        self.col_filename = 7
-        self.imageTableWidget.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.imageTableWidget.setSelectionBehavior(QTableWidget.SelectRows)
-        self.imageTableWidget.setSelectionMode(QTableWidget.SingleSelection)
+        if model is None:
+            model = ImageTableModel(state, parent=self)
+        self.model = model
+        self.settings = self.model.settings
+
+        self.imageTableWidget.setModel(self.model)
+        self.imageTableWidget.setEditTriggers(QTableView.NoEditTriggers)
+        self.imageTableWidget.setSelectionBehavior(QTableView.SelectRows)
+        self.imageTableWidget.setSelectionMode(QTableView.SingleSelection)
         self.imageTableWidget.setShowGrid(True)
         self.imageTableWidget.horizontalHeader().setSectionResizeMode(
             QHeaderView.ResizeToContents
@@ -72,7 +59,15 @@ class ImageTablePanelWidget(QWidget, Ui_ImageTablePanelWidget):
             'QTableView{ selection-background-color: rgba(0, 50, 0, 50);  }'
         )
 
-        self.imageTableWidget.cellClicked.connect(self.select_data_by_table)
+        # The records are listed in the order they were added until a column
+        # header is clicked
+        self.imageTableWidget.horizontalHeader().setSortIndicator(
+            -1, Qt.AscendingOrder
+        )
+
+        self.imageTableWidget.clicked.connect(self.select_data_by_table)
+        self.imageTableFilterLineEdit.setText(self.model.filter_text)
+        self.imageTableFilterLineEdit.textChanged.connect(self.model.set_filter)
 
         self.imageTableLoadButton.clicked.connect(self.load_selected)
         self.imageTableUnloadButton.clicked.connect(self.unload_selected)
@@ -87,44 +82,45 @@ class ImageTablePanelWidget(QWidget, Ui_ImageTablePanelWidget):
 
         self.fill_table()
 
+    @property
+    def selected(self):
+        """The rows whose selection checkbox is checked."""
+        return self.model.selected
+
     @time_and_log
     def add_import_export_panel(self):
         self.gui.tabWidget.setCurrentWidget(self.gui.importExportTab)
 
     @time_and_log
     def unload_selected(self):
-        self.selected.sort(reverse=True)
-        for row in self.selected:
+        selected = sorted(self.selected, reverse=True)
+        self.model.clear_selected()
+        for row in selected:
             if row < len(self.state.image_filename):
                 self.gui.unload_image(row, False)
             elif row == len(self.state.image_filename):
                 self.gui.unload_scene(False)
-        if len(self.selected) > 0:
-            self.selected = []
         self.fill_table()
 
     @time_and_log
     def remove_selected(self):
-        self.selected.sort(reverse=True)
-        for row in self.selected:
+        selected = sorted(self.selected, reverse=True)
+        filenames = [self.model.get_row(row).filename for row in selected]
+        self.model.clear_selected()
+        for row, filename in zip(selected, filenames):
             if row < len(self.state.image_filename):
                 fname = self.state.image_filename[row]
                 self.gui.unload_image(row, False)
                 self.settings.remove_data(fname)
             elif (
                 row == len(self.state.image_filename)
-                and self.state.scene_filename
-                == self.imageTableWidget.item(row, self.col_filename).text()
+                and self.state.scene_filename == filename
             ):
                 fname = self.state.scene_filename
-                self.gui.unload_scene()
+                self.gui.unload_scene(False)
                 self.settings.remove_data(fname)
             else:
-                self.settings.remove_data(
-                    self.imageTableWidget.item(row, self.col_filename).text()
-                )
-        if len(self.selected) > 0:
-            self.selected = []
+                self.settings.remove_data(filename)
         self.fill_table()
 
     @time_and_log
@@ -135,7 +131,11 @@ class ImageTablePanelWidget(QWidget, Ui_ImageTablePanelWidget):
     @time_and_log
     def expand_table(self):
         if self.enlarged_table is None:
-            self.enlarged_table = ImageTablePanelWidget(self.gui, self.state)
+            # The enlarged table displays the same model, so both tables are
+            # kept up to date by the model's refreshes
+            self.enlarged_table = ImageTablePanelWidget(
+                self.gui, self.state, model=self.model
+            )
             self.enlarged_table.setWindowTitle('Image Table')
             self.enlarged_table.imageTableExpandButton.setText('CLOSE')
             self.enlarged_table.imageTableExpandButton.setMinimumWidth(75)
@@ -149,275 +149,28 @@ class ImageTablePanelWidget(QWidget, Ui_ImageTablePanelWidget):
 
     @time_and_log
     def update_image(self):
-        self.selected = []
+        self.model.clear_selected()
         self.fill_table()
         # Probably need to disable selection callback when calling this function
         self.imageTableWidget.selectRow(self.state.current_image_num)
 
     @time_and_log
     def update_scene(self):
-        self.selected = []
+        self.model.clear_selected()
         self.fill_table()
         # Probably need to disable selection callback when calling this function
         self.imageTableWidget.selectRow(self.state.current_image_num)
 
-    @time_and_log
-    def redraw_image_row(self, row_num):
-        """Redraws the image at the specified index in the image table widget.
-
-        This function updates the information displayed in the image table
-        widget for the image at the specified index.
-
-        Args:
-            self: The object instance.
-            img_num (int): The index of the image to be redrawn.
-
-
-        Raises:
-            IndexError: If the specified img_num is out of range.
-        """
-
-        img_num = row_num
-        col_num = 0
-        if row_num in self.selected:
-            self.imageTableWidget.setItem(
-                row_num, col_num, QTableWidgetItem('\u25a3')
-            )
-        else:
-            self.imageTableWidget.setItem(
-                row_num, col_num, QTableWidgetItem('\u25a1')
-            )
-        col_num += 1
-        if img_num < len(self.state.image_filename):
-            self.imageTableWidget.setItem(
-                row_num, col_num, QTableWidgetItem('\u25a3')
-            )
-        else:
-            print('ERROR: Can only redraw rows for images that are loaded.')
-            self.imageTableWidget.setItem(
-                row_num, col_num, QTableWidgetItem('\u25a1')
-            )
-        col_num += 1
-        self.imageTableWidget.setItem(
-            row_num, col_num, QTableWidgetItem(str('Image'))
-        )
-        col_num += 1
-        self.imageTableWidget.setItem(
-            row_num,
-            col_num,
-            QTableWidgetItem(QIcon(self.state.image_thumbnail[img_num]), ''),
-        )
-        col_num += 1
-        self.imageTableWidget.setItem(
-            row_num,
-            col_num,
-            QTableWidgetItem(str(self.state.image_label[img_num])),
-        )
-        col_num += 1
-        size_str = [
-            str(i)
-            for i in self.state.image[img_num]
-            .GetLargestPossibleRegion()
-            .GetSize()
-        ]
-        self.imageTableWidget.setItem(
-            row_num, col_num, QTableWidgetItem('x'.join(size_str))
-        )
-        col_num += 1
-        spacing_str = [
-            f'{i:.4f}' for i in self.state.image[img_num].GetSpacing()
-        ]
-        self.imageTableWidget.setItem(
-            row_num, col_num, QTableWidgetItem(', '.join(spacing_str))
-        )
-        col_num += 1
-        filename = self.state.image_filename[img_num]
-        self.imageTableWidget.setItem(
-            row_num, col_num, QTableWidgetItem(filename)
-        )
-
-    @time_and_log
-    def redraw_scene_row(self, row_num):
-        col_num = 0
-        if row_num in self.selected:
-            self.imageTableWidget.setItem(
-                row_num, col_num, QTableWidgetItem('\u25a3')
-            )
-        else:
-            self.imageTableWidget.setItem(
-                row_num, col_num, QTableWidgetItem('\u25a1')
-            )
-        col_num += 1
-        self.imageTableWidget.setItem(
-            row_num, col_num, QTableWidgetItem('\u25a3')
-        )
-        col_num += 1
-        self.imageTableWidget.setItem(
-            row_num, col_num, QTableWidgetItem(str('Scene'))
-        )
-        col_num += 1
-        self.imageTableWidget.setItem(
-            row_num,
-            col_num,
-            QTableWidgetItem(QIcon(self.state.scene_thumbnail), ''),
-        )
-        col_num += 1
-        self.imageTableWidget.setItem(
-            row_num, col_num, QTableWidgetItem(self.state.scene_label)
-        )
-        col_num += 1
-        size = self.state.scene.GetNumberOfChildren()
-        self.imageTableWidget.setItem(
-            row_num, col_num, QTableWidgetItem(str(size))
-        )
-        col_num += 1
-        self.imageTableWidget.setItem(
-            row_num, col_num, QTableWidgetItem(str('N/A'))
-        )
-        col_num += 1
-        self.imageTableWidget.setItem(
-            row_num, col_num, QTableWidgetItem(str(self.state.scene_filename))
-        )
-
     @time_and_log
     def fill_table(self):
-        """Fill the image table with images from the state and from settings.
+        """Update the image table to match the state and the settings.
 
-        This method clears the existing image table and fills it with image
-        records from the state. It then retrieves file records from the
-        settings and adds them to the table if they are not already present.
-        For each file record, it populates the table with the file's thumbnail,
-        filename, size, and spacing.
-
-        Args:
-            self: The instance of the class.
+        The table lists the images and the scene of the state, followed by
+        the files recorded in the settings that are not loaded.  Only the
+        rows that changed since the last update are redrawn (see
+        ImageTableModel.refresh).
         """
-
-        self.imageTableWidget.clear()
-        self.imageTableWidget.setRowCount(0)
-        self.imageTableWidget.setHorizontalHeaderLabels(
-            [
-                'Selected',
-                'Loaded',
-                'Type',
-                'Thumbnail',
-                'Label',
-                'Size',
-                'Spacing',
-                'Filename',
-            ]
-        )
-        row_num = 0
-        for _ in range(len(self.state.image)):
-            self.imageTableWidget.insertRow(row_num)
-            self.redraw_image_row(row_num)
-            row_num += 1
-        if self.state.scene.GetNumberOfChildren() > 0:
-            self.imageTableWidget.insertRow(row_num)
-            self.redraw_scene_row(row_num)
-            row_num += 1
-
-        self.settings.read_file_records()
-        for file in self.settings.file_records:
-            if (
-                file.filename not in self.state.image_filename
-                and file.file_type == 'image'
-            ):
-                self.imageTableWidget.insertRow(row_num)
-                col_num = 0
-                if row_num in self.selected:
-                    self.imageTableWidget.setItem(
-                        row_num,
-                        col_num,
-                        QTableWidgetItem('\u25a3'),
-                    )
-                else:
-                    self.imageTableWidget.setItem(
-                        row_num, col_num, QTableWidgetItem('\u25a1')
-                    )
-                col_num += 1
-                loaded_text = ' '
-                self.imageTableWidget.setItem(
-                    row_num, col_num, QTableWidgetItem(loaded_text)
-                )
-                col_num += 1
-                self.imageTableWidget.setItem(
-                    row_num, col_num, QTableWidgetItem('Image')
-                )
-                col_num += 1
-                if file.file_thumbnail != '':
-                    qthumb = QPixmap(file.file_thumbnail)
-                    self.imageTableWidget.setItem(
-                        row_num, col_num, QTableWidgetItem(QIcon(qthumb), '')
-                    )
-                else:
-                    self.imageTableWidget.setItem(
-                        row_num, col_num, QTableWidgetItem(' ')
-                    )
-                col_num += 1
-                self.imageTableWidget.setItem(
-                    row_num, col_num, QTableWidgetItem(str(file.file_label))
-                )
-                col_num += 1
-                self.imageTableWidget.setItem(
-                    row_num, col_num, QTableWidgetItem(str(file.file_size))
-                )
-                col_num += 1
-                self.imageTableWidget.setItem(
-                    row_num, col_num, QTableWidgetItem(str(file.file_spacing))
-                )
-                col_num += 1
-                self.imageTableWidget.setItem(
-                    row_num, col_num, QTableWidgetItem(str(file.filename))
-                )
-                row_num += 1
-            elif (
-                file.filename != self.state.scene_filename
-                and file.file_type == 'scene'
-            ):
-                self.imageTableWidget.insertRow(row_num)
-                col_num = 0
-                if row_num in self.selected:
-                    self.imageTableWidget.setItem(
-                        row_num,
-                        col_num,
-                        QTableWidgetItem('\u25a3'),
-                    )
-                else:
-                    self.imageTableWidget.setItem(
-                        row_num, col_num, QTableWidgetItem('\u25a1')
-                    )
-                col_num += 1
-                loaded_text = ' '
-                self.imageTableWidget.setItem(
-                    row_num, col_num, QTableWidgetItem(loaded_text)
-                )
-                col_num += 1
-                self.imageTableWidget.setItem(
-                    row_num, col_num, QTableWidgetItem('Scene')
-                )
-                col_num += 1
-                qthumb = QPixmap(file.file_thumbnail)
-                self.imageTableWidget.setItem(
-                    row_num, col_num, QTableWidgetItem(QIcon(qthumb), '')
-                )
-                col_num += 1
-                self.imageTableWidget.setItem(
-                    row_num, col_num, QTableWidgetItem(file.file_label)
-                )
-                col_num += 1
-                self.imageTableWidget.setItem(
-                    row_num, col_num, QTableWidgetItem(file.file_size)
-                )
-                col_num += 1
-                self.imageTableWidget.setItem(
-                    row_num, col_num, QTableWidgetItem('N/A')
-                )
-                col_num += 1
-                self.imageTableWidget.setItem(
-                    row_num, col_num, QTableWidgetItem(file.filename)
-                )
-                row_num += 1
+        self.model.refresh()
 
     @time_and_log
     def create_new_image(self):
@@ -426,7 +179,10 @@ class ImageTablePanelWidget(QWidget, Ui_ImageTablePanelWidget):
         )
         self.state.image_thumbnail.append(
             self.settings.get_thumbnail(
-                self.state.image[-1], self.state.image_filename[-1], 'image'
+                self.state.image[-1],
+                self.state.image_filename[-1],
+                'image',
+                arr=self.state.image_pyramid[-1].get_coarsest_level(),
             )
         )
         self.settings.add_data(
@@ -436,7 +192,7 @@ class ImageTablePanelWidget(QWidget, Ui_ImageTablePanelWidget):
             self.state.image_label[-1],
             self.state.image_thumbnail[-1],
         )
-        self.selected = []
+        self.model.clear_selected()
         self.fill_table()
 
     @time_and_log
@@ -448,7 +204,7 @@ class ImageTablePanelWidget(QWidget, Ui_ImageTablePanelWidget):
             self.state.image_label[self.state.current_image_num],
             self.state.image_thumbnail[self.state.current_image_num],
         )
-        self.selected = []
+        self.model.clear_selected()
         self.fill_table()
 
     @time_and_log
@@ -466,7 +222,7 @@ class ImageTablePanelWidget(QWidget, Ui_ImageTablePanelWidget):
             self.state.scene_label,
             self.state.scene_thumbnail,
         )
-        self.selected = []
+        self.model.clear_selected()
         self.fill_table()
 
     @time_and_log
@@ -485,35 +241,41 @@ class ImageTablePanelWidget(QWidget, Ui_ImageTablePanelWidget):
         self.fill_table()
 
     @time_and_log
-    def replace_image(self, img_num):
-        self.redraw_image_row(img_num)
+    def replace_image(self, img_num=None):
+        """Redraw the row of an image whose voxels were replaced.
+
+        Args:
+            img_num (int?): The index of the image. Defaults to the current
+                image.
+        """
+        if img_num is None:
+            img_num = self.state.current_image_num
+        self.fill_table()
+        self.model.redraw_row(img_num)
 
     @time_and_log
     def relabel_selected(self):
         for row in self.selected:
+            table_row = self.model.get_row(row)
             widget = QWidget()
             text, ok = QInputDialog.getText(
                 widget,
-                f'Relabel {self.imageTableWidget.item(row, self.col_label).text()}',
+                f'Relabel {table_row.label}',
                 'New label:',
             )
             if ok:
-                self.settings.relabel(
-                    self.imageTableWidget.item(row, self.col_filename).text(),
-                    text,
-                )
-                self.imageTableWidget.setItem(
-                    row, self.col_label, QTableWidgetItem(text)
-                )
+                self.settings.relabel(table_row.filename, text)
+                if row < len(self.state.image_filename):
+                    self.state.image_label[row] = text
+                elif table_row.loaded:
+                    self.state.scene_label = text
+        self.fill_table()
 
     @time_and_log
-    def select_data_by_table(self, row, col):
-        if col == 0:
-            if row in self.selected:
-                self.selected.remove(row)
-            else:
-                self.selected.append(row)
-            self.fill_table()
+    def select_data_by_table(self, index):
+        row = index.row()
+        if index.column() == COL_SELECTED:
+            self.model.toggle_selected(row)
             return
         if row < len(self.state.image_filename):
             self.state.current_image_num = row
@@ -523,69 +285,145 @@ class ImageTablePanelWidget(QWidget, Ui_ImageTablePanelWidget):
 
     @time_and_log
     def load_selected(self):
-        for row in self.selected:
-            if row >= len(self.state.image_filename):
-                if (
-                    self.imageTableWidget.item(row, self.col_filetype).text()
-                    == 'Image'
-                ):
-                    self.gui.load_image(
-                        self.imageTableWidget.item(
-                            row, self.col_filename
-                        ).text()
-                    )
-                elif (
-                    self.imageTableWidget.item(row, self.col_filetype).text()
-                    == 'Scene'
-                ):
-                    self.gui.load_scene(
-                        self.imageTableWidget.item(
-                            row, self.col_filename
-                        ).text()
-                    )
-        self.selected = []
+        rows = [self.model.get_row(row) for row in self.selected]
+        self.model.clear_selected()
+        for table_row in rows:
+            if table_row.loaded:
+                continue
+            if table_row.file_type == 'Image':
+                self.gui.load_image(table_row.filename)
+            elif table_row.file_type == 'Scene':
+                self.gui.load_scene(table_row.filename)
         self.fill_table()
 
     @time_and_log
     def register_images(self, dir, redraw_table=True):
-        files = [
-            os.path.join(dir, f)
-            for f in os.listdir(dir)
-            if os.path.isfile(os.path.join(dir, f))
-        ]
-        dicom_dir = False
-        for filename in files:
-            if filename.lower().endswith('.dcm') or filename.endswith(''):
-                if dicom_dir:
-                    continue
-                else:
-                    print(f"Adding DICOM object '{filename}' to settings")
-                    filename = dir
-                    dicom_dir = True
-            else:
-                print(f"Adding NON-DICOM image '{filename}' to settings")
-            try:
-                img = imread(filename)
-            except Exception:
-                continue
-            label = os.path.basename(filename)
-            thumbnail = self.settings.get_thumbnail(img, filename, 'image')
-            self.settings.add_data(
-                img,
-                filename,
-                'image',
-                label,
-                thumbnail,
-            )
+        """Register the images in a directory and its subdirectories.
 
-        dirs = [
-            os.path.join(dir, d)
-            for d in os.listdir(dir)
-            if os.path.isdir(os.path.join(dir, d))
-        ]
-        for dirname in dirs:
-            self.register_images(dirname, False)
+        The images are read by a background task (see register_image_files),
+        which adds their records to the catalog as they are read.
 
+        Args:
+            dir (str): The directory to be searched for images.
+            redraw_table (bool?): Redraw the table once the images are
+                registered. Defaults to True.
+        """
+        self.gui.task_runner.submit(
+            register_image_files,
+            dir,
+            self.settings,
+            self.gui.image_process_executor.get_pool(),
+            name='Register Images',
+            on_result=lambda n_registered: self.register_images_done(
+                n_registered, redraw_table
+            ),
+        )
+
+    @time_and_log
+    def register_images_done(self, n_registered, redraw_table=True):
+        """Redraw the table once register_images has finished.
+
+        Args:
+            n_registered (int): The number of images registered.
+            redraw_table (bool?): Redraw the table. Defaults to True.
+        """
+        sov_log(f'Registered {n_registered} images.')
         if redraw_table:
-            self.selected = []
+            self.model.clear_selected()
             self.fill_table()
+
+
+@time_and_log
+def register_image_files(dir, settings, pool):
+    """Register the images in a directory and its subdirectories.
+
+    This function is run as a background task.  The information of the
+    images is read by the worker processes of pool, from the headers of the
+    files and their middle slices (see sovImageScanner).  Files and DICOM
+    series whose modification time and size did not change since they were
+    registered are skipped, and the records are added to the catalog in
+    batches, so the images registered before the task is cancelled remain
+    registered.
+
+    Args:
+        dir (str): The directory to be searched for images.
+        settings (ImageTableSettings): The settings the records are added
+            to.
+        pool (concurrent.futures.Executor): The pool of worker processes.
+
+    Returns:
+        int: The number of images registered.
+    """
+    task_progress(0, 'Register Images: listing files...')
+    registered_stats = settings.catalog.get_file_stats(dir)
+    entries = [
+        entry
+        for entry in list_image_files(dir)
+        if registered_stats.get(os.path.abspath(entry.filename))
+        != (entry.file_mtime, entry.file_bytes)
+    ]
+    if task_cancelled():
+        raise TaskCancelledError()
+
+    futures = {
+        pool.submit(read_image_information, entry.filename, entry.is_dicom): (
+            entry
+        )
+        for entry in entries
+    }
+    pending = set(futures)
+    batch = []
+    n_done = 0
+    n_registered = 0
+    try:
+        while len(pending) > 0:
+            if task_cancelled():
+                raise TaskCancelledError()
+            done, pending = concurrent.futures.wait(
+                pending,
+                timeout=0.1,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                n_done += 1
+                entry = futures[future]
+                try:
+                    info = future.result()
+                except Exception as e:
+                    sov_log(f'Could not read {entry.filename}: {e}', 'warning')
+                    continue
+                if info is None:
+                    continue
+                thumbnail = None
+                if info['thumbnail'] is not None:
+                    thumbnail = get_thumbnail_qimage_from_array(
+                        info['thumbnail'], info['thumbnail_spacing']
+                    )
+                record = ImageCatalogRecord(
+                    entry.filename,
+                    'image',
+                    info['spacing'],
+                    info['size'],
+                    modality=info['modality'],
+                    file_mtime=entry.file_mtime,
+                    file_bytes=entry.file_bytes,
+                )
+                batch.append((record, thumbnail))
+            if len(batch) >= REGISTRATION_BATCH_SIZE or (
+                len(pending) == 0 and len(batch) > 0
+            ):
+                settings.add_records(batch)
+                n_registered += len(batch)
+                batch = []
+            task_progress(
+                n_done / len(futures),
+                f'Register Images: {n_done} of {len(futures)} files',
+            )
+    finally:
+        for future in pending:
+            future.cancel()
+        if len(batch) > 0:
+            settings.add_records(batch)
+            n_registered += len(batch)
+
+    return n_registered
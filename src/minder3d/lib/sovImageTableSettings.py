@@ -1,123 +1,168 @@
 import os
-import uuid
 
-import itk
 import numpy as np
 from PySide6.QtCore import QSettings, QStandardPaths, Qt
 from PySide6.QtGui import QImage, QPixmap
 from vtk.util.numpy_support import vtk_to_numpy
 
-from .sovUtils import time_and_log
+from .sovImageCatalog import (
+    ImageCatalogRecord,
+    format_image_size,
+    format_image_spacing,
+    get_image_catalog,
+)
+from .sovImageScanner import get_thumbnail_array
+from .sovThumbnailCache import (
+    get_thumbnail_cache,
+    get_thumbnail_qimage_from_array,
+)
+from .sovUtils import sov_log, time_and_log
 
 
-class ImageTableSettingsFileRecord:
-    def __init__(
-        self,
-        filename,
-        file_type,
-        file_spacing='',
-        file_size='',
-        file_thumbnail='',
-        file_label='',
-    ):
-        """Initialize the object with the provided file details.
+@time_and_log
+def get_image_spacing_str(img):
+    """Format the spacing of an image for display in the image table."""
+    return format_image_spacing(img.GetSpacing())
 
-        Args:
-            filename (str): The name of the file.
-            file_type (str): The type of the file.
-            file_spacing (str): A list of spacing details. Defaults to ''.
-            file_size (str): A list of size details. Defaults to ''.
-            file_thumbnail (str): The thumbnail of the file. Defaults to ''.
-            file_label (str): The short diaplay-name of the file. Defaults to ''.
-        """
 
-        self.filename = filename
-        self.file_type = file_type
-        self.file_spacing = file_spacing
-        self.file_size = file_size
-        self.file_thumbnail = file_thumbnail
-        self.file_label = file_label
+@time_and_log
+def get_image_size_str(img):
+    """Format the size of an image for display in the image table."""
+    return format_image_size(img.GetLargestPossibleRegion().GetSize())
+
+
+@time_and_log
+def get_thumbnail_qimage_from_image(img, arr=None):
+    """Get a thumbnail QImage from an image.
+
+    Unlike QPixmaps, QImages can be created outside of the GUI thread, so
+    this function can be used by background tasks.
 
+    Args:
+        img: The image, used for its direction and spacing.
+        arr (np.ndarray?): The voxels to be used.  Defaults to the voxels
+            of img, but a downsampled array of the image is sufficient.
+
+    Returns:
+        QImage: The thumbnail, at most 100x100 pixels.
+    """
+    return get_thumbnail_qimage_from_array(
+        get_thumbnail_array(img, arr), img.GetSpacing()
+    )
+
+
+def is_record_current(record):
+    """Check that a regular file has not changed since it was cataloged.
+
+    Directories, e.g., of DICOM series, are assumed not to have changed.
+    """
+    if not os.path.isfile(record.filename):
+        return True
+    stat = os.stat(record.filename)
+    return (record.file_mtime, record.file_bytes) == (
+        stat.st_mtime,
+        stat.st_size,
+    )
+
+
+class ImageTableSettings:
+    def __init__(self, catalog=None, thumbnail_cache=None):
+        """Initialize the records of the files listed by the image table.
+
+        The records are stored in the image catalog.  The records of the
+        INI settings file used by earlier versions are moved to the catalog
+        the first time the settings are created.
+
+        Args:
+            catalog (ImageCatalog?): The catalog of the records.  Defaults to
+                the application's catalog.
+            thumbnail_cache (ThumbnailCache?): The cache of the thumbnails.
+                Defaults to the application's thumbnail cache.
+        """
+        if catalog is None:
+            catalog = get_image_catalog()
+        self.catalog = catalog
+        if thumbnail_cache is None:
+            thumbnail_cache = get_thumbnail_cache()
+        self.thumbnail_cache = thumbnail_cache
 
-class ImageTableSettings(QSettings):
-    def __init__(self):
         settings_file = os.path.join(
             QStandardPaths.writableLocation(QStandardPaths.AppDataLocation),
             'settings_imagetable.ini',
         )
-        os.makedirs(os.path.dirname(settings_file), exist_ok=True)
-        super().__init__(settings_file, QSettings.IniFormat)
-
-        self.read_file_records()
-
-    @time_and_log
-    def clear_data(self):
-        self.clear()
-        self.sync()
+        if os.path.exists(settings_file):
+            self.migrate_ini_settings(settings_file)
 
     @time_and_log
-    def read_file_records(self):
-        """Get file records from the settings.
+    def migrate_ini_settings(self, settings_file):
+        """Move the records of an INI settings file to the catalog.
 
-        This function retrieves file records from the settings and returns a list of file records.
+        The records are added in a single transaction, and their thumbnails
+        are moved to the thumbnail cache.  The settings file is then renamed
+        to '<settings_file>.migrated', so it is only migrated once.
 
-        Returns:
-            list: A list of file records retrieved from the settings.
+        Args:
+            settings_file (str): The INI file written by earlier versions.
         """
-
-        self.file_records = []
-        size = self.beginReadArray('files')
+        settings = QSettings(settings_file, QSettings.IniFormat)
+        records = []
+        size = settings.beginReadArray('files')
         for i in range(size):
-            self.setArrayIndex(i)
-            filename = self.value('filename', '')
-            if os.path.exists(filename):
-                file_type = self.value('file_type', '')
-                file_spacing = self.value('file_spacing', '')
-                file_size = self.value('file_size', '')
-                file_thumbnail = self.value('file_thumbnail', '')
-                file_label = self.value('file_label', '')
-                file = ImageTableSettingsFileRecord(
+            settings.setArrayIndex(i)
+            filename = settings.value('filename', '')
+            if filename == '':
+                continue
+            file_thumbnail = settings.value('file_thumbnail', '')
+            thumbnail_key = ''
+            if file_thumbnail != '' and os.path.exists(file_thumbnail):
+                thumbnail_key = self.write_thumbnail(QImage(file_thumbnail))
+                if thumbnail_key != '':
+                    os.remove(file_thumbnail)
+            records.append(
+                ImageCatalogRecord(
                     filename,
-                    file_type,
-                    file_spacing,
-                    file_size,
-                    file_thumbnail,
-                    file_label,
+                    settings.value('file_type', ''),
+                    settings.value('file_spacing', ''),
+                    settings.value('file_size', ''),
+                    thumbnail_key,
+                    settings.value('file_label', ''),
                 )
-                self.file_records.append(file)
-        self.endArray()
+            )
+        settings.endArray()
+        del settings
+
+        self.catalog.add_records(records)
+        os.replace(settings_file, settings_file + '.migrated')
+        sov_log(f'Moved {len(records)} image table records to the catalog.')
 
     @time_and_log
-    def write_file_records(self):
-        self.clear()
-        if len(self.file_records) > 0:
-            self.beginWriteArray('files')
-            for i, file in enumerate(self.file_records):
-                self.setArrayIndex(i)
-                self.setValue('filename', file.filename)
-                self.setValue('file_type', file.file_type)
-                self.setValue('file_spacing', file.file_spacing)
-                self.setValue('file_size', file.file_size)
-                self.setValue('file_thumbnail', file.file_thumbnail)
-                self.setValue('file_label', file.file_label)
-            self.endArray()
-        self.sync()
+    def clear_data(self):
+        self.catalog.clear()
+        self.thumbnail_cache.clear()
 
     @time_and_log
-    def write_thumbnail(self, thumbnail_pixmap):
-        if thumbnail_pixmap is not None:
-            data_dir = QStandardPaths.writableLocation(
-                QStandardPaths.AppDataLocation
-            )
-            file_thumbnail = str(uuid.uuid4()) + '.png'
-            file_thumbnail = os.path.join(data_dir, file_thumbnail)
-            if not thumbnail_pixmap.save(file_thumbnail):
-                file_thumbnail = ''
-            return file_thumbnail
+    def write_thumbnail(self, thumbnail):
+        """Store a thumbnail in the thumbnail cache.
+
+        Args:
+            thumbnail (QPixmap or QImage): The thumbnail, or None.
+
+        Returns:
+            str: The key of the thumbnail, or '' if it was not stored.
+        """
+        if thumbnail is None or thumbnail.isNull():
+            return ''
+        return self.thumbnail_cache.put(thumbnail)
 
     @time_and_log
     def add_data(
-        self, obj, filename, file_type, file_label=None, thumbnail_pixmap=None
+        self,
+        obj,
+        filename,
+        file_type,
+        file_label=None,
+        thumbnail_pixmap=None,
+        modality='',
     ):
         """Add a file to the settings.
 
@@ -130,140 +175,133 @@ class ImageTableSettings(QSettings):
             file_type (str): The type of the file.
             file_label (Optional[str]): The custom label of file, defaults to basename of filename
             thumbnail_pixmap (Optional[QPixmap]): The thumbnail of the file.
-
-
-        Raises:
-            IndexError: If the input list is empty.
+            modality (Optional[str]): The modality of an image, e.g., 'CT'.
         """
-        filename = os.path.abspath(filename)
         file_spacing = ''
         file_size = ''
-        file_thumbnail = ''
         if file_type == 'image':
-            file_spacing = ', '.join(
-                [str(f'{s:.4f}') for s in obj.GetSpacing()]
-            )
-            file_size = 'x'.join(
-                [str(s) for s in obj.GetLargestPossibleRegion().GetSize()]
-            )
+            file_spacing = get_image_spacing_str(obj)
+            file_size = get_image_size_str(obj)
         elif file_type == 'scene':
             file_size = str(obj.GetNumberOfChildren())
-        if file_label is None or file_label == '':
-            file_label = os.path.basename(filename)
-        file_thumbnail = self.write_thumbnail(thumbnail_pixmap)
-
-        for i, file in enumerate(self.file_records):
-            if file.filename == filename:
-                self.file_records[i].file_type = file_type
-                self.file_records[i].file_spacing = file_spacing
-                self.file_records[i].file_size = file_size
-                if self.file_records[i].file_thumbnail != '' and os.path.exists(
-                    self.file_records[i].file_thumbnail
-                ):
-                    os.remove(self.file_records[i].file_thumbnail)
-                self.file_records[i].file_thumbnail = file_thumbnail
-                self.file_records[i].file_label = file_label
-                self.write_file_records()
-                return
-
-        if len(self.file_records) > 10:
-            if self.file_records[-1].file_thumbnail != '' and os.path.exists(
-                self.file_records[-1].file_thumbnail
-            ):
-                os.remove(self.file_records[-1].file_thumbnail)
-            self.file_records.pop(-1)
-
-        file = ImageTableSettingsFileRecord(
+        self.add_record(
             filename,
             file_type,
             file_spacing,
             file_size,
-            file_thumbnail,
             file_label,
+            thumbnail_pixmap,
+            modality,
         )
-        self.file_records.append(file)
 
-        self.write_file_records()
+    @time_and_log
+    def add_record(
+        self,
+        filename,
+        file_type,
+        file_spacing,
+        file_size,
+        file_label=None,
+        thumbnail_pixmap=None,
+        modality='',
+    ):
+        """Add a file to the settings given its already formatted details.
+
+        Args:
+            filename (str): The name of the file.
+            file_type (str): The type of the file.
+            file_spacing (str): The formatted spacing of the file.
+            file_size (str): The formatted size of the file.
+            file_label (Optional[str]): The custom label of file, defaults to basename of filename
+            thumbnail_pixmap (Optional[QPixmap]): The thumbnail of the file.
+            modality (Optional[str]): The modality of an image, e.g., 'CT'.
+        """
+        record = ImageCatalogRecord(
+            filename,
+            file_type,
+            file_spacing,
+            file_size,
+            file_label=file_label,
+            modality=modality,
+        )
+        self.add_records([(record, thumbnail_pixmap)])
+
+    @time_and_log
+    def add_records(self, records):
+        """Add files to the settings, in a single catalog transaction.
+
+        The records are completed before being cataloged: their filename is
+        made absolute, their label defaults to the basename of the file,
+        their thumbnail is written, and the modification time and size of
+        regular files are set if they are not.
+
+        Args:
+            records (list): The (ImageCatalogRecord, thumbnail) of each
+                file.  The thumbnail is a QPixmap, a QImage when called from
+                a background task, or None.
+        """
+        catalog_records = []
+        for record, thumbnail in records:
+            record.filename = os.path.abspath(record.filename)
+            if record.file_label is None or record.file_label == '':
+                record.file_label = os.path.basename(record.filename)
+            record.file_thumbnail = self.write_thumbnail(thumbnail)
+            if record.file_mtime is None and os.path.isfile(record.filename):
+                stat = os.stat(record.filename)
+                record.file_mtime = stat.st_mtime
+                record.file_bytes = stat.st_size
+            catalog_records.append(record)
+
+        self.catalog.add_records(catalog_records)
 
     @time_and_log
     def remove_data(self, filename):
         """Remove a file from the settings.
 
-        This function removes a file from the settings.
-
         Args:
             filename: The name of the file to be removed from settings.
-
-        Raises:
-            IndexError: If the input list is empty.
         """
-        for i, file in enumerate(self.file_records):
-            if file.filename == filename:
-                if file.file_thumbnail != '' and os.path.exists(
-                    file.file_thumbnail
-                ):
-                    os.remove(file.file_thumbnail)
-                self.file_records.pop(i)
-                self.write_file_records()
-                return
+        self.catalog.remove_record(filename)
 
     @time_and_log
     def relabel(self, filename, new_label):
-        filename = os.path.abspath(filename)
-
-        for i, file in enumerate(self.file_records):
-            if file.filename == filename:
-                self.file_records[i].file_label = new_label
-                self.write_file_records()
-                return
+        self.catalog.relabel(filename, new_label)
 
     @time_and_log
     def get_thumbnail(
-        self, obj, filename, file_type, force_new_thumbnail=False
+        self, obj, filename, file_type, force_new_thumbnail=False, arr=None
     ):
         """Get the thumbnail of a file.
 
-        This function retrieves the thumbnail of a file from the settings.
+        The cached thumbnail of the file is used if the file has not
+        changed since the thumbnail was made.  If an image's thumbnail must
+        be created, it is created from arr when given (e.g., the coarsest
+        level of the image's pyramid), or else from the middle slice of obj.
         """
         if not force_new_thumbnail:
-            for file in self.file_records:
-                if file.filename == filename:
-                    return QPixmap(file.file_thumbnail)
+            record = self.catalog.get_record(filename)
+            if record is not None and is_record_current(record):
+                thumbnail = self.thumbnail_cache.get_pixmap(
+                    record.file_thumbnail
+                )
+                if thumbnail is not None:
+                    return thumbnail
 
         if file_type == 'image':
-            return self.get_thumbnail_pixmap_from_image(obj)
+            return self.get_thumbnail_pixmap_from_image(obj, arr)
         elif file_type == 'scene':
             return self.get_thumbnail_pixmap_from_vtk_image(obj)
 
     @time_and_log
-    def get_thumbnail_pixmap_from_image(self, img):
-        """Get a thumbnail pixmap from an image."""
-        arr = itk.GetArrayFromImage(img)
-        flipX = int(np.sign(np.sum(img.GetDirection(), axis=1)[0]))
-        flipY = int(np.sign(np.sum(img.GetDirection(), axis=1)[1]))
-        thumb_array = arr[arr.shape[0] // 2, ::flipY, ::flipX]
-        if len(thumb_array.shape) == 3:
-            thumb_array = thumb_array.mean(axis=2).astype(np.uint8)
-        auto_range = np.quantile(thumb_array, [0.05, 0.95])
-        thumb_array = np.clip(thumb_array, auto_range[0], auto_range[1])
-        thumb_array = (
-            (thumb_array - auto_range[0])
-            / (auto_range[1] - auto_range[0])
-            * 255
-        ).astype(np.uint8)
-        thumb_image = QImage(
-            thumb_array.data,
-            thumb_array.shape[1],
-            thumb_array.shape[0],
-            thumb_array.strides[0],
-            QImage.Format_Grayscale8,
-        )
-        thumb_image.setDotsPerMeterX(10 / img.GetSpacing()[0])
-        thumb_image.setDotsPerMeterY(10 / img.GetSpacing()[1])
-        thumb_pixmap = QPixmap.fromImage(thumb_image).scaled(
-            100, 100, Qt.KeepAspectRatio
-        )
-        return thumb_pixmap
+    def get_thumbnail_pixmap_from_image(self, img, arr=None):
+        """Get a thumbnail pixmap from an image.
+
+        Args:
+            img: The image, used for its direction and spacing.
+            arr (np.ndarray?): The voxels to be used.  Defaults to the voxels
+                of img, but a downsampled array of the image is sufficient.
+        """
+        return QPixmap.fromImage(get_thumbnail_qimage_from_image(img, arr))
 
     @time_and_log
     def get_thumbnail_pixmap_from_vtk_image(self, img):
@@ -1,13 +1,28 @@
+import concurrent.futures
+import copy
 import os
 
-from dicomsort import DICOMSorter
 from PySide6.QtGui import QColor, QPalette
 from PySide6.QtWidgets import QFileDialog, QWidget
 
+from .sovDICOMIngest import (
+    DICOM_HEADER_CHUNK_SIZE,
+    group_dicom_series,
+    import_dicom_series,
+    read_dicom_headers,
+)
+from .sovImageCatalog import ImageCatalogRecord, get_image_catalog
+from .sovImageScanner import read_image_information
+from .sovImageTablePanelWidget import REGISTRATION_BATCH_SIZE
 from .sovImportDICOMSettings import ImportDICOMSettings
-from .sovUtils import time_and_log
+from .sovTaskRunner import TaskCancelledError, task_cancelled, task_progress
+from .sovThumbnailCache import get_thumbnail_qimage_from_array
+from .sovUtils import sov_log, time_and_log
 from .ui_sovImportDICOMPanelWidget import Ui_ImportDICOMPanelWidget
 
+# The fraction of the progress of an import spent reading the headers
+HEADER_PROGRESS = 0.25
+
 
 class ImportDICOMPanelWidget(QWidget, Ui_ImportDICOMPanelWidget):
     @time_and_log
@@ -43,6 +58,11 @@ class ImportDICOMPanelWidget(QWidget, Ui_ImportDICOMPanelWidget):
         self.importDICOMAutoRegisterCheckBox.setChecked(auto_register)
 
         self.importDICOMRunButton.pressed.connect(self.run)
+        self.importDICOMCancelButton.pressed.connect(self.cancel)
+
+        # The id of the running import, whose progress is displayed
+        self.job_id = None
+        self.gui.task_runner.jobs_changed.connect(self.update_job_state)
 
         p = self.importDICOMInstructionsTextEdit.palette()
         p.setColor(QPalette.Base, QColor(43, 43, 43))
@@ -88,32 +108,283 @@ class ImportDICOMPanelWidget(QWidget, Ui_ImportDICOMPanelWidget):
                 self.importDICOMAutoRegisterCheckBox.isChecked(),
             )
 
+    @time_and_log
     def run(self):
         """Run the DICOM import process.
 
+        The files are imported by a background task (see
+        import_dicom_files), whose progress is displayed by the panel until
+        it finishes or is cancelled.
+
         Args:
             self (object): The instance of the class.
         """
+        if self.job_id is not None:
+            return
         input_dir = self.importDICOMInputDirectoryLineEdit.text()
         output_dir = self.importDICOMOutputDirectoryLineEdit.text()
-        self.settings.add_data(
+        auto_register = self.importDICOMAutoRegisterCheckBox.isChecked()
+        self.settings.add_data(input_dir, output_dir, auto_register)
+
+        settings = None
+        if auto_register:
+            settings = self.gui.imageTablePanel.settings
+
+        self.gui.log('Importing DICOM...')
+        self.set_running(True)
+        self.job_id = self.gui.task_runner.submit(
+            import_dicom_files,
             input_dir,
             output_dir,
-            self.importDICOMAutoRegisterCheckBox.isChecked(),
+            get_image_catalog(),
+            settings,
+            self.gui.image_process_executor.get_pool(),
+            name='Import DICOM',
+            on_result=self.run_done,
+            on_progress=self.update_progress,
         )
-        pattern = (
-            '%PatientName/%StudyID-%StudyDescription-%StudyDate/'
-            + '%Modality/%SeriesNumber-%SeriesDescription/%InstanceNumber.dcm'
+
+    @time_and_log
+    def cancel(self):
+        """Cancel the running import.
+
+        The series imported before the import is cancelled remain
+        imported, and registered.
+        """
+        if self.job_id is not None:
+            self.gui.log('Cancelling the DICOM import...')
+            self.importDICOMCancelButton.setEnabled(False)
+            self.gui.task_runner.cancel(self.job_id)
+
+    def set_running(self, running):
+        self.importDICOMRunButton.setEnabled(not running)
+        self.importDICOMCancelButton.setEnabled(running)
+        if running:
+            self.importDICOMProgressBar.setValue(0)
+
+    def update_progress(self, fraction, message):
+        self.importDICOMProgressBar.setValue(int(fraction * 100))
+
+    def update_job_state(self, num_queued, num_running, name):
+        # Cancelled imports do not call run_done, so the panel is reset
+        # once the import is no longer queued or running
+        if self.job_id is not None and not self.gui.task_runner.is_active(
+            self.job_id
+        ):
+            self.job_id = None
+            self.set_running(False)
+
+    @time_and_log
+    def run_done(self, result):
+        """Register the imported images, if requested.
+
+        Args:
+            result (tuple): The number of series found, converted, and
+                registered by import_dicom_files.
+        """
+        n_series, n_converted, n_registered = result
+        self.importDICOMProgressBar.setValue(100)
+        self.gui.log(
+            f'Imported {n_series} DICOM series, {n_converted} converted.'
         )
-        target_pattern = os.path.join(output_dir, pattern)
-        args = {
-            'sourceDir': input_dir,
-            'targetPattern': target_pattern,
-            'keepGoing': True,
+        if self.importDICOMAutoRegisterCheckBox.isChecked():
+            self.gui.imageTablePanel.register_images_done(n_registered)
+
+
+def iterate_completed(futures):
+    """Yield futures as they complete, checking if the task was cancelled.
+
+    The futures that did not start are cancelled when the task is
+    cancelled.
+
+    Args:
+        futures (list): The futures.
+    """
+    pending = set(futures)
+    try:
+        while len(pending) > 0:
+            if task_cancelled():
+                raise TaskCancelledError()
+            done, pending = concurrent.futures.wait(
+                pending,
+                timeout=0.1,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            yield from done
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def list_files(input_dir, output_dir):
+    """List the files of a directory, and its subdirectories, except those
+    of the output directory."""
+    output_dir = os.path.abspath(output_dir)
+    filenames = []
+    for dirpath, dirnames, names in os.walk(input_dir):
+        dirnames[:] = sorted(
+            name
+            for name in dirnames
+            if os.path.abspath(os.path.join(dirpath, name)) != output_dir
+        )
+        filenames += [os.path.join(dirpath, name) for name in sorted(names)]
+    return filenames
+
+
+@time_and_log
+def import_dicom_files(input_dir, output_dir, catalog, settings, pool):
+    """Import the DICOM files of a directory and its subdirectories.
+
+    This function is run as a background task.  The headers of the files
+    are read by the worker processes of pool, which then import each
+    series: its files are linked into the output directory and converted
+    to a compressed volume (see sovDICOMIngest).  The series are indexed in
+    the catalog, and series whose volume was already converted from the
+    same number of files are not imported again.  The volumes are
+    registered in batches, as they are converted, so the series imported
+    before the task is cancelled remain registered.
+
+    Args:
+        input_dir (str): The directory to be searched for DICOM files.
+        output_dir (str): The directory the series are imported to.
+        catalog (ImageCatalog): The catalog indexing the series.
+        settings (ImageTableSettings): The settings the volumes are
+            registered in, or None if they are not registered.
+        pool (concurrent.futures.Executor): The pool of worker processes.
+
+    Returns:
+        tuple: The number of series found, converted, and registered.
+    """
+    task_progress(0, 'Import DICOM: listing files...')
+    filenames = list_files(input_dir, output_dir)
+    if task_cancelled():
+        raise TaskCancelledError()
+
+    chunks = [
+        filenames[i : i + DICOM_HEADER_CHUNK_SIZE]
+        for i in range(0, len(filenames), DICOM_HEADER_CHUNK_SIZE)
+    ]
+    futures = {
+        pool.submit(read_dicom_headers, chunk): chunk for chunk in chunks
+    }
+    headers = []
+    for n_done, future in enumerate(iterate_completed(futures), 1):
+        try:
+            headers += future.result()
+        except Exception as e:
+            chunk = futures[future]
+            sov_log(
+                f'Could not read the headers of {len(chunk)} files'
+                f' starting with {chunk[0]}: {e}',
+                'warning',
+            )
+        task_progress(
+            HEADER_PROGRESS * n_done / len(futures),
+            f'Import DICOM: read the headers of {len(headers)} files',
+        )
+
+    series = group_dicom_series(headers, output_dir, catalog)
+    imports = []
+    index_records = []
+    registrations = []
+    for record, instances in series:
+        imported = catalog.get_dicom_series(record.series_uid)
+        if (
+            imported is not None
+            and imported.n_instances == record.n_instances
+            and imported.volume_file == record.volume_file
+            and os.path.exists(record.volume_file)
+        ):
+            index_records.append(record)
+            if (
+                settings is not None
+                and settings.catalog.get_record(record.volume_file) is None
+            ):
+                registrations.append(record)
+        else:
+            # The volume is set once the series is converted
+            index_record = copy.copy(record)
+            index_record.volume_file = ''
+            index_records.append(index_record)
+            imports.append((record, instances))
+    catalog.add_dicom_series(index_records)
+
+    import_uids = {record.series_uid for record, _ in imports}
+    futures = {
+        pool.submit(import_dicom_series, record, instances): record
+        for record, instances in imports
+    }
+    futures.update(
+        {
+            pool.submit(read_image_information, record.volume_file, False): (
+                record
+            )
+            for record in registrations
         }
-        dicomSorter = DICOMSorter()
-        dicomSorter.setOptions(args)
-        dicomSorter.renameFiles()
+    )
+    batch = []
+    n_converted = 0
+    n_registered = 0
+    try:
+        for n_done, future in enumerate(iterate_completed(futures), 1):
+            record = futures[future]
+            try:
+                info = future.result()
+            except Exception as e:
+                sov_log(f'Could not import {record.series_dir}: {e}', 'warning')
+                info = None
+            if info is None:
+                sov_log(f'Could not convert {record.series_dir}.', 'warning')
+            else:
+                if record.series_uid in import_uids:
+                    catalog.set_dicom_series_volume(
+                        record.series_uid, record.volume_file
+                    )
+                    n_converted += 1
+                if settings is not None:
+                    batch.append(get_volume_record(record, info))
+            if len(batch) >= REGISTRATION_BATCH_SIZE:
+                settings.add_records(batch)
+                n_registered += len(batch)
+                batch = []
+            task_progress(
+                HEADER_PROGRESS + (1 - HEADER_PROGRESS) * n_done / len(futures),
+                f'Import DICOM: {n_done} of {len(futures)} series',
+            )
+    finally:
+        if len(batch) > 0:
+            settings.add_records(batch)
+            n_registered += len(batch)
 
-        if self.importDICOMAutoRegisterCheckBox.isChecked():
-            self.gui.imageTablePanel.register_images(output_dir)
+    return len(series), n_converted, n_registered
+
+
+def get_volume_record(record, info):
+    """Get the catalog record, and thumbnail, of a converted series.
+
+    Args:
+        record (DICOMSeriesRecord): The series.
+        info (dict): The information of its volume, see
+            sovDICOMIngest.import_dicom_series.
+
+    Returns:
+        tuple: The ImageCatalogRecord and the thumbnail QImage, or None.
+    """
+    thumbnail = None
+    if info['thumbnail'] is not None:
+        thumbnail = get_thumbnail_qimage_from_array(
+            info['thumbnail'], info['thumbnail_spacing']
+        )
+    stat = os.stat(record.volume_file)
+    return (
+        ImageCatalogRecord(
+            record.volume_file,
+            'image',
+            info['spacing'],
+            info['size'],
+            modality=record.modality,
+            file_mtime=stat.st_mtime,
+            file_bytes=stat.st_size,
+        ),
+        thumbnail,
+    )
@@ -1,7 +1,6 @@
 from PySide6.QtWidgets import QWidget
 
 from .sovImageProcessPanelWidget import ImageProcessPanelWidget
-from .sovIndexedOrgansPanelWidget import IndexedOrgansPanelWidget
 from .sovOtsuPanelWidget import OtsuPanelWidget
 from .sovTotalSegmentatorPanelWidget import TotalSegmentatorPanelWidget
 from .sovUtils import time_and_log
@@ -27,9 +26,6 @@ class NewTaskPanelWidget(QWidget, Ui_NewTaskPanelWidget):
         self.newTaskTotalSegmentatorButton.clicked.connect(
             self.add_total_segmentator_panel
         )
-        self.newTaskIndexedOrgansButton.clicked.connect(
-            self.add_indexed_organs_panel
-        )
         self.newTaskOtsuButton.clicked.connect(self.add_otsu_panel)
         self.newTaskImageProcessButton.clicked.connect(
             self.add_image_process_panel
@@ -48,18 +44,6 @@ class NewTaskPanelWidget(QWidget, Ui_NewTaskPanelWidget):
             )
             self.gui.tabWidget.setCurrentWidget(self.gui.totalSegmentatorPanel)
 
-    def add_indexed_organs_panel(self):
-        if self.gui.indexedOrgansPanel is None:
-            self.gui.indexedOrgansPanel = IndexedOrgansPanelWidget(
-                self.gui, self.state
-            )
-        if self.gui.tabWidget.indexOf(self.gui.indexedOrgansPanel) == -1:
-            indx = self.gui.tabWidget.indexOf(self.gui.newTaskTab)
-            self.gui.tabWidget.insertTab(
-                indx, self.gui.indexedOrgansPanel, 'Total Segmentator'
-            )
-            self.gui.tabWidget.setCurrentWidget(self.gui.indexedOrgansPanel)
-
     @time_and_log
     def add_image_process_panel(self):
         """Add an image processing panel to the GUI if it does not already exist.
@@ -0,0 +1,149 @@
+"""Convert between ITK images and nibabel NIfTI images without copying.
+
+ITK stores voxels in a C-ordered (z, y, x) buffer, which is exactly the
+Fortran-ordered (x, y, z) array that nibabel expects, so the conversions
+only transpose array views.  The NIfTI affine is built from the origin,
+spacing and direction of the ITK image, converting ITK's LPS physical space
+to NIfTI's RAS space, so no geometry is lost in either direction.
+
+TotalSegmentator reorients its input to the closest canonical (RAS)
+orientation, using nibabel.as_closest_canonical(), before running its
+models.  get_canonical_array() and array_from_canonical() apply the same
+reorientation to an ITK image's voxels, and invert it on the labels, so
+the models see the same array whether the image is segmented through the
+python_api or by the loaded predictors.
+"""
+
+import itk
+import numpy as np
+
+# Maps ITK's LPS physical coordinates to NIfTI's RAS coordinates, and back
+LPS_TO_RAS = np.diag([-1.0, -1.0, 1.0])
+
+
+def get_nifti_affine(image):
+    """Get the RAS affine of an ITK image.
+
+    Args:
+        image: The 3D ITK image.
+
+    Returns:
+        np.ndarray: The 4x4 affine mapping (x, y, z) indices to RAS points.
+    """
+    direction = itk.array_from_matrix(image.GetDirection())
+    spacing = np.array(image.GetSpacing(), dtype=float)
+    affine = np.eye(4)
+    affine[:3, :3] = LPS_TO_RAS @ direction @ np.diag(spacing)
+    affine[:3, 3] = LPS_TO_RAS @ np.array(image.GetOrigin(), dtype=float)
+    return affine
+
+
+def set_geometry_from_affine(image, affine):
+    """Set the origin, spacing and direction of an ITK image from an affine.
+
+    Args:
+        image: The 3D ITK image.
+        affine (np.ndarray): The 4x4 RAS affine of a NIfTI image.
+    """
+    lps_affine = LPS_TO_RAS @ np.asarray(affine, dtype=float)[:3]
+    spacing = np.linalg.norm(lps_affine[:3, :3], axis=0)
+    image.SetSpacing(spacing.tolist())
+    image.SetOrigin(lps_affine[:3, 3].tolist())
+    image.SetDirection(
+        itk.matrix_from_array(
+            np.ascontiguousarray(lps_affine[:3, :3] / spacing)
+        )
+    )
+
+
+def get_canonical_array(image):
+    """Reorient the voxels of an ITK image to the closest canonical (RAS)
+    orientation, as nibabel.as_closest_canonical() does.
+
+    Args:
+        image: The 3D ITK image.
+
+    Returns:
+        tuple: The reoriented (z, y, x) array, its (x, y, z) spacing, and
+            the nibabel orientation that was applied, to be inverted by
+            array_from_canonical().
+    """
+    from nibabel import orientations
+
+    orientation = orientations.io_orientation(get_nifti_affine(image))
+    canonical_array = orientations.apply_orientation(
+        itk.GetArrayViewFromImage(image).T, orientation
+    )
+    spacing = np.empty(3)
+    spacing[orientation[:, 0].astype(int)] = image.GetSpacing()
+    return canonical_array.T, tuple(spacing), orientation
+
+
+def array_from_canonical(canonical_array, orientation):
+    """Invert the reorientation of get_canonical_array(), e.g., on labels.
+
+    Args:
+        canonical_array (np.ndarray): A (z, y, x) array in the closest
+            canonical orientation.
+        orientation (np.ndarray): The orientation returned by
+            get_canonical_array().
+
+    Returns:
+        np.ndarray: The C-ordered (z, y, x) array in the orientation of the
+            image.
+    """
+    from nibabel import orientations
+
+    # Axis i was moved to axis orientation[i, 0], and flipped if
+    # orientation[i, 1] is -1, so axis orientation[i, 0] goes back to i
+    inverse = np.empty_like(orientation)
+    inverse[orientation[:, 0].astype(int), 0] = np.arange(3)
+    inverse[orientation[:, 0].astype(int), 1] = orientation[:, 1]
+    return np.ascontiguousarray(
+        orientations.apply_orientation(canonical_array.T, inverse).T
+    )
+
+
+def image_to_nifti(image):
+    """Wrap the voxels of an ITK image in a nibabel NIfTI image.
+
+    The NIfTI image shares the image's buffer, so image must be kept alive
+    (and unmodified) while the NIfTI image is in use.
+
+    Args:
+        image: The 3D ITK image.
+
+    Returns:
+        nibabel.Nifti1Image: The NIfTI image, with the full affine of image.
+    """
+    import nibabel as nib
+
+    # The transpose of the (z, y, x) C-ordered view is an (x, y, z)
+    # Fortran-ordered view of the same buffer
+    image_array = itk.GetArrayViewFromImage(image).T
+    return nib.Nifti1Image(image_array, get_nifti_affine(image))
+
+
+def nifti_to_image(nifti, reference_image=None):
+    """Make an ITK image from a nibabel NIfTI image.
+
+    The voxels are read in their stored dtype (e.g., uint8 for label maps),
+    not converted to float64 as get_fdata() would.  When they are held in a
+    Fortran-ordered array, as produced by image_to_nifti() or nibabel's
+    loaders, the ITK image is a view of that array.
+
+    Args:
+        nifti (nibabel.Nifti1Image): The NIfTI image.
+        reference_image (itk.Image?): An image whose geometry is given to the
+            ITK image.  Defaults to the geometry of the NIfTI affine.
+
+    Returns:
+        The ITK image.
+    """
+    image_array = np.ascontiguousarray(np.asanyarray(nifti.dataobj).T)
+    image = itk.GetImageViewFromArray(image_array)
+    if reference_image is not None:
+        image.CopyInformation(reference_image)
+    else:
+        set_geometry_from_affine(image, nifti.affine)
+    return image
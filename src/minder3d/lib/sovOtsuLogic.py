@@ -1,37 +1,351 @@
+import collections
+import concurrent.futures
+import math
+import os
+import threading
+
 import itk
 import numpy as np
 
+from .sovROIUtils import (
+    get_image_size,
+    get_roi_array_slices,
+    image_from_roi_array,
+)
+from .sovSegmentationEngine import (
+    SegmentationEngine,
+    register_segmentation_engine,
+)
+
+
+def make_label_lut(present, corner_value):
+    """Make the lookup table relabeling the values of a mask.
+
+    Each value is replaced by its rank among the values present, and the
+    label of the corner voxel, taken to be the background, is swapped with
+    0.
+
+    Args:
+        present (np.ndarray): Whether each value is present in the mask.
+        corner_value (int): The value of the corner voxel of the mask.
+
+    Returns:
+        np.ndarray: The label of each value.
+    """
+    value_to_label = np.cumsum(present) - 1
+    corner_label = value_to_label[corner_value]
+    lut = value_to_label.copy()
+    if corner_label != 0:
+        lut[value_to_label == 0] = corner_label
+        lut[value_to_label == corner_label] = 0
+    return lut
+
 
 class OtsuLogic:
+    def __init__(self, number_of_bins=256, max_cached_histograms=8):
+        """Initialize the logic and its histogram cache.
+
+        Args:
+            number_of_bins (int?): The number of bins of the histograms the
+                thresholds are computed from.  Defaults to 256.
+            max_cached_histograms (int?): The number of image histograms kept
+                in the cache.  Defaults to 8.
+        """
+        self.number_of_bins = number_of_bins
+        self.max_cached_histograms = max_cached_histograms
+        self.histograms = collections.OrderedDict()
+        self.histograms_lock = threading.Lock()
+
+    def get_histogram_key(self, inputImage, roi=None):
+        # An image modified in place gets a new modification time
+        if roi is not None:
+            roi = tuple(tuple(int(i) for i in corner) for corner in roi)
+        return (int(inputImage.this), inputImage.GetMTime(), roi)
+
+    def get_input_array(self, inputImage, roi=None):
+        input_array = itk.GetArrayViewFromImage(inputImage)
+        if roi is not None:
+            input_array = input_array[
+                get_roi_array_slices(roi, get_image_size(inputImage))
+            ]
+        return input_array
+
+    def has_histogram(self, inputImage, roi=None):
+        """Check if the histogram of an image is cached.
+
+        Args:
+            inputImage: The image.
+            roi (list?): The region of interest of the histogram.
+
+        Returns:
+            bool: True if the histogram of the image is cached.
+        """
+        with self.histograms_lock:
+            return self.get_histogram_key(inputImage, roi) in self.histograms
+
+    def get_histogram(self, inputImage, roi=None):
+        """Get the histogram of an image, computing it if it is not cached.
+
+        Args:
+            inputImage: The image.
+            roi (list?): The region of interest of the histogram.  Defaults
+                to the whole image.
+
+        Returns:
+            tuple: The counts and the bin edges of the histogram.
+        """
+        key = self.get_histogram_key(inputImage, roi)
+        with self.histograms_lock:
+            if key in self.histograms:
+                self.histograms.move_to_end(key)
+                return self.histograms[key]
+
+        input_array = self.get_input_array(inputImage, roi)
+        imin = float(np.min(input_array))
+        imax = float(np.max(input_array))
+        if imax <= imin:
+            imax = imin + 1
+        histogram = np.histogram(
+            input_array, bins=self.number_of_bins, range=(imin, imax)
+        )
+
+        with self.histograms_lock:
+            self.histograms[key] = histogram
+            while len(self.histograms) > self.max_cached_histograms:
+                self.histograms.popitem(last=False)
+        return histogram
+
+    def compute_thresholds(self, inputImage, numberOfThresholds, roi=None):
+        """Compute the Otsu thresholds of an image from its histogram.
+
+        The thresholds maximize the between-class variance over all ways of
+        splitting the histogram bins into numberOfThresholds + 1 classes.
+        The search is done by dynamic programming over the bins, so it takes
+        milliseconds once the histogram is cached.
+
+        Args:
+            inputImage: The image.
+            numberOfThresholds (int): The number of thresholds.
+            roi (list?): The region of interest the thresholds are computed
+                from.  Defaults to the whole image.
+
+        Returns:
+            np.ndarray: The increasing thresholds, which are bin edges of
+                the histogram.  Values greater than or equal to a threshold
+                belong to the class above it, as they belong to the bin
+                above it, so the histogram gives the size of each class.
+        """
+        counts, bin_edges = self.get_histogram(inputImage, roi)
+        number_of_bins = len(counts)
+        number_of_classes = (
+            max(1, min(numberOfThresholds, number_of_bins - 1)) + 1
+        )
+
+        bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2
+        probability = counts / max(1, counts.sum())
+        cumulative_probability = np.concatenate([[0], np.cumsum(probability)])
+        cumulative_mean = np.concatenate(
+            [[0], np.cumsum(probability * bin_centers)]
+        )
+
+        # The contribution to the between-class variance of a class made of
+        # bins [a, b) is mean(a, b)**2 / probability(a, b), up to constants.
+        class_probability = (
+            cumulative_probability[None, :] - cumulative_probability[:, None]
+        )
+        class_mean = cumulative_mean[None, :] - cumulative_mean[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            class_score = np.where(
+                class_probability > 0, class_mean**2 / class_probability, 0
+            )
+        a, b = np.indices(class_score.shape)
+        class_score[b <= a] = -np.inf
+
+        best_score = class_score[0]
+        best_starts = []
+        for _ in range(number_of_classes - 1):
+            score = best_score[:, None] + class_score
+            best_starts.append(np.argmax(score, axis=0))
+            best_score = np.max(score, axis=0)
+
+        boundaries = []
+        end = number_of_bins
+        for starts in reversed(best_starts):
+            end = starts[end]
+            boundaries.append(end)
+        return bin_edges[boundaries[::-1]]
+
+    def get_label_lut(self, inputImage, thresholds, roi=None):
+        """Get the lookup table from the classes to the labels of run().
+
+        The classes are relabeled as fix_mask() relabels a mask: the empty
+        classes, found from the cached histogram, are skipped, and the
+        label of the corner voxel's class is swapped with 0.
+
+        Args:
+            inputImage: The image.
+            thresholds (np.ndarray): The thresholds of the image.
+            roi (list?): The region of interest of the thresholds.
+
+        Returns:
+            np.ndarray: The uint8 label of each class.
+        """
+        counts, bin_edges = self.get_histogram(inputImage, roi)
+        class_counts = np.bincount(
+            np.digitize(bin_edges[:-1], thresholds),
+            weights=counts,
+            minlength=len(thresholds) + 1,
+        )
+        corner_value = self.get_input_array(inputImage, roi)[0, 0, 0]
+        corner_class = np.digitize(corner_value, thresholds)
+        return make_label_lut(class_counts > 0, corner_class).astype(np.uint8)
+
+    def preview_slice(
+        self, inputImage, slice_array, numberOfThresholds, roi=None
+    ):
+        """Label one slice of an image using the image's Otsu thresholds.
+
+        The thresholds are computed from the histogram of the whole image,
+        so the labels match those of run(), but only the slice is labeled.
+
+        Args:
+            inputImage: The image.
+            slice_array (np.ndarray): The voxels of a slice of the image.
+            numberOfThresholds (int): The number of thresholds.
+            roi (list?): The region of interest the thresholds are computed
+                from.  Defaults to the whole image.
+
+        Returns:
+            np.ndarray: The uint8 labels of the slice, 0 is background.
+        """
+        thresholds = self.compute_thresholds(
+            inputImage, numberOfThresholds, roi
+        )
+        lut = self.get_label_lut(inputImage, thresholds, roi)
+        return lut[np.digitize(slice_array, thresholds)]
+
     def fix_mask(self, mask_img):
-        mask_arr = itk.GetArrayFromImage(mask_img)
-        mask_values = np.unique(mask_arr)
+        """Relabel a mask so its labels are consecutive and 0 is background.
+
+        Each value of the mask is replaced by its rank among the values
+        present, and the label of the corner voxel, taken to be the
+        background, is swapped with 0.  Both steps are folded into a single
+        lookup table (see make_label_lut()), so the voxels are relabeled in
+        one pass (in place for uint8 masks) without building index arrays.
 
-        new_mask_arr = mask_arr.copy()
+        Args:
+            mask_img: The mask image.
 
-        for i in range(len(mask_values)):
-            indexes = np.where(mask_arr == mask_values[i])
-            new_mask_arr[indexes] = i
-        corner_value = new_mask_arr[0, 0, 0]
-        if corner_value != 0:
-            indexes_wrong_bg = np.where(new_mask_arr == 0)
-            indexes_wrong_fg = np.where(new_mask_arr == corner_value)
-            new_mask_arr[indexes_wrong_bg] = corner_value
-            new_mask_arr[indexes_wrong_fg] = 0
+        Returns:
+            The relabeled mask image, with the pixel type of mask_img.
+        """
+        mask_arr = itk.GetArrayFromImage(mask_img)
+        mask_dtype = mask_arr.dtype
+        if mask_dtype == np.uint8:
+            present = np.bincount(mask_arr.ravel(), minlength=256) > 0
+        else:
+            mask_values, inverse = np.unique(mask_arr, return_inverse=True)
+            mask_arr = inverse.reshape(mask_arr.shape)
+            present = np.ones(len(mask_values), dtype=bool)
+        lut = make_label_lut(present, mask_arr[0, 0, 0]).astype(mask_dtype)
+
+        if mask_dtype == np.uint8:
+            new_mask_arr = np.take(lut, mask_arr, out=mask_arr, mode='clip')
+        else:
+            new_mask_arr = lut[mask_arr]
 
         new_img = itk.GetImageFromArray(new_mask_arr)
         new_img.CopyInformation(mask_img)
 
         return new_img
 
-    def run(self, inputImage, numberOfThresholds):
-        if numberOfThresholds <= 1:
-            filter = itk.OtsuThresholdImageFilter.New(Input=inputImage)
-            filter.Update()
-            return self.fix_mask(filter.GetOutput().astype(np.uint8))
-        else:
-            filter = itk.OtsuMultipleThresholdsImageFilter.New(Input=inputImage)
-            filter.SetNumberOfThresholds(numberOfThresholds)
-            filter.Update()
+    def run(
+        self,
+        inputImage,
+        numberOfThresholds,
+        number_of_threads=None,
+        number_of_work_units=None,
+        roi=None,
+    ):
+        """Label an image using its Otsu thresholds.
+
+        The classes are relabeled by the lookup table of get_label_lut()
+        as they are labeled, which gives the labels fix_mask() would give,
+        and those of preview_slice(), without another pass over the labels.
+
+        Args:
+            inputImage: The image.
+            numberOfThresholds (int): The number of thresholds.
+            number_of_threads (int?): The number of threads labeling the
+                image.  Defaults to the number of cores.
+            number_of_work_units (int?): The number of z-chunks the image is
+                split into.  Defaults to 4 chunks per thread.
+            roi (list?): The region of interest to be labeled.  The label
+                image covers only that region.  Defaults to the whole image.
+
+        Returns:
+            The uint8 label image, 0 is background.
+        """
+        thresholds = self.compute_thresholds(
+            inputImage, numberOfThresholds, roi
+        )
+        lut = self.get_label_lut(inputImage, thresholds, roi)
+
+        input_array = self.get_input_array(inputImage, roi)
+        label_array = np.empty(input_array.shape, dtype=np.uint8)
+        num_slices = input_array.shape[0]
+        if number_of_threads is None:
+            number_of_threads = os.cpu_count() or 1
+        if number_of_work_units is None:
+            number_of_work_units = 4 * number_of_threads
+        chunk_size = max(1, math.ceil(num_slices / number_of_work_units))
+
+        def label_chunk(start):
+            end = min(num_slices, start + chunk_size)
+            label_array[start:end] = lut[
+                np.digitize(input_array[start:end], thresholds)
+            ]
+
+        with concurrent.futures.ThreadPoolExecutor(
+            number_of_threads
+        ) as executor:
+            list(executor.map(label_chunk, range(0, num_slices, chunk_size)))
+
+        return image_from_roi_array(inputImage, label_array, roi)
+
+
+@register_segmentation_engine
+class OtsuSegmentationEngine(SegmentationEngine):
+    """Label an image using its Otsu thresholds.
+
+    The image is not cropped by preprocess(): run() labels the region of
+    interest of the image itself, so the histogram cached by the Otsu
+    panel's preview, keyed by the image and its region, is reused.
+
+    Options:
+        number_of_thresholds (int): The number of thresholds.
+        number_of_workers (int): The number of threads labeling the image.
+    """
+
+    name = 'Otsu'
+    default_options = {
+        **SegmentationEngine.default_options,
+        'number_of_thresholds': 1,
+    }
+
+    def __init__(self):
+        super().__init__()
+        # Kept by the engine so its histogram cache is reused between runs
+        self.logic = OtsuLogic()
+
+    def preprocess(self):
+        self.pre_image = self.image
+        return self.pre_image
 
-            return self.fix_mask(filter.GetOutput().astype(np.uint8))
+    def segment(self, pre_image):
+        return self.logic.run(
+            pre_image,
+            self.options['number_of_thresholds'],
+            number_of_threads=self.options['number_of_workers'] or None,
+            roi=self.roi,
+        )
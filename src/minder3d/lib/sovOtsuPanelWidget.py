@@ -1,6 +1,8 @@
+import numpy as np
 from PySide6.QtWidgets import QWidget
 
-from .sovOtsuLogic import OtsuLogic
+from .sovROIUtils import get_image_size, get_roi_array_slices
+from .sovSegmentationEngine import get_segmentation_engine
 from .sovUtils import add_objects_in_mask_image_to_scene, time_and_log
 from .ui_sovOtsuPanelWidget import Ui_OtsuPanelWidget
 
@@ -20,11 +22,123 @@ class OtsuPanelWidget(QWidget, Ui_OtsuPanelWidget):
 
         self.gui = gui
         self.state = state
-        self.logic = OtsuLogic()
+        self.engine = get_segmentation_engine('Otsu')
+        # The preview uses the engine's logic, so the commit reuses the
+        # histograms cached by the preview
+        self.logic = self.engine.logic
+
+        self.histogram_job_id = None
 
         self.otsuRunButton.clicked.connect(self.otsu_threshold)
         self.otsuRunButton.setStyleSheet('background-color: #00aa00')
 
+        self.otsuPreviewCheckBox.toggled.connect(self.update_preview)
+        self.otsuNumberOfThresholdsSpinBox.valueChanged.connect(
+            self.update_preview
+        )
+        self.gui.view2DPanel.view2DSliceSlider.valueChanged.connect(
+            self.update_preview
+        )
+
+    def get_label_colors(self, numberOfThresholds):
+        """Get the RGBA colors of the labels, matching those of the objects.
+
+        Args:
+            numberOfThresholds (int): The number of thresholds.
+
+        Returns:
+            np.ndarray: The uint8 color of each label, label 0 is transparent.
+        """
+        colormap = self.state.colormap
+        colormap_names = list(colormap)
+        colors = np.zeros((numberOfThresholds + 1, 4), dtype=np.uint8)
+        for label in range(1, numberOfThresholds + 1):
+            color_name = colormap_names[(label + 1) % len(colormap_names)]
+            colors[label, 0:3] = (
+                np.array(colormap[color_name])
+                / self.state.colormap_scale_factor
+                * 255
+            )
+            colors[label, 3] = 255
+        return colors
+
+    @time_and_log
+    def update_preview(self, *args):
+        """Preview the Otsu labels of the current 2D slice.
+
+        The thresholds are computed from the cached histogram of the image's
+        region of interest (or of the whole image); the histogram is computed
+        by a task the first time a region is previewed.  Only the slice being
+        viewed is labeled.
+        """
+        img_num = self.state.current_image_num
+        if (
+            not self.otsuPreviewCheckBox.isChecked()
+            or img_num < 0
+            or img_num >= len(self.state.image)
+            or self.state.image_array[img_num].ndim != 3
+        ):
+            self.clear_preview()
+            return
+
+        image = self.state.image[img_num]
+        roi = self.state.roi[img_num]
+        if not self.logic.has_histogram(image, roi):
+            if self.histogram_job_id is None:
+                self.histogram_job_id = self.gui.task_runner.submit(
+                    self.logic.get_histogram,
+                    image,
+                    roi,
+                    name='Otsu Histogram',
+                    on_result=self.histogram_done,
+                    on_error=self.histogram_done,
+                )
+            return
+
+        numberOfThresholds = self.otsuNumberOfThresholdsSpinBox.value()
+        view_image_axis = self.state.view2D_image_axis_order[img_num][2]
+        view_array_axis = 2 - view_image_axis
+        slice_num = self.state.view2D_slice[img_num][view_image_axis]
+        slice_array = np.take(
+            self.state.image_array[img_num], slice_num, axis=view_array_axis
+        )
+        slice_labels = self.logic.preview_slice(
+            image, slice_array, numberOfThresholds, roi
+        )
+        if roi is not None:
+            roi_slices = get_roi_array_slices(roi, get_image_size(image))
+            in_plane_slices = tuple(
+                roi_slices[i] for i in range(3) if i != view_array_axis
+            )
+            roi_labels = np.zeros_like(slice_labels)
+            through_plane_slice = roi_slices[view_array_axis]
+            if (
+                through_plane_slice.start
+                <= slice_num
+                < through_plane_slice.stop
+            ):
+                roi_labels[in_plane_slices] = slice_labels[in_plane_slices]
+            slice_labels = roi_labels
+        self.state.view2D_overlay_preview = (
+            img_num,
+            view_image_axis,
+            slice_num,
+            self.get_label_colors(numberOfThresholds)[slice_labels],
+        )
+        self.gui.view2DPanel.update()
+
+    @time_and_log
+    def histogram_done(self, result):
+        """Show the preview once the histogram task has ended."""
+        self.histogram_job_id = None
+        self.update_preview()
+
+    @time_and_log
+    def clear_preview(self):
+        if self.state.view2D_overlay_preview is not None:
+            self.state.view2D_overlay_preview = None
+            self.gui.view2DPanel.update()
+
     @time_and_log
     def otsu_threshold(self):
         """Apply Otsu's thresholding to the current image.
@@ -38,11 +152,27 @@ class OtsuPanelWidget(QWidget, Ui_OtsuPanelWidget):
 
         numberOfThresholds = self.otsuNumberOfThresholdsSpinBox.value()
 
+        self.otsuPreviewCheckBox.setChecked(False)
+
+        self.engine.initialize(
+            self.state.image[self.state.current_image_num],
+            roi=self.state.roi[self.state.current_image_num],
+            number_of_thresholds=numberOfThresholds,
+        )
         self.gui.log('Running...')
-        seg_image = self.logic.run(
-            self.state.image[self.state.current_image_num], numberOfThresholds
+        self.gui.task_runner.submit(
+            self.engine.run,
+            name='Otsu Threshold',
+            on_result=self.otsu_threshold_done,
         )
 
+    @time_and_log
+    def otsu_threshold_done(self, seg_image):
+        """Add the objects of the Otsu segmentation to the scene.
+
+        Args:
+            seg_image: The label image computed by the Otsu task.
+        """
         self.gui.log('Done.')
 
         add_objects_in_mask_image_to_scene(seg_image, self.state.scene)
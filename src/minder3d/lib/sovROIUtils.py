@@ -0,0 +1,255 @@
+"""Region of interest (ROI) helpers.
+
+An ROI is a box in the index space of an image, stored per image in
+state.roi as [[x0, y0, z0], [x1, y1, z1]], the inclusive index bounds of the
+box in ITK (x, y, z) order, or None when the whole image is used.  The logic
+classes accept an roi argument, extract the region (as an ITK image with the
+matching origin, or as a NumPy view), process it, and paste the result back
+into the full image when the output grid matches the input grid.
+"""
+
+import itk
+import numpy as np
+
+
+def clamp_roi(roi, image_size, pad=0):
+    """Get the start and size of an ROI, padded and clamped to an image.
+
+    Args:
+        roi (list): The inclusive [[x0, y0, z0], [x1, y1, z1]] index bounds.
+        image_size (list): The (x, y, z) size of the image.
+        pad (int or list?): The number of voxels added on each side of the
+            ROI along each axis.  Defaults to 0.
+
+    Returns:
+        tuple: The (x, y, z) start index and size of the region.
+    """
+    pad = np.broadcast_to(pad, (3,))
+    start = [int(max(0, min(roi[0][i], roi[1][i]) - pad[i])) for i in range(3)]
+    end = [
+        int(min(image_size[i] - 1, max(roi[0][i], roi[1][i]) + pad[i]))
+        for i in range(3)
+    ]
+    size = [max(0, end[i] - start[i] + 1) for i in range(3)]
+    return start, size
+
+
+def get_roi_array_slices(roi, image_size, pad=0):
+    """Get the NumPy slices of an ROI in an image's (z, y, x) array.
+
+    Args:
+        roi (list): The inclusive [[x0, y0, z0], [x1, y1, z1]] index bounds.
+        image_size (list): The (x, y, z) size of the image.
+        pad (int or list?): The padding of the ROI.  Defaults to 0.
+
+    Returns:
+        tuple: The (z, y, x) slices of the region.
+    """
+    start, size = clamp_roi(roi, image_size, pad)
+    return tuple(slice(start[i], start[i] + size[i]) for i in [2, 1, 0])
+
+
+def get_roi_region(roi, image_size, pad=0):
+    """Get the ITK region of an ROI.
+
+    Args:
+        roi (list): The inclusive [[x0, y0, z0], [x1, y1, z1]] index bounds.
+        image_size (list): The (x, y, z) size of the image.
+        pad (int or list?): The padding of the ROI.  Defaults to 0.
+
+    Returns:
+        itk.ImageRegion[3]: The region.
+    """
+    start, size = clamp_roi(roi, image_size, pad)
+    region = itk.ImageRegion[3]()
+    region.SetIndex(start)
+    region.SetSize(size)
+    return region
+
+
+def get_image_size(image):
+    return list(image.GetLargestPossibleRegion().GetSize())
+
+
+def extract_roi(image, roi, pad=0):
+    """Extract the region of an ROI from an image.
+
+    The extracted image has the spacing and direction of the image, and its
+    origin is the physical position of the region's first voxel, so it
+    overlays the image.
+
+    Args:
+        image: The image.
+        roi (list): The ROI, or None for the whole image.
+        pad (int or list?): The padding of the ROI.  Defaults to 0.
+
+    Returns:
+        The extracted image, or image if roi is None.
+    """
+    if roi is None:
+        return image
+    roi_filter = itk.RegionOfInterestImageFilter.New(Input=image)
+    roi_filter.SetRegionOfInterest(
+        get_roi_region(roi, get_image_size(image), pad)
+    )
+    roi_filter.Update()
+    return roi_filter.GetOutput()
+
+
+def paste_roi(image, roi_image, roi, pad=0):
+    """Paste the region of an ROI, processed, back into a copy of an image.
+
+    Args:
+        image: The full image.
+        roi_image: The processed image of the region, as returned by
+            extract_roi(image, roi, pad) and then processed without changing
+            its grid.
+        roi (list): The ROI.
+        pad (int or list?): The padding used to extract roi_image; only the
+            unpadded region is pasted.  Defaults to 0.
+
+    Returns:
+        A new image, equal to image outside the ROI and to roi_image inside.
+    """
+    image_size = get_image_size(image)
+    padded_start, _ = clamp_roi(roi, image_size, pad)
+    start, size = clamp_roi(roi, image_size)
+    source_region = itk.ImageRegion[3]()
+    source_region.SetIndex([start[i] - padded_start[i] for i in range(3)])
+    source_region.SetSize(size)
+
+    paste_filter = itk.PasteImageFilter.New(
+        DestinationImage=image, SourceImage=roi_image
+    )
+    paste_filter.SetSourceRegion(source_region)
+    paste_filter.SetDestinationIndex(start)
+    paste_filter.Update()
+    return paste_filter.GetOutput()
+
+
+def image_from_roi_array(image, roi_array, roi):
+    """Make an image of the region of an ROI from an array of its voxels.
+
+    Args:
+        image: The full image, used for its geometry.
+        roi_array (np.ndarray): The (z, y, x) voxels of the region.
+        roi (list): The ROI, or None if roi_array covers the whole image.
+
+    Returns:
+        The image of the region, overlaying image.
+    """
+    roi_image = itk.GetImageFromArray(roi_array)
+    roi_image.SetSpacing(image.GetSpacing())
+    roi_image.SetDirection(image.GetDirection())
+    if roi is None:
+        roi_image.SetOrigin(image.GetOrigin())
+    else:
+        start, _ = clamp_roi(roi, get_image_size(image))
+        roi_image.SetOrigin(image.TransformIndexToPhysicalPoint(start))
+    return roi_image
+
+
+def get_label_statistics(label_array):
+    """Get the labels of a label image, with their ROI and number of voxels.
+
+    The statistics of all the labels are computed in one sweep over the
+    slices of the image: for each slice, the labels present in each row and
+    in each column are counted at once, which gives the voxel counts and the
+    bounds of every label along every axis.
+
+    Args:
+        label_array (np.ndarray): The (z, y, x) voxels of the label image,
+            of an unsigned integer type (e.g., a view of a mask image).
+
+    Returns:
+        dict: For each label present, in increasing order (including 0),
+            a tuple of its ROI, the inclusive [[x0, y0, z0], [x1, y1, z1]]
+            index bounds of its voxels, and its number of voxels.
+    """
+    if label_array.size == 0:
+        return {}
+    if label_array.dtype == np.uint8:
+        number_of_labels = 256
+    else:
+        number_of_labels = int(label_array.max()) + 1
+
+    size_z, size_y, size_x = label_array.shape
+    row_offsets = (np.arange(size_y) * number_of_labels)[:, np.newaxis]
+    column_offsets = (np.arange(size_x) * number_of_labels)[np.newaxis, :]
+    counts = np.zeros(number_of_labels, dtype=np.int64)
+    in_slices = np.zeros((size_z, number_of_labels), dtype=bool)
+    in_rows = np.zeros((size_y, number_of_labels), dtype=bool)
+    in_columns = np.zeros((size_x, number_of_labels), dtype=bool)
+    for z in range(size_z):
+        label_slice = label_array[z].astype(np.intp)
+        row_counts = np.bincount(
+            (label_slice + row_offsets).ravel(),
+            minlength=size_y * number_of_labels,
+        ).reshape(size_y, number_of_labels)
+        column_counts = np.bincount(
+            (label_slice + column_offsets).ravel(),
+            minlength=size_x * number_of_labels,
+        ).reshape(size_x, number_of_labels)
+        slice_counts = row_counts.sum(axis=0)
+        counts += slice_counts
+        in_slices[z] = slice_counts > 0
+        in_rows |= row_counts > 0
+        in_columns |= column_counts > 0
+
+    statistics = {}
+    for label in np.flatnonzero(counts):
+        bounds = []
+        for in_planes in [in_columns, in_rows, in_slices]:
+            planes = np.flatnonzero(in_planes[:, label])
+            bounds.append((int(planes[0]), int(planes[-1])))
+        roi = [[bound[0] for bound in bounds], [bound[1] for bound in bounds]]
+        statistics[int(label)] = (roi, int(counts[label]))
+    return statistics
+
+
+def get_overlapping_roi(overlapping_image, image):
+    """Get the ROI of the voxels of an image overlapped by another image.
+
+    Args:
+        overlapping_image: The image overlapping image, e.g., the cropped
+            label image of a mask object.
+        image: The image.
+
+    Returns:
+        list: The ROI of the voxels of image whose centers may be inside
+            overlapping_image, clamped to image, or None if the images do not
+            overlap.
+    """
+    overlapping_size = get_image_size(overlapping_image)
+    corners = np.array(
+        [
+            [
+                -0.5 + x * overlapping_size[0],
+                -0.5 + y * overlapping_size[1],
+                -0.5 + z * overlapping_size[2],
+            ]
+            for x in (0, 1)
+            for y in (0, 1)
+            for z in (0, 1)
+        ]
+    )
+    index_to_point = itk.array_from_matrix(
+        overlapping_image.GetDirection()
+    ) * np.array(overlapping_image.GetSpacing())
+    points = corners @ index_to_point.T + np.array(
+        overlapping_image.GetOrigin()
+    )
+    point_to_index = np.linalg.inv(
+        itk.array_from_matrix(image.GetDirection())
+        * np.array(image.GetSpacing())
+    )
+    indices = (points - np.array(image.GetOrigin())) @ point_to_index.T
+
+    image_size = get_image_size(image)
+    start = np.maximum(np.ceil(indices.min(axis=0) - 1e-6), 0).astype(int)
+    end = np.minimum(
+        np.floor(indices.max(axis=0) + 1e-6), np.array(image_size) - 1
+    ).astype(int)
+    if np.any(end < start):
+        return None
+    return [start.tolist(), end.tolist()]
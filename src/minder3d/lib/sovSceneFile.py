@@ -0,0 +1,914 @@
+"""Read and write scenes, as MetaIO or minder3D scene files.
+
+MetaIO scene files (.tre) store the tube points as text and the label
+images of mask objects uncompressed.  minder3D scene files (.m3d) are zip
+files holding:
+
+    manifest.json: The format version, the hierarchy of the objects and
+        their properties (id, type, color, name, transform, mask value).
+    tubes/<id>.npy: The points of each tube, one row per point and one
+        column per attribute (see TUBE_POINT_COLUMNS), compressed.
+    images/<n>/<chunk>.npy: The label images of the mask objects, split
+        into compressed chunks of slices.  Mask objects sharing a label
+        image reference the same image.
+
+Loading a minder3D scene file creates the tubes and label images directly
+from those arrays.  The manifest is an index of the objects: scenes can be
+loaded lazily, listing their objects immediately and loading the geometry
+of each object when it is first rendered or selected (see
+load_scene_object()), or by a background task (see read_scene_objects()).
+
+MetaIO scene files holding only groups and tubes are indexed the same way:
+the header lines of the objects are read, and the points of each tube are
+skipped, recording where they start and end in the file so they can be
+read when the tube is loaded.  Other MetaIO scene files are read completely
+by the ITK reader.
+
+read_scene() and write_scene() choose the format from the file extension.
+"""
+
+import json
+import threading
+import zipfile
+
+import itk
+import numpy as np
+
+from .sovTaskRunner import TaskCancelledError, task_cancelled, task_progress
+from .sovUtils import (
+    compress_scene_for_saving,
+    get_children_as_list,
+    read_group,
+    set_object_name,
+    time_and_log,
+    uncompress_scene_after_loading,
+    write_group,
+)
+
+SCENE_FILE_EXTENSION = '.m3d'
+SCENE_FILE_FORMAT = 'minder3D scene'
+SCENE_FILE_VERSION = 1
+
+# The file dialog filter of the scene files
+SCENE_FILE_FILTER = (
+    'minder3D Scenes (*.m3d);;MetaIO Scenes (*.tre);;All Files (*)'
+)
+
+# The attributes of the tube points, in the column order of the point arrays
+TUBE_POINT_COLUMNS = [
+    'x',
+    'y',
+    'z',
+    'radius',
+    'red',
+    'green',
+    'blue',
+    'alpha',
+    'ridgeness',
+    'medialness',
+    'branchness',
+    'curvature',
+    'intensity',
+    'roundness',
+    'levelness',
+    'alpha1',
+    'alpha2',
+    'alpha3',
+]
+
+# The maximum number of voxels of the chunks of the label images
+IMAGE_CHUNK_SIZE = 2**22
+
+# The spatial object types of the MetaIO object types read lazily
+METAIO_OBJECT_TYPES = {
+    'Group': 'GroupSpatialObject',
+    'Tube': 'TubeSpatialObject',
+}
+
+# The columns of TUBE_POINT_COLUMNS, by MetaIO tube point attribute
+METAIO_TUBE_POINT_COLUMNS = {
+    'x': 'x',
+    'y': 'y',
+    'z': 'z',
+    'r': 'radius',
+    'red': 'red',
+    'green': 'green',
+    'blue': 'blue',
+    'alpha': 'alpha',
+    'rn': 'ridgeness',
+    'mn': 'medialness',
+    'bn': 'branchness',
+    'cv': 'curvature',
+    'in': 'intensity',
+    'ro': 'roundness',
+    'lv': 'levelness',
+    'a1': 'alpha1',
+    'a2': 'alpha2',
+    'a3': 'alpha3',
+}
+
+# The maximum size of the blocks of text read when skipping the points of
+# tubes, and the size of their lines, overestimated to read them in one block
+METAIO_BLOCK_SIZE = 2**20
+METAIO_LINE_SIZE = 256
+
+
+def is_scene_file(filename):
+    """Check whether a file name is that of a minder3D scene file."""
+    return filename.lower().endswith(SCENE_FILE_EXTENSION)
+
+
+def get_object_transform(so):
+    """Get the object to parent transform of an object as lists."""
+    transform = so.GetObjectToParentTransform()
+    matrix = itk.array_from_matrix(transform.GetMatrix())
+    return matrix.flatten().tolist(), list(transform.GetOffset())
+
+
+def set_object_transform(so, matrix, offset):
+    """Set the object to parent transform of an object from lists."""
+    transform = itk.AffineTransform[itk.D, 3].New()
+    transform.SetMatrix(
+        itk.matrix_from_array(np.array(matrix, dtype=np.float64).reshape(3, 3))
+    )
+    transform.SetOffset(offset)
+    so.SetObjectToParentTransform(transform)
+
+
+def get_tube_point_array(tube):
+    """Get the points of a tube as an array, see TUBE_POINT_COLUMNS."""
+    point_list = tube.GetPoints()
+    point_array = np.empty(
+        (len(point_list), len(TUBE_POINT_COLUMNS)), dtype=np.float64
+    )
+    for point_num, point in enumerate(point_list):
+        point_array[point_num] = [
+            *point.GetPositionInObjectSpace(),
+            point.GetRadiusInObjectSpace(),
+            *point.GetColor(),
+            point.GetRidgeness(),
+            point.GetMedialness(),
+            point.GetBranchness(),
+            point.GetCurvature(),
+            point.GetIntensity(),
+            point.GetRoundness(),
+            point.GetLevelness(),
+            point.GetAlpha1(),
+            point.GetAlpha2(),
+            point.GetAlpha3(),
+        ]
+    return point_array
+
+
+def make_tube_point_list(point_array):
+    """Make the points of a tube from an array, see TUBE_POINT_COLUMNS."""
+    point_list = []
+    for row in point_array.tolist():
+        point = itk.TubeSpatialObjectPoint[3]()
+        point.SetPositionInObjectSpace(row[0:3])
+        point.SetRadiusInObjectSpace(row[3])
+        point.SetColor(row[4:8])
+        point.SetRidgeness(row[8])
+        point.SetMedialness(row[9])
+        point.SetBranchness(row[10])
+        point.SetCurvature(row[11])
+        point.SetIntensity(row[12])
+        point.SetRoundness(row[13])
+        point.SetLevelness(row[14])
+        point.SetAlpha1(row[15])
+        point.SetAlpha2(row[16])
+        point.SetAlpha3(row[17])
+        point_list.append(point)
+    return point_list
+
+
+def set_tube_point_array(tube, point_array):
+    """Set the points of a tube from an array, see TUBE_POINT_COLUMNS."""
+    tube.SetPoints(make_tube_point_list(point_array))
+
+
+def write_array(zip_file, name, array):
+    """Write an array as a compressed .npy entry of a zip file."""
+    with zip_file.open(name, 'w') as entry:
+        np.lib.format.write_array(entry, np.ascontiguousarray(array))
+
+
+def read_array(zip_file, name):
+    """Read an array written by write_array()."""
+    with zip_file.open(name) as entry:
+        return np.lib.format.read_array(entry)
+
+
+@time_and_log
+def write_scene_file(scene, filename, compresslevel=6):
+    """Write a scene to a minder3D scene file.
+
+    Args:
+        scene (itk.GroupSpatialObject): The scene.
+        filename (str): The name of the file, usually ending with .m3d.
+        compresslevel (int?): The zlib compression level of the arrays, from
+            1 (fastest) to 9 (smallest).  Defaults to 6.
+    """
+    objects = []
+    images = []
+    image_nums = {}
+    with zipfile.ZipFile(
+        filename, 'w', zipfile.ZIP_DEFLATED, compresslevel=compresslevel
+    ) as zip_file:
+        for so in [scene] + get_children_as_list(scene):
+            matrix, offset = get_object_transform(so)
+            so_info = {
+                'id': so.GetId(),
+                'parent_id': so.GetParentId() if so is not scene else -1,
+                'type': so.GetTypeName(),
+                'color': list(so.GetProperty().GetColor()),
+                'name': str(so.GetProperty().GetTagStringValue('Name')),
+                'matrix': matrix,
+                'offset': offset,
+            }
+            if so.GetTypeName() == 'TubeSpatialObject':
+                so_info['root'] = bool(so.GetRoot())
+                so_info['points'] = f'tubes/{so.GetId()}.npy'
+                write_array(
+                    zip_file,
+                    so_info['points'],
+                    get_tube_point_array(so),
+                )
+            elif so.GetTypeName() == 'ImageMaskSpatialObject':
+                image = so.GetImage()
+                image_key = int(image.this)
+                if image_key not in image_nums:
+                    image_nums[image_key] = len(images)
+                    images.append(
+                        write_image(
+                            zip_file,
+                            f'images/{len(images)}',
+                            image,
+                        )
+                    )
+                so_info['image'] = image_nums[image_key]
+                so_info['mask_value'] = (
+                    int(so.GetMaskValue()) if so.GetUseMaskValue() else None
+                )
+            objects.append(so_info)
+
+        manifest = {
+            'format': SCENE_FILE_FORMAT,
+            'version': SCENE_FILE_VERSION,
+            'tube_point_columns': TUBE_POINT_COLUMNS,
+            'objects': objects,
+            'images': images,
+        }
+        zip_file.writestr('manifest.json', json.dumps(manifest, indent=1))
+
+
+def write_image(zip_file, prefix, image):
+    """Write an image as compressed chunks of slices.
+
+    Returns:
+        dict: The description of the image, for the manifest.
+    """
+    image_array = itk.GetArrayViewFromImage(image)
+    slice_size = max(1, int(np.prod(image_array.shape[1:])))
+    chunk_slices = max(1, IMAGE_CHUNK_SIZE // slice_size)
+    chunks = []
+    for chunk_start in range(0, image_array.shape[0], chunk_slices):
+        chunk_name = f'{prefix}/{len(chunks)}.npy'
+        write_array(
+            zip_file,
+            chunk_name,
+            image_array[chunk_start : chunk_start + chunk_slices],
+        )
+        chunks.append(chunk_name)
+    return {
+        'shape': list(image_array.shape),
+        'dtype': image_array.dtype.str,
+        'spacing': list(image.GetSpacing()),
+        'origin': list(image.GetOrigin()),
+        'direction': itk.array_from_matrix(image.GetDirection())
+        .flatten()
+        .tolist(),
+        'chunk_slices': chunk_slices,
+        'chunks': chunks,
+    }
+
+
+def read_image(zip_file, image_info):
+    """Read an image written by write_image()."""
+    image_array = np.empty(image_info['shape'], dtype=image_info['dtype'])
+    chunk_slices = image_info['chunk_slices']
+    for chunk_num, chunk_name in enumerate(image_info['chunks']):
+        chunk_start = chunk_num * chunk_slices
+        image_array[chunk_start : chunk_start + chunk_slices] = read_array(
+            zip_file, chunk_name
+        )
+    image = itk.GetImageFromArray(image_array)
+    image.SetSpacing(image_info['spacing'])
+    image.SetOrigin(image_info['origin'])
+    image.SetDirection(
+        itk.matrix_from_array(
+            np.array(image_info['direction'], dtype=np.float64).reshape(3, 3)
+        )
+    )
+    return image
+
+
+class SceneGeometry:
+    """The geometry of the objects of a lazily loaded scene file.
+
+    Lazily loaded scenes keep their file open until the geometry of all of
+    their objects has been loaded.  Subclasses read the geometry of an
+    object from their file format.
+    """
+
+    def __init__(self):
+        self.number_of_unloaded_objects = 0
+
+    def read(self, so_info):
+        """Read the geometry of an object from the file.
+
+        Returns:
+            The points of a tube (list), or the label image of a mask
+                object (itk.Image).
+        """
+        raise NotImplementedError
+
+    def apply(self, so, so_info, geometry):
+        """Set the geometry of an object, as returned by read()."""
+        if so_info['type'] == 'TubeSpatialObject':
+            so.SetPoints(geometry)
+        elif so_info['type'] == 'ImageMaskSpatialObject':
+            so.SetImage(geometry)
+        so.Update()
+
+    def load(self, so, so_info):
+        """Set the geometry of an object from the file."""
+        self.apply(so, so_info, self.read(so_info))
+
+    def release(self):
+        """Count an object of the file as loaded or discarded.
+
+        The file is closed once all of its objects are loaded or discarded.
+        """
+        self.number_of_unloaded_objects -= 1
+        if self.number_of_unloaded_objects == 0:
+            self.close()
+
+    def close(self):
+        raise NotImplementedError
+
+
+class SceneFileGeometry(SceneGeometry):
+    """The tube points and label images of a minder3D scene file."""
+
+    def __init__(self, zip_file, manifest):
+        super().__init__()
+        self.zip_file = zip_file
+        self.manifest = manifest
+        self.images = {}
+
+    def get_image(self, image_num):
+        """Get a label image, read once and shared by its mask objects."""
+        if image_num not in self.images:
+            self.images[image_num] = read_image(
+                self.zip_file, self.manifest['images'][image_num]
+            )
+        return self.images[image_num]
+
+    def read(self, so_info):
+        if so_info['type'] == 'TubeSpatialObject':
+            return make_tube_point_list(
+                read_array(self.zip_file, so_info['points'])
+            )
+        elif so_info['type'] == 'ImageMaskSpatialObject':
+            return self.get_image(so_info['image'])
+        return None
+
+    def close(self):
+        self.zip_file.close()
+        self.images = {}
+
+
+# The objects of lazily loaded scenes whose geometry has not been loaded,
+# by C++ pointer: (object, object description, SceneGeometry)
+_unloaded_objects = {}
+_unloaded_objects_lock = threading.RLock()
+
+
+def make_unloaded_mask_image(image_info):
+    """Make the empty image of a mask object whose image is not loaded."""
+    image = itk.GetImageFromArray(
+        np.zeros((1, 1, 1), dtype=image_info['dtype'])
+    )
+    image.SetSpacing(image_info['spacing'])
+    image.SetOrigin(image_info['origin'])
+    image.SetDirection(
+        itk.matrix_from_array(
+            np.array(image_info['direction'], dtype=np.float64).reshape(3, 3)
+        )
+    )
+    return image
+
+
+def is_scene_object_loaded(so):
+    """Check whether the geometry of an object has been loaded.
+
+    Only the objects of lazily loaded scenes can be unloaded.
+    """
+    return int(so.this) not in _unloaded_objects
+
+
+def load_scene_object(so):
+    """Load the geometry of an object of a lazily loaded scene, if needed.
+
+    Thread-safe: the scene can be loaded by a background task while the
+    objects being rendered or selected are loaded first.
+
+    Args:
+        so: The object.
+
+    Returns:
+        bool: True if the geometry was loaded, False if it already was.
+    """
+    with _unloaded_objects_lock:
+        unloaded_object = _unloaded_objects.pop(int(so.this), None)
+        if unloaded_object is None:
+            return False
+        so, so_info, geometry = unloaded_object
+        geometry.load(so, so_info)
+        geometry.release()
+    return True
+
+
+@time_and_log
+def read_scene_objects(scene):
+    """Read the geometry of the objects of a lazily loaded scene.
+
+    The objects are not modified, so the geometry can be read by a
+    TaskRunner while the scene is rendered; apply_scene_objects() then sets
+    it on the GUI thread.  Reports its progress and can be cancelled when
+    run by the TaskRunner; the objects not loaded remain loadable by
+    load_scene_object().
+
+    Args:
+        scene: The scene.
+
+    Returns:
+        list: The (object, geometry) of each object that was not loaded.
+    """
+    so_list = [
+        so
+        for so in get_children_as_list(scene)
+        if not is_scene_object_loaded(so)
+    ]
+    so_geometry_list = []
+    for so_num, so in enumerate(so_list):
+        if task_cancelled():
+            raise TaskCancelledError()
+        task_progress(
+            so_num / len(so_list),
+            f'Loading object {so_num + 1} of {len(so_list)}',
+        )
+        with _unloaded_objects_lock:
+            unloaded_object = _unloaded_objects.get(int(so.this), None)
+            if unloaded_object is None:
+                continue
+            so, so_info, geometry = unloaded_object
+            so_geometry_list.append((so, geometry.read(so_info)))
+    return so_geometry_list
+
+
+def apply_scene_objects(so_geometry_list):
+    """Set the geometry read by read_scene_objects() on the objects.
+
+    Objects loaded or discarded since their geometry was read are skipped.
+
+    Args:
+        so_geometry_list (list): The (object, geometry) of each object.
+    """
+    with _unloaded_objects_lock:
+        for so, so_geometry in so_geometry_list:
+            unloaded_object = _unloaded_objects.pop(int(so.this), None)
+            if unloaded_object is None:
+                continue
+            so, so_info, geometry = unloaded_object
+            geometry.apply(so, so_info, so_geometry)
+            geometry.release()
+
+
+@time_and_log
+def load_scene_objects(scene):
+    """Load the geometry of all the objects of a lazily loaded scene.
+
+    Args:
+        scene: The scene.
+
+    Returns:
+        The scene.
+    """
+    apply_scene_objects(read_scene_objects(scene))
+    return scene
+
+
+def add_unloaded_objects(geometry, unloaded_objects):
+    """Make the objects of a lazily loaded scene loadable.
+
+    The file of the scene is closed if all of its objects are loaded.
+
+    Args:
+        geometry (SceneGeometry): The geometry of the scene.
+        unloaded_objects (dict): The (object, object description, geometry)
+            of the objects not loaded, by C++ pointer.
+    """
+    if len(unloaded_objects) == 0:
+        geometry.close()
+        return
+    geometry.number_of_unloaded_objects = len(unloaded_objects)
+    with _unloaded_objects_lock:
+        _unloaded_objects.update(unloaded_objects)
+
+
+def discard_unloaded_scene_objects(so_list):
+    """Forget the geometry of objects removed from the scene, if not loaded.
+
+    Args:
+        so_list (list): The objects.
+    """
+    with _unloaded_objects_lock:
+        for so in so_list:
+            unloaded_object = _unloaded_objects.pop(int(so.this), None)
+            if unloaded_object is None:
+                continue
+            unloaded_object[2].release()
+
+
+@time_and_log
+def read_scene_file(filename, lazy=False):
+    """Read a scene from a minder3D scene file.
+
+    Args:
+        filename (str): The name of the file.
+        lazy (bool?): Only read the hierarchy and properties of the objects.
+            Their tubes have no points, and their masks empty images, until
+            load_scene_object() or load_scene_objects() is called.  Defaults
+            to False.
+
+    Returns:
+        itk.GroupSpatialObject: The scene, or None if the file is not a
+            minder3D scene file.
+    """
+    try:
+        zip_file = zipfile.ZipFile(filename)
+    except (OSError, zipfile.BadZipFile):
+        return None
+
+    try:
+        manifest = json.loads(zip_file.read('manifest.json'))
+    except (KeyError, ValueError):
+        zip_file.close()
+        return None
+    if manifest.get('format') != SCENE_FILE_FORMAT:
+        zip_file.close()
+        return None
+    if manifest['version'] > SCENE_FILE_VERSION:
+        zip_file.close()
+        raise ValueError(
+            f'{filename} was saved by a newer version of minder3D.'
+        )
+
+    geometry = SceneFileGeometry(zip_file, manifest)
+    scene = None
+    objects_by_id = {}
+    unloaded_objects = {}
+    for so_info in manifest['objects']:
+        so_type = so_info['type']
+        if so_type == 'TubeSpatialObject':
+            so = itk.TubeSpatialObject[3].New()
+            so.SetRoot(so_info['root'])
+        elif so_type == 'ImageMaskSpatialObject':
+            so = itk.ImageMaskSpatialObject[3].New(
+                Image=make_unloaded_mask_image(
+                    manifest['images'][so_info['image']]
+                )
+            )
+            if so_info['mask_value'] is not None:
+                so.SetUseMaskValue(True)
+                so.SetMaskValue(so_info['mask_value'])
+        else:
+            so = itk.GroupSpatialObject[3].New()
+        so.SetId(so_info['id'])
+        so.GetProperty().SetColor(so_info['color'])
+        if so_info['name'] != '':
+            so.GetProperty().SetTagStringValue('Name', so_info['name'])
+        set_object_transform(so, so_info['matrix'], so_info['offset'])
+
+        if scene is None:
+            scene = so
+        else:
+            parent = objects_by_id.get(so_info['parent_id'], scene)
+            parent.AddChild(so)
+        objects_by_id[so_info['id']] = so
+
+        if so_type in ('TubeSpatialObject', 'ImageMaskSpatialObject'):
+            if lazy:
+                unloaded_objects[int(so.this)] = (so, so_info, geometry)
+            else:
+                geometry.load(so, so_info)
+    scene.Update()
+
+    add_unloaded_objects(geometry, unloaded_objects)
+    return scene
+
+
+def skip_metaio_lines(metaio_file, number_of_lines):
+    """Move a file past a number of lines, without splitting them."""
+    while number_of_lines > 0:
+        block_start = metaio_file.tell()
+        block = metaio_file.read(
+            min(number_of_lines * METAIO_LINE_SIZE, METAIO_BLOCK_SIZE)
+        )
+        if len(block) == 0:
+            return
+        block_lines = block.count(b'\n')
+        if block_lines < number_of_lines:
+            number_of_lines -= block_lines
+            continue
+        line_end = -1
+        for _ in range(number_of_lines):
+            line_end = block.index(b'\n', line_end + 1)
+        metaio_file.seek(block_start + line_end + 1)
+        return
+
+
+def read_metaio_header(metaio_file):
+    """Read the header lines of the objects of a MetaIO scene file.
+
+    The points of the tubes are skipped: their first and last byte in the
+    file are added to the header of the tube as 'PointsStart' and
+    'PointsEnd'.
+
+    Returns:
+        list: The header of each object (dict), or None if the file holds
+            objects other than groups and tubes.
+    """
+    headers = []
+    header = None
+    for line in iter(metaio_file.readline, b''):
+        key, separator, value = line.decode('latin-1').partition('=')
+        if separator == '':
+            continue
+        key = key.strip()
+        value = value.strip()
+        if key == 'ObjectType':
+            if value == 'Scene':
+                header = None
+                continue
+            if value not in METAIO_OBJECT_TYPES:
+                return None
+            header = {}
+            headers.append(header)
+        if header is None:
+            continue
+        header[key] = value
+        if key == 'Points':
+            header['PointsStart'] = metaio_file.tell()
+            skip_metaio_lines(metaio_file, int(header.get('NPoints', 0)))
+            header['PointsEnd'] = metaio_file.tell()
+    return headers
+
+
+def make_metaio_object_info(header):
+    """Describe an object from its MetaIO header, as in the manifest.
+
+    Returns:
+        dict: The description of the object, or None if the ITK reader is
+            needed to read it.
+    """
+    if (
+        header.get('NDims', '3') != '3'
+        or header.get('BinaryData', 'False') == 'True'
+        or header.get('CompressedData', 'False') == 'True'
+    ):
+        return None
+    so_info = {
+        'id': int(header.get('ID', -1)),
+        'parent_id': int(header.get('ParentID', -1)),
+        'type': METAIO_OBJECT_TYPES[header['ObjectType']],
+        'color': None,
+        'name': header.get('Name', ''),
+        'matrix': [
+            float(value)
+            for value in header.get(
+                'TransformMatrix', '1 0 0 0 1 0 0 0 1'
+            ).split()
+        ],
+        'offset': [
+            float(value) for value in header.get('Offset', '0 0 0').split()
+        ],
+    }
+    if 'Color' in header:
+        so_info['color'] = [float(value) for value in header['Color'].split()]
+    if so_info['type'] == 'TubeSpatialObject':
+        number_of_points = int(header.get('NPoints', 0))
+        if number_of_points > 0 and 'PointsStart' not in header:
+            return None
+        so_info['root'] = header.get('Root', 'False') == 'True'
+        so_info['parent_point'] = int(header.get('ParentPoint', -1))
+        so_info['spacing'] = [
+            float(value)
+            for value in header.get('ElementSpacing', '1 1 1').split()
+        ]
+        so_info['point_dim'] = header.get('PointDim', '').split()
+        so_info['number_of_points'] = number_of_points
+        so_info['points'] = (
+            header.get('PointsStart', 0),
+            header.get('PointsEnd', 0),
+        )
+    return so_info
+
+
+def make_metaio_tube_point_array(metaio_array, point_dim, spacing):
+    """Convert the points of a MetaIO tube, see TUBE_POINT_COLUMNS.
+
+    Args:
+        metaio_array (np.ndarray): The points of the tube, one row per point
+            and one column per attribute of point_dim.
+        point_dim (list): The MetaIO attributes of the points.
+        spacing (list): The element spacing of the tube, scaling the
+            positions and radii of its points as done by the ITK reader.
+    """
+    point_array = np.zeros(
+        (metaio_array.shape[0], len(TUBE_POINT_COLUMNS)), dtype=np.float64
+    )
+    # The default color of the points
+    point_array[:, TUBE_POINT_COLUMNS.index('red')] = 1
+    point_array[:, TUBE_POINT_COLUMNS.index('alpha')] = 1
+    for metaio_column, attribute in enumerate(point_dim):
+        if attribute in METAIO_TUBE_POINT_COLUMNS:
+            point_array[
+                :,
+                TUBE_POINT_COLUMNS.index(METAIO_TUBE_POINT_COLUMNS[attribute]),
+            ] = metaio_array[:, metaio_column]
+    point_array[:, 0:3] *= spacing
+    point_array[:, TUBE_POINT_COLUMNS.index('radius')] *= spacing[0]
+    return point_array
+
+
+class MetaIOSceneGeometry(SceneGeometry):
+    """The tube points of a MetaIO scene file holding groups and tubes."""
+
+    def __init__(self, metaio_file):
+        super().__init__()
+        self.metaio_file = metaio_file
+
+    def read(self, so_info):
+        if so_info['type'] != 'TubeSpatialObject':
+            return None
+        points_start, points_end = so_info['points']
+        self.metaio_file.seek(points_start)
+        metaio_array = np.array(
+            self.metaio_file.read(points_end - points_start).split(),
+            dtype=np.float64,
+        )
+        number_of_points = so_info['number_of_points']
+        point_dim = so_info['point_dim']
+        if metaio_array.size != number_of_points * len(point_dim):
+            raise ValueError(
+                f'The points of tube {so_info["id"]} could not be read.'
+            )
+        return make_tube_point_list(
+            make_metaio_tube_point_array(
+                metaio_array.reshape(number_of_points, len(point_dim)),
+                point_dim,
+                so_info['spacing'],
+            )
+        )
+
+    def close(self):
+        self.metaio_file.close()
+
+
+@time_and_log
+def read_metaio_scene_file(filename, lazy=False):
+    """Read a MetaIO scene file holding only groups and tubes.
+
+    The header lines of the objects are indexed, so the points of the tubes
+    can be read on demand, see read_scene_file().
+
+    Args:
+        filename (str): The name of the file.
+        lazy (bool?): Only read the hierarchy and properties of the objects.
+            Their tubes have no points until load_scene_object() or
+            load_scene_objects() is called.  Defaults to False.
+
+    Returns:
+        itk.GroupSpatialObject: The scene, or None if the file holds other
+            objects, or data that only the ITK reader reads.
+    """
+    try:
+        metaio_file = open(filename, 'rb')
+    except OSError:
+        return None
+
+    try:
+        headers = read_metaio_header(metaio_file)
+        if headers is None:
+            object_infos = None
+        else:
+            object_infos = [make_metaio_object_info(h) for h in headers]
+    except (KeyError, ValueError):
+        object_infos = None
+    if object_infos is None or len(object_infos) == 0 or None in object_infos:
+        metaio_file.close()
+        return None
+
+    geometry = MetaIOSceneGeometry(metaio_file)
+    scene = None
+    objects_by_id = {}
+    unloaded_objects = {}
+    for so_info in object_infos:
+        if so_info['type'] == 'TubeSpatialObject':
+            so = itk.TubeSpatialObject[3].New()
+            so.SetRoot(so_info['root'])
+            so.SetParentPoint(so_info['parent_point'])
+        else:
+            so = itk.GroupSpatialObject[3].New()
+        so.SetId(so_info['id'])
+        if so_info['color'] is not None:
+            so.GetProperty().SetColor(so_info['color'])
+        if so_info['name'] != '':
+            set_object_name(so, so_info['name'])
+        set_object_transform(so, so_info['matrix'], so_info['offset'])
+
+        # The first object is the scene, if it is a group without parent
+        if scene is None:
+            if (
+                so_info['type'] == 'GroupSpatialObject'
+                and so_info['parent_id'] < 0
+            ):
+                scene = so
+            else:
+                scene = itk.GroupSpatialObject[3].New()
+                scene.AddChild(so)
+        else:
+            parent = objects_by_id.get(so_info['parent_id'], scene)
+            parent.AddChild(so)
+        if so_info['id'] >= 0:
+            objects_by_id[so_info['id']] = so
+
+        if so_info['type'] == 'TubeSpatialObject':
+            if lazy:
+                unloaded_objects[int(so.this)] = (so, so_info, geometry)
+            else:
+                geometry.load(so, so_info)
+    scene.Update()
+
+    add_unloaded_objects(geometry, unloaded_objects)
+    return scene
+
+
+@time_and_log
+def read_scene(filename, lazy=False):
+    """Read a scene, as a MetaIO or a minder3D scene file.
+
+    Args:
+        filename (str): The name of the file.  Files ending with .m3d are read
+            as minder3D scene files, others as MetaIO files.
+        lazy (bool?): Load the geometry of the objects on demand, see
+            read_scene_file().  MetaIO files holding objects other than
+            groups and tubes are always read completely.  Defaults to False.
+
+    Returns:
+        itk.GroupSpatialObject: The scene, or None if it could not be read.
+    """
+    if is_scene_file(filename):
+        return read_scene_file(filename, lazy)
+
+    scene = read_metaio_scene_file(filename, lazy)
+    if scene is not None:
+        return scene
+    scene = read_group(filename)
+    if scene is not None:
+        scene = uncompress_scene_after_loading(scene)
+    return scene
+
+
+@time_and_log
+def write_scene(scene, filename):
+    """Write a scene, as a MetaIO or a minder3D scene file.
+
+    Args:
+        scene (itk.GroupSpatialObject): The scene.
+        filename (str): The name of the file.  Files ending with .m3d are
+            written as minder3D scene files, others as MetaIO files.
+    """
+    load_scene_objects(scene)
+    if is_scene_file(filename):
+        write_scene_file(scene, filename)
+        return
+
+    compress_scene_for_saving(scene)
+    try:
+        write_group(scene, filename)
+    finally:
+        uncompress_scene_after_loading(scene)
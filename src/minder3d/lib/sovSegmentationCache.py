@@ -0,0 +1,165 @@
+"""A disk cache of AI segmentation results.
+
+Segmentations are keyed by a hash of the preprocessed image's voxels and
+geometry, the task, and the version of the model, so re-segmenting an image
+that was already segmented returns the stored label map instead of running
+the model again.  Label maps are stored as compressed .npz files in the
+application's cache directory, and the least recently used files are removed
+when the cache exceeds its maximum size.
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+
+import itk
+import numpy as np
+from PySide6.QtCore import QStandardPaths
+
+from .sovUtils import sov_log, time_and_log
+
+
+@time_and_log
+def get_segmentation_key(image, task, model_version):
+    """Compute the cache key of the segmentation of an image.
+
+    Args:
+        image: The preprocessed image given to the model.
+        task (str): The segmentation task.
+        model_version (str): The version of the model.
+
+    Returns:
+        str: The hexadecimal key.
+    """
+    image_array = np.ascontiguousarray(itk.GetArrayViewFromImage(image))
+    key = hashlib.blake2b(digest_size=20)
+    key.update(memoryview(image_array).cast('B'))
+    key.update(str(image_array.shape).encode())
+    key.update(image_array.dtype.str.encode())
+    key.update(np.array(image.GetSpacing(), dtype=np.float64).tobytes())
+    key.update(np.array(image.GetOrigin(), dtype=np.float64).tobytes())
+    key.update(
+        np.asarray(
+            itk.array_from_matrix(image.GetDirection()), dtype=np.float64
+        ).tobytes()
+    )
+    key.update(task.encode())
+    key.update(model_version.encode())
+    return key.hexdigest()
+
+
+class SegmentationCache:
+    def __init__(self, cache_dir=None, max_size=2 * 2**30):
+        """Initialize the cache.
+
+        Args:
+            cache_dir (str?): The directory of the cache files.  Defaults to
+                'segmentations' in the application's cache directory.
+            max_size (int?): The maximum total size of the cache files, in
+                bytes.  Defaults to 2 GB.
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(
+                QStandardPaths.writableLocation(QStandardPaths.CacheLocation),
+                'segmentations',
+            )
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+    def get_filename(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    @time_and_log
+    def get(self, key, reference_image):
+        """Get a cached segmentation.
+
+        Args:
+            key (str): The key returned by get_segmentation_key().
+            reference_image: The preprocessed image the segmentation was
+                computed from; the label image gets its geometry.
+
+        Returns:
+            The label image, or None if it is not in the cache.
+        """
+        filename = self.get_filename(key)
+        with self.lock:
+            try:
+                with np.load(filename) as data:
+                    label_array = data['labels']
+                # Mark the file as recently used
+                os.utime(filename)
+            except (OSError, KeyError, ValueError):
+                return None
+        label_image = itk.GetImageFromArray(label_array)
+        label_image.CopyInformation(reference_image)
+        return label_image
+
+    @time_and_log
+    def put(self, key, label_image):
+        """Store a segmentation, then evict files if the cache is too large.
+
+        Args:
+            key (str): The key returned by get_segmentation_key().
+            label_image: The label image.
+        """
+        filename = self.get_filename(key)
+        tmp_filename = os.path.join(
+            self.cache_dir, f'.{uuid.uuid4().hex}.tmp.npz'
+        )
+        with self.lock:
+            try:
+                np.savez_compressed(
+                    tmp_filename, labels=itk.GetArrayViewFromImage(label_image)
+                )
+                os.replace(tmp_filename, filename)
+            except OSError as e:
+                sov_log(f'Could not cache the segmentation: {e}', 'warning')
+                if os.path.exists(tmp_filename):
+                    os.remove(tmp_filename)
+                return
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used files until the cache fits."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.npz'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+            except OSError:
+                pass
+
+    @time_and_log
+    def clear(self):
+        """Remove all cached segmentations."""
+        with self.lock:
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and entry.name.endswith('.npz'):
+                    os.remove(entry.path)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_segmentation_cache():
+    """Get the application's segmentation cache, creating it if needed.
+
+    Returns:
+        SegmentationCache: The cache shared by the AI segmentation logics.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SegmentationCache()
+        return _cache
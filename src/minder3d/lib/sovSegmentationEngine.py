@@ -0,0 +1,229 @@
+"""The interface shared by the segmentation methods.
+
+A SegmentationEngine turns an image into a label image.  The base class
+implements the steps shared by every method: cropping the image to a region
+of interest, resampling it to the isotropic spacing the method expects, and
+caching the label images of the methods that are slow enough to benefit
+(see sovSegmentationCache).  Each method, or backend, only implements its
+dependency check and its segment() step, and is registered by name using
+register_segmentation_engine(), so panels, benchmarks and batch tools can
+create it with get_segmentation_engine().
+
+Engines follow the initialize() / preprocess() / run() steps of the logic
+classes, so their preprocess() and run() can be submitted to the
+TaskRunner; progress and cancellation are reported by the backends using
+task_progress() and task_cancelled().
+"""
+
+from .sovImageProcessLogic import ImageProcessLogic
+from .sovROIUtils import extract_roi
+from .sovSegmentationCache import get_segmentation_cache, get_segmentation_key
+from .sovTaskRunner import task_progress
+from .sovUtils import sov_log, time_and_log
+
+_segmentation_engines = {}
+
+
+def register_segmentation_engine(engine_class):
+    """Register a SegmentationEngine subclass under its name.
+
+    Usable as a class decorator.
+
+    Args:
+        engine_class (type): The engine class, with a unique name.
+
+    Returns:
+        type: engine_class.
+    """
+    _segmentation_engines[engine_class.name] = engine_class
+    return engine_class
+
+
+def _load_builtin_engines():
+    # The built-in backends register themselves when their modules are
+    # imported
+    from . import sovOtsuLogic, sovTotalSegmentatorLogic  # noqa: F401
+
+
+def get_segmentation_engine_names():
+    """Get the names of the registered segmentation engines.
+
+    Returns:
+        list: The names, in registration order.
+    """
+    _load_builtin_engines()
+    return list(_segmentation_engines)
+
+
+def get_segmentation_engine(name):
+    """Create a segmentation engine.
+
+    Args:
+        name (str): The name the engine was registered under.
+
+    Returns:
+        SegmentationEngine: A new instance of the engine.
+    """
+    _load_builtin_engines()
+    if name not in _segmentation_engines:
+        raise ValueError(f'Unknown segmentation engine: {name}')
+    return _segmentation_engines[name]()
+
+
+class SegmentationEngine:
+    # The name the engine is registered under
+    name = ''
+
+    # The options of the engine and their default values.  Subclasses
+    # extend those of the base class, used by preprocess().
+    default_options = {'number_of_workers': 0, 'interpolator': 'Linear'}
+
+    # Store the label images of the engine in the segmentation cache
+    cacheable = False
+
+    def __init__(self):
+        self.image = None
+        self.pre_image = None
+        self.roi = None
+        self.options = dict(self.default_options)
+
+    def check_dependencies(self):
+        """Check that the engine can run.
+
+        Returns:
+            tuple: The status (bool), a message (str), and a flag to ask the
+                user whether to continue anyway (bool).
+        """
+        return True, '', False
+
+    def get_spacing(self):
+        """Get the isotropic spacing the image is resampled to.
+
+        Returns:
+            float: The spacing, or None to segment the image at its own
+                spacing.
+        """
+        return None
+
+    def get_model_version(self):
+        """Get the version of the engine's models, part of the cache key."""
+        return ''
+
+    def get_cache_task(self):
+        """Get the description of the options, part of the cache key.
+
+        Options that do not change the label image, such as the number of
+        workers, must not be part of it.
+        """
+        options = {
+            key: value
+            for key, value in self.options.items()
+            if key != 'number_of_workers'
+        }
+        return self.name + ' ' + str(sorted(options.items()))
+
+    def segment(self, pre_image):
+        """Segment the preprocessed image.
+
+        Args:
+            pre_image: The cropped and resampled image.
+
+        Returns:
+            The label image, with the geometry of pre_image.
+        """
+        raise NotImplementedError
+
+    @time_and_log
+    def initialize(self, image, roi=None, **options):
+        """Set the image and options of the next segmentation.
+
+        The image and options are set even when the dependency check fails,
+        so a segmentation the user confirms uses them.
+
+        Args:
+            image: The image to be segmented.
+            roi (list?): The region of interest the image is cropped to
+                before segmentation.  Defaults to the whole image.
+            options: The options of the engine, see default_options.  The
+                number_of_workers option sets the number of resampling
+                threads (0 for the compute settings), and the interpolator
+                option sets the resampling interpolator (see
+                sovImageProcessLogic.INTERPOLATORS).  Linear interpolation
+                is the default: it is much faster than Sinc, and its
+                smoothing does not matter to the models.
+
+        Returns:
+            tuple: The result of check_dependencies().
+        """
+        unknown_options = set(options) - set(self.default_options)
+        if len(unknown_options) > 0:
+            raise TypeError(
+                f'Unknown {self.name} options: {", ".join(unknown_options)}'
+            )
+        self.image = image
+        self.pre_image = None
+        self.roi = roi
+        self.options = {**self.default_options, **options}
+        return self.check_dependencies()
+
+    @time_and_log
+    def preprocess(self):
+        """Crop the image to the roi and resample it to get_spacing().
+
+        Returns:
+            The preprocessed image, or None if there is no image.
+        """
+        if self.image is None:
+            return None
+
+        task_progress(0, f'{self.name}: preprocessing...')
+        iso_spacing = self.get_spacing()
+        spacing = self.image.GetSpacing()
+        if iso_spacing is not None and not all(
+            s == iso_spacing for s in spacing
+        ):
+            preproc = ImageProcessLogic()
+            self.pre_image = preproc.make_iso(
+                self.image,
+                iso_spacing,
+                number_of_threads=self.options['number_of_workers'] or None,
+                roi=self.roi,
+                interpolator=self.options['interpolator'],
+            )
+        else:
+            self.pre_image = extract_roi(self.image, self.roi)
+        return self.pre_image
+
+    @time_and_log
+    def run(self):
+        """Segment the preprocessed image.
+
+        If the image was not preprocessed, it is preprocessed first.  The
+        label images of cacheable engines are cached on disk, keyed by the
+        voxels and geometry of the preprocessed image, the options, and the
+        model version, so segmenting the same image again returns the cached
+        label image.
+
+        Returns:
+            The label image, with the geometry of the preprocessed image.
+        """
+        if self.pre_image is None:
+            self.preprocess()
+            if self.pre_image is None:
+                return None
+
+        if not self.cacheable:
+            return self.segment(self.pre_image)
+
+        cache = get_segmentation_cache()
+        key = get_segmentation_key(
+            self.pre_image, self.get_cache_task(), self.get_model_version()
+        )
+        label_image = cache.get(key, self.pre_image)
+        if label_image is not None:
+            sov_log(f'{self.name} segmentation loaded from the cache ({key}).')
+            return label_image
+
+        label_image = self.segment(self.pre_image)
+        cache.put(key, label_image)
+        return label_image
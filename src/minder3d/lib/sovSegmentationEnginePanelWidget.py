@@ -0,0 +1,168 @@
+from PySide6.QtWidgets import QMessageBox, QWidget
+
+from .sovSegmentationEngine import get_segmentation_engine
+from .sovUtils import add_objects_in_mask_image_to_scene, time_and_log
+
+
+class SegmentationEnginePanelWidget(QWidget):
+    """The base class of the panels that run a segmentation engine.
+
+    Subclasses also inherit from their Ui_* class, and call
+    set_engine_widgets() with the widgets of their panel.
+    """
+
+    def __init__(self, gui, state, engine_name, parent=None):
+        """Initialize the panel and its segmentation engine.
+
+        Args:
+            gui: The graphical user interface object.
+            state: The state object.
+            engine_name (str): The name of the registered segmentation engine.
+            parent: The parent widget (default is None).
+        """
+
+        super().__init__(parent)
+        self.setupUi(self)
+
+        self.gui = gui
+        self.state = state
+        self.logic = get_segmentation_engine(engine_name)
+
+        self.run_button = None
+        self.crop_check_box = None
+        self.fast_check_box = None
+        self.roi_subset_line_edit = None
+        self.workers_spin_box = None
+        self.interpolator_combo_box = None
+        self.keep_image_check_box = None
+
+    def set_engine_widgets(
+        self,
+        run_button,
+        crop_check_box=None,
+        fast_check_box=None,
+        roi_subset_line_edit=None,
+        workers_spin_box=None,
+        interpolator_combo_box=None,
+        keep_image_check_box=None,
+    ):
+        """Connect the widgets of the panel.
+
+        Args:
+            run_button (QPushButton): Starts the segmentation.
+            crop_check_box (QCheckBox?): Crops the image to its ROI.
+            fast_check_box (QCheckBox?): Sets the engine's fast option.
+            roi_subset_line_edit (QLineEdit?): The comma-separated names of
+                the structures of the engine's roi_subset option.
+            workers_spin_box (QSpinBox?): Sets the number of workers.
+            interpolator_combo_box (QComboBox?): Lists the interpolators
+                used for resampling.
+            keep_image_check_box (QCheckBox?): Adds the preprocessed image
+                to the image list.  Without it, the preprocessed image is
+                released once the segmentation is done.
+        """
+        self.run_button = run_button
+        self.crop_check_box = crop_check_box
+        self.fast_check_box = fast_check_box
+        self.roi_subset_line_edit = roi_subset_line_edit
+        self.workers_spin_box = workers_spin_box
+        self.interpolator_combo_box = interpolator_combo_box
+        self.keep_image_check_box = keep_image_check_box
+
+        self.run_button.clicked.connect(self.segment_ai)
+        self.run_button.setStyleSheet('background-color: #00aa00')
+
+    def get_engine_options(self):
+        """Get the options of the engine from the widgets of the panel.
+
+        Returns:
+            dict: The keyword arguments of the engine's initialize().
+        """
+        options = {}
+        if self.fast_check_box is not None:
+            options['fast'] = self.fast_check_box.isChecked()
+        if self.roi_subset_line_edit is not None:
+            options['roi_subset'] = [
+                name.strip()
+                for name in self.roi_subset_line_edit.text().split(',')
+                if name.strip() != ''
+            ]
+        if self.workers_spin_box is not None:
+            options['number_of_workers'] = self.workers_spin_box.value()
+        if self.interpolator_combo_box is not None:
+            options['interpolator'] = self.interpolator_combo_box.currentText()
+        return options
+
+    @time_and_log
+    def segment_ai(self):
+        """Segment the current image using the engine.
+
+        This method initializes the engine with the current image, checking its dependencies, and preprocesses it.
+        Then it runs the engine to segment the image and adds the segmented objects to the scene.
+        """
+
+        roi = None
+        if self.crop_check_box is not None and self.crop_check_box.isChecked():
+            roi = self.state.roi[self.state.current_image_num]
+        status, msg, ask_to_continue = self.logic.initialize(
+            self.state.image[self.state.current_image_num],
+            roi=roi,
+            **self.get_engine_options(),
+        )
+        if status is False:
+            message = QMessageBox()
+            message.setWindowTitle(
+                f'Verifying {self.logic.name} installation...'
+            )
+            message.setText(msg)
+            if ask_to_continue:
+                message.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+            ret = message.exec()
+            if not ask_to_continue or ret == QMessageBox.No:
+                return
+
+        self.gui.log('Preprocessing...')
+        self.gui.task_runner.submit(
+            self.logic.preprocess,
+            name=f'{self.logic.name} Preprocessing',
+            on_result=self.preprocess_done,
+        )
+
+    @time_and_log
+    def preprocess_done(self, pre_image):
+        """Show the preprocessed image and start the segmentation.
+
+        Args:
+            pre_image: The preprocessed image.
+        """
+        if pre_image is None:
+            return
+        if (
+            pre_image is not self.logic.image
+            and self.keep_image_check_box is not None
+            and self.keep_image_check_box.isChecked()
+        ):
+            self.gui.create_new_image(pre_image, None, 'Iso')
+            self.gui.update_image()
+
+        self.gui.log('Running...')
+        self.gui.task_runner.submit(
+            self.logic.run,
+            name=f'{self.logic.name} Segmentation',
+            on_result=self.segment_ai_done,
+        )
+
+    @time_and_log
+    def segment_ai_done(self, seg_image):
+        """Add the objects of the segmentation to the scene.
+
+        Args:
+            seg_image: The label image computed by the engine.
+        """
+        self.gui.log('Done.')
+
+        # The engine's preprocessed image is only needed by its next run
+        self.logic.pre_image = None
+
+        add_objects_in_mask_image_to_scene(seg_image, self.state.scene)
+        self.gui.update_scene()
@@ -0,0 +1,296 @@
+"""Run long panel actions off the GUI thread.
+
+Panels submit their processing to the application's TaskRunner, which runs
+it in a QThreadPool and delivers the result (or the exception) back on the
+GUI thread via signals.  Functions running as a task can report progress and
+check for cancellation using task_progress() and task_cancelled(); both are
+no-ops when a function is called outside of a task.
+"""
+
+import itertools
+import threading
+import traceback
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from .sovUtils import sov_log
+
+_current_task = threading.local()
+
+
+def task_progress(fraction, message=''):
+    """Report the progress of the task running in the calling thread.
+
+    Args:
+        fraction (float): The fraction of the task completed, in [0, 1].
+        message (str?): A short description of the current step.
+    """
+    job = getattr(_current_task, 'job', None)
+    if job is not None:
+        job.signals.progress.emit(job.job_id, float(fraction), message)
+
+
+def task_cancelled():
+    """Check if the task running in the calling thread has been cancelled.
+
+    Returns:
+        bool: True if the task should stop as soon as possible.
+    """
+    job = getattr(_current_task, 'job', None)
+    return job is not None and job.cancel_event.is_set()
+
+
+class TaskCancelledError(Exception):
+    """Raised by a task's function to stop after it has been cancelled."""
+
+
+class TaskSignals(QObject):
+    started = Signal(int)
+    progress = Signal(int, float, str)
+    finished = Signal(int, object)
+    failed = Signal(int, object, str)
+
+
+class TaskJob(QRunnable):
+    def __init__(self, job_id, name, func, args, kwargs, signals):
+        """Initialize a job that calls func(*args, **kwargs) in the pool.
+
+        Args:
+            job_id (int): The unique id of the job.
+            name (str): The name of the job, shown in the status bar.
+            func (function): The function to be called.
+            args (tuple): The positional arguments of func.
+            kwargs (dict): The keyword arguments of func.
+            signals (TaskSignals): The signals used to report to the GUI.
+        """
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.job_id = job_id
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = signals
+        self.cancel_event = threading.Event()
+        # Set by the pool thread when the function has returned
+        self.done_event = threading.Event()
+
+        self.on_result = None
+        self.on_error = None
+        self.on_progress = None
+
+    def run(self):
+        _current_task.job = self
+        try:
+            if self.cancel_event.is_set():
+                raise TaskCancelledError()
+            self.signals.started.emit(self.job_id)
+            result = self.func(*self.args, **self.kwargs)
+            self.signals.finished.emit(self.job_id, result)
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, e, traceback.format_exc())
+        finally:
+            _current_task.job = None
+            self.done_event.set()
+
+
+class TaskRunner(QObject):
+    # Number of queued jobs, number of running jobs, name of latest job
+    jobs_changed = Signal(int, int, str)
+    # Job id, fraction completed, message
+    job_progress = Signal(int, float, str)
+
+    def __init__(self, max_thread_count=None, parent=None):
+        """Initialize the task runner and its thread pool.
+
+        Args:
+            max_thread_count (int?): The number of jobs that can run at once.
+                Defaults to the number of cores.
+            parent: The parent QObject (default is None).
+        """
+        super().__init__(parent)
+
+        self.pool = QThreadPool(self)
+        if max_thread_count is not None:
+            self.pool.setMaxThreadCount(max_thread_count)
+
+        self.signals = TaskSignals()
+        self.signals.started.connect(self._job_started)
+        self.signals.progress.connect(self._job_progress)
+        self.signals.finished.connect(self._job_finished)
+        self.signals.failed.connect(self._job_failed)
+
+        self.job_ids = itertools.count(1)
+        self.jobs = dict()
+        self.running_job_ids = set()
+
+    def submit(
+        self,
+        func,
+        *args,
+        name='',
+        on_result=None,
+        on_error=None,
+        on_progress=None,
+        **kwargs,
+    ):
+        """Queue a call of func(*args, **kwargs) in the thread pool.
+
+        The callbacks are called on the GUI thread.
+
+        Args:
+            func (function): The function to be run.
+            name (str?): The name of the job, shown in the status bar.
+            on_result (function?): Called with the result of func.
+            on_error (function?): Called with the exception raised by func.
+                Exceptions are logged if on_error is not given.
+            on_progress (function?): Called with the fraction completed and
+                a message each time func calls task_progress().
+
+        Returns:
+            int: The id of the job, used to cancel it.
+        """
+        job_id = next(self.job_ids)
+        if name == '':
+            name = func.__name__
+        job = TaskJob(job_id, name, func, args, kwargs, self.signals)
+        job.on_result = on_result
+        job.on_error = on_error
+        job.on_progress = on_progress
+        self.jobs[job_id] = job
+        self.pool.start(job)
+        self._emit_jobs_changed(name)
+        return job_id
+
+    def cancel(self, job_id):
+        """Cancel a job.
+
+        A queued job is removed from the queue.  A running job is asked to
+        stop; it stops when its function next checks task_cancelled().
+
+        Args:
+            job_id (int): The id of the job to be cancelled.
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        job.cancel_event.set()
+        if job_id not in self.running_job_ids and self.pool.tryTake(job):
+            self.jobs.pop(job_id)
+            sov_log(f'Task {job.name} cancelled.')
+            self._emit_jobs_changed(job.name)
+
+    def cancel_all(self):
+        """Cancel all queued and running jobs."""
+        for job_id in list(self.jobs.keys()):
+            self.cancel(job_id)
+
+    def shutdown(self, msecs):
+        """Cancel all jobs, and wait for the running jobs to stop.
+
+        Running jobs stop when they next check task_cancelled(), so a job
+        busy in a long step can still be running when the wait ends.
+
+        Args:
+            msecs (int): The maximum time to wait.
+
+        Returns:
+            list: The names of the jobs still running.
+        """
+        self.cancel_all()
+        if self.wait_for_done(msecs):
+            return []
+        return [
+            job.name
+            for job in self.jobs.values()
+            if not job.done_event.is_set()
+        ]
+
+    def get_job_names(self):
+        """Get the names of the queued and running jobs.
+
+        Returns:
+            dict: The name of each job, by job id, in submission order.
+        """
+        return {job_id: job.name for job_id, job in self.jobs.items()}
+
+    def is_busy(self):
+        """Check if any job is queued or running.
+
+        Returns:
+            bool: True if a job is queued or running.
+        """
+        return len(self.jobs) > 0
+
+    def is_active(self, job_id):
+        """Check if a job is queued or running.
+
+        Args:
+            job_id (int): The id of the job.
+
+        Returns:
+            bool: True if the job has not finished, failed, or been
+                cancelled.
+        """
+        return job_id in self.jobs
+
+    def wait_for_done(self, msecs=-1):
+        """Block until all jobs have finished.
+
+        Args:
+            msecs (int?): The maximum time to wait, -1 waits forever.
+
+        Returns:
+            bool: True if all jobs finished in time.
+        """
+        return self.pool.waitForDone(msecs)
+
+    def _emit_jobs_changed(self, name):
+        num_running = len(self.running_job_ids)
+        num_queued = len(self.jobs) - num_running
+        self.jobs_changed.emit(num_queued, num_running, name)
+
+    def _job_started(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        self.running_job_ids.add(job_id)
+        sov_log(f'Task {job.name} started.')
+        self._emit_jobs_changed(job.name)
+
+    def _job_progress(self, job_id, fraction, message):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if job.on_progress is not None:
+            job.on_progress(fraction, message)
+        self.job_progress.emit(job_id, fraction, message)
+
+    def _pop_job(self, job_id):
+        job = self.jobs.pop(job_id, None)
+        self.running_job_ids.discard(job_id)
+        return job
+
+    def _job_finished(self, job_id, result):
+        job = self._pop_job(job_id)
+        if job is None:
+            return
+        sov_log(f'Task {job.name} finished.')
+        self._emit_jobs_changed(job.name)
+        if job.cancel_event.is_set():
+            return
+        if job.on_result is not None:
+            job.on_result(result)
+
+    def _job_failed(self, job_id, exception, trace):
+        job = self._pop_job(job_id)
+        if job is None:
+            return
+        self._emit_jobs_changed(job.name)
+        if isinstance(exception, TaskCancelledError):
+            sov_log(f'Task {job.name} cancelled.')
+            return
+        sov_log(f'Task {job.name} failed: {str(exception)}\n{trace}', 'error')
+        if job.on_error is not None:
+            job.on_error(exception)
@@ -0,0 +1,275 @@
+"""A disk cache of the thumbnails of the image table.
+
+Thumbnails are stored as PNG files named after a hash of their content, in
+the application's cache directory, so identical thumbnails are only stored
+once and updating a record whose thumbnail did not change does not write
+it again.  The catalog records of the files hold the content key of their
+thumbnail, along with the modification time and size of the file when the
+thumbnail was made: a thumbnail is therefore looked up by the file's
+(path, mtime, size).  The least recently used files are removed when the
+cache exceeds its maximum size.
+
+Thumbnails that are missing, e.g., once evicted, are made again by the
+worker processes of the ImageProcessExecutor, from the middle slice of the
+file (see sovImageScanner), and thumbnail_ready is emitted when they are
+stored.  The pixmaps displayed by the table are kept in the QPixmapCache.
+"""
+
+import concurrent.futures
+import hashlib
+import os
+import threading
+import uuid
+
+from PySide6.QtCore import (
+    QBuffer,
+    QByteArray,
+    QIODevice,
+    QObject,
+    QStandardPaths,
+    Qt,
+    Signal,
+)
+from PySide6.QtGui import QImage, QPixmap, QPixmapCache
+
+from .sovImageScanner import THUMBNAIL_SIZE, read_image_information
+from .sovUtils import sov_log, time_and_log
+
+
+def get_thumbnail_qimage_from_array(thumb_array, spacing):
+    """Get a thumbnail QImage from a uint8 slice (see get_thumbnail_array).
+
+    Args:
+        thumb_array (np.ndarray): The slice.
+        spacing (list): The spacing of the slice's columns and rows.
+
+    Returns:
+        QImage: The thumbnail, at most 100x100 pixels.
+    """
+    thumb_image = QImage(
+        thumb_array.data,
+        thumb_array.shape[1],
+        thumb_array.shape[0],
+        thumb_array.strides[0],
+        QImage.Format_Grayscale8,
+    )
+    thumb_image.setDotsPerMeterX(10 / spacing[0])
+    thumb_image.setDotsPerMeterY(10 / spacing[1])
+    return thumb_image.scaled(
+        THUMBNAIL_SIZE,
+        THUMBNAIL_SIZE,
+        Qt.KeepAspectRatio,
+        Qt.SmoothTransformation,
+    )
+
+
+class ThumbnailCache(QObject):
+    # The filename of the file and the key of its new thumbnail
+    thumbnail_ready = Signal(str, str)
+
+    def __init__(self, cache_dir=None, max_size=512 * 2**20, parent=None):
+        """Initialize the cache.
+
+        Args:
+            cache_dir (str?): The directory of the thumbnail files.  Defaults
+                to 'thumbnails' in the application's cache directory.
+            max_size (int?): The maximum total size of the thumbnail files,
+                in bytes.  Defaults to 512 MB.
+            parent: The parent object (default is None).
+        """
+        super().__init__(parent)
+
+        if cache_dir is None:
+            cache_dir = os.path.join(
+                QStandardPaths.writableLocation(QStandardPaths.CacheLocation),
+                'thumbnails',
+            )
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+        # The total size of the files, updated as files are added, so the
+        # directory is only scanned when files must be evicted
+        self.size = sum(size for _, size, _ in self.get_entries())
+
+        self.executor = None
+        self.requested_filenames = set()
+
+    def get_filename(self, key):
+        """Get the file of a thumbnail.
+
+        Thumbnails written by earlier versions are PNG files whose absolute
+        name is their key.
+        """
+        if os.path.isabs(key):
+            return key
+        return os.path.join(self.cache_dir, key + '.png')
+
+    def get_entries(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.png'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    @time_and_log
+    def put(self, thumbnail):
+        """Store a thumbnail, then evict files if the cache is too large.
+
+        Can be called from background tasks when thumbnail is a QImage.
+
+        Args:
+            thumbnail (QImage or QPixmap): The thumbnail.
+
+        Returns:
+            str: The key of the thumbnail, or '' if it could not be stored.
+        """
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        if not thumbnail.save(buffer, 'PNG'):
+            return ''
+        buffer.close()
+        png = data.data()
+
+        key = hashlib.blake2b(png, digest_size=20).hexdigest()
+        filename = self.get_filename(key)
+        with self.lock:
+            try:
+                if os.path.exists(filename):
+                    # Mark the file as recently used
+                    os.utime(filename)
+                    return key
+                tmp_filename = os.path.join(
+                    self.cache_dir, f'.{uuid.uuid4().hex}.tmp'
+                )
+                with open(tmp_filename, 'wb') as f:
+                    f.write(png)
+                os.replace(tmp_filename, filename)
+            except OSError as e:
+                sov_log(f'Could not cache the thumbnail: {e}', 'warning')
+                return ''
+            self.size += len(png)
+            if self.size > self.max_size:
+                self.evict()
+        return key
+
+    def evict(self):
+        """Remove the least recently used files until the cache fits."""
+        entries = self.get_entries()
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if self.size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                self.size -= size
+            except OSError:
+                pass
+
+    def get_pixmap(self, key):
+        """Get the pixmap of a thumbnail, from the QPixmapCache if possible.
+
+        Must be called from the GUI thread.
+
+        Returns:
+            QPixmap: The thumbnail, or None if it is not in the cache.
+        """
+        if key == '':
+            return None
+        pixmap = QPixmapCache.find(key)
+        if pixmap is not None and not pixmap.isNull():
+            return pixmap
+        filename = self.get_filename(key)
+        pixmap = QPixmap(filename)
+        if pixmap.isNull():
+            return None
+        if not os.path.isabs(key):
+            try:
+                os.utime(filename)
+            except OSError:
+                pass
+        QPixmapCache.insert(key, pixmap)
+        return pixmap
+
+    def set_executor(self, executor):
+        """Set the ImageProcessExecutor whose workers make thumbnails."""
+        self.executor = executor
+
+    def request(self, filename):
+        """Make the thumbnail of an image file, or DICOM directory, in a
+        worker process.
+
+        thumbnail_ready is emitted once the thumbnail is stored.  Files
+        whose thumbnail is being made are not requested again; files whose
+        thumbnail could not be made can be requested again.
+
+        Args:
+            filename (str): The file, or the directory of a DICOM series.
+        """
+        if self.executor is None:
+            return
+        with self.lock:
+            if filename in self.requested_filenames:
+                return
+            self.requested_filenames.add(filename)
+        try:
+            future = self.executor.get_pool().submit(
+                read_image_information, filename, os.path.isdir(filename)
+            )
+        except RuntimeError:
+            # The executor is shutting down
+            with self.lock:
+                self.requested_filenames.discard(filename)
+            return
+        future.add_done_callback(
+            lambda future: self.store_requested_thumbnail(filename, future)
+        )
+
+    def store_requested_thumbnail(self, filename, future):
+        # Called by the thread of the pool that completed the future
+        try:
+            try:
+                info = future.result()
+            except (concurrent.futures.CancelledError, Exception):
+                return
+            if info is None or info['thumbnail'] is None:
+                return
+            key = self.put(
+                get_thumbnail_qimage_from_array(
+                    info['thumbnail'], info['thumbnail_spacing']
+                )
+            )
+            if key != '':
+                self.thumbnail_ready.emit(filename, key)
+        finally:
+            with self.lock:
+                self.requested_filenames.discard(filename)
+
+    @time_and_log
+    def clear(self):
+        """Remove all cached thumbnails."""
+        with self.lock:
+            for _, _, path in self.get_entries():
+                os.remove(path)
+            self.size = 0
+        QPixmapCache.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    """Get the application's thumbnail cache, creating it if needed.
+
+    Returns:
+        ThumbnailCache: The cache shared by the image tables.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ThumbnailCache()
+        return _cache
@@ -1,127 +1,114 @@
-import importlib.util as imp
-import subprocess
-import sys
-
-import itk
-import numpy as np
-
-from .sovImageProcessLogic import ImageProcessLogic
-from .sovUtils import time_and_log
-
-
-class TotalSegmentatorLogic:
-    def __init__(self):
-        self.ai_first_run = True
-        self.image = None
-        self.pre_image = None
-        self.mask = None
-
-    @time_and_log
-    def initialize(self, image):
-        """Initialize the AI model with the given image.
-
-        This method initializes the AI model with the given image. It first checks for the presence of required dependencies and GPU support, and then sets the input image for further processing.
-
-        Args:
-            image: The input image for initializing the AI model.
+from .sovCapabilities import get_capabilities
+from .sovComputeSettings import get_compute_config
+from .sovSegmentationEngine import (
+    SegmentationEngine,
+    register_segmentation_engine,
+)
+from .sovTotalSegmentatorSession import (
+    TOTAL_SEGMENTATOR_TASKS,
+    get_model_version,
+    get_total_segmentator_session,
+)
+
+
+@register_segmentation_engine
+class TotalSegmentatorLogic(SegmentationEngine):
+    """Segment the organs of a CT using the TotalSegmentator models.
+
+    Options:
+        fast (bool): Use TotalSegmentator's fast, 3 mm, models.
+        roi_subset (list): The names of the structures to be segmented, or
+            None for all the structures.
+        number_of_workers (int): The number of threads used for resampling,
+            and of TotalSegmentator's resampling and saving workers.
+        interpolator (str): The interpolator used for resampling.
+    """
+
+    name = 'TotalSegmentator'
+    default_options = {
+        **SegmentationEngine.default_options,
+        'fast': False,
+        'roi_subset': None,
+    }
+    cacheable = True
+
+    def check_dependencies(self):
+        """Check that TotalSegmentator, PyTorch and, if needed, CUDA are installed.
+
+        The dependencies are probed once, in the background, at startup (see
+        sovCapabilities), so this check does not import PyTorch, and never
+        waits for the probe: if it has not finished, the check fails with a
+        message asking to try again.
 
         Returns:
             tuple: A tuple containing the status of initialization (bool), a message (str), and a flag to ask for user confirmation (bool).
         """
 
-        if self.ai_first_run and imp.find_spec('totalsegmentator') is None:
-            self.ai_first_run = False
+        capabilities = get_capabilities(wait=False)
+
+        if capabilities is None:
             status = False
-            msg = 'This method works best with NVidia GPUs.\nFirst install CUDA (https://developer.nvidia.com/cuda-downloads)\nand then install PyTorch (https://pytorch.org/get-started/locally/)'
+            msg = 'Still checking the PyTorch and TotalSegmentator installation.\nPlease try again in a few seconds.'
             ask_to_continue = False
             return status, msg, ask_to_continue
 
-        if imp.find_spec('torch') is None:
+        if not capabilities['torch']:
             status = False
             msg = 'PyTorch not found:\nFirst install CUDA (https://developer.nvidia.com/cuda-downloads)\nand then PyTorch (https://pytorch.org/get-started/locally/)'
             ask_to_continue = False
             return status, msg, ask_to_continue
 
-        import torch
+        if not capabilities['totalsegmentator']:
+            status = False
+            msg = 'TotalSegmentator not found:\nInstall it using\n    pip install TotalSegmentator\nand then restart minder3D.'
+            ask_to_continue = False
+            return status, msg, ask_to_continue
 
-        if not torch.cuda.is_available():
+        if (
+            get_compute_config()['ai_device'] != 'cpu'
+            and capabilities['cuda'] is False
+        ):
             status = False
             msg = 'WARNING: PyTorch installed without CUDA support.\nThe AI methods will run on the CPU and be very slow.\nContinue?'
             ask_to_continue = True
             return status, msg, ask_to_continue
 
-        self.image = image
-
         status = True
         msg = ''
         ask_to_continue = False
         return status, msg, ask_to_continue
 
-    def preprocess(self):
-        """Preprocesses the input image for further analysis.
+    def get_task(self):
+        """Get the TOTAL_SEGMENTATOR_TASKS key of the selected models."""
+        return 'total_fast' if self.options['fast'] else 'total'
 
-        If the input image is None, returns None. If the 'totalsegmentator' module is not found, it installs it using pip.
-        Then, it checks the spacing of the image and if it does not meet the specified conditions, it preprocesses the image
-        using ImageProcessLogic.make_iso method with a spacing of 1.5. Otherwise, it uses the original image for preprocessing.
+    def get_spacing(self):
+        return TOTAL_SEGMENTATOR_TASKS[self.get_task()]['spacing']
 
-        Returns:
-            SimpleITK.Image: The preprocessed image.
+    def get_model_version(self):
+        return get_model_version(self.get_task())
 
-        Raises:
-            subprocess.CalledProcessError: If the installation of 'TotalSegmentator' fails.
-        """
+    def get_cache_task(self):
+        cache_task = self.get_task()
+        if self.options['roi_subset']:
+            cache_task += ':' + ','.join(sorted(self.options['roi_subset']))
+        return cache_task
 
-        if self.image is None:
-            return None
+    def segment(self, pre_image):
+        """Segment an image in the application's TotalSegmentator session.
 
-        if imp.find_spec('totalsegmentator') is None:
-            subprocess.check_call(
-                [sys.executable, '-m', 'pip', 'install', 'TotalSegmentator']
-            )
+        The session keeps the models loaded between runs.
 
-        spacing = self.image.GetSpacing()
-        if not (
-            spacing[0] == 1.5
-            and spacing[0] == spacing[1]
-            and spacing[1] == spacing[2]
-        ):
-            preproc = ImageProcessLogic()
-            self.pre_image = preproc.make_iso(self.image, 1.5)
-        else:
-            self.pre_image = self.image
-        return self.pre_image
-
-    def run(self):
-        """Perform image preprocessing and segmentation using the TotalSegmentator library.
-
-        If the pre_image is not provided, it will be preprocessed before segmentation.
-        The preprocessing step includes converting the input image to a NIfTI format and applying a transformation matrix.
+        Args:
+            pre_image: The image, at the spacing of the selected models.
 
         Returns:
-            itk.Image: The segmented image after preprocessing and segmentation.
+            itk.Image: The label image, with the geometry of pre_image.
         """
-
-        if self.pre_image is None:
-            self.preprocess()
-            if self.pre_image is None:
-                return None
-
-        import nibabel as nib
-        from totalsegmentator.python_api import totalsegmentator
-
-        pre_array = itk.GetArrayFromImage(self.pre_image)
-        mat = np.eye(4)
-        mat = mat * 1.5
-        mat[3, 3] = 1
-        nifti_nib = nib.Nifti1Image(
-            np.transpose(pre_array, (2, 1, 0)).copy(), mat
+        session = get_total_segmentator_session()
+        return session.segment(
+            pre_image,
+            task=self.get_task(),
+            roi_subset=self.options['roi_subset'] or None,
+            number_of_workers=self.options['number_of_workers'],
         )
-        seg_nib = totalsegmentator(input=nifti_nib, output=None, task='total')
-
-        seg_array = seg_nib.get_fdata().astype(np.uint8)
-        seg_image = itk.GetImageFromArray(
-            np.transpose(seg_array, (2, 1, 0)).copy()
-        )
-        seg_image.CopyInformation(self.pre_image)
-
-        return seg_image
@@ -0,0 +1,469 @@
+"""A long-lived worker process that keeps the TotalSegmentator models loaded.
+
+totalsegmentator.python_api.totalsegmentator() rebuilds the nnU-Net
+predictors, and reloads their weights, on every call.  The
+TotalSegmentatorSession instead starts one worker process that imports
+PyTorch, selects the device and thread count, and builds the predictors of a
+task the first time that task is requested.  Later segmentations are sent to
+the worker through a queue, as shared memory images (see
+sovImageProcessExecutor), and reuse the loaded predictors.
+
+If the installed TotalSegmentator/nnU-Net versions do not expose the
+predictor API used here, the worker falls back to the python_api, which
+still benefits from the already imported modules.  Images are handed to the
+python_api through sovNiftiBridge, as NIfTI views of the ITK buffers.  The
+predictors are given the same closest canonical (RAS) array that the
+python_api gives its models (see sovNiftiBridge.get_canonical_array), and
+their labels are reoriented back to the image.
+"""
+
+import importlib.metadata
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+
+import itk
+import numpy as np
+
+from .sovComputeSettings import get_compute_config
+from .sovImageProcessExecutor import (
+    image_from_shared,
+    release_shared,
+    share_image,
+)
+from .sovNiftiBridge import (
+    array_from_canonical,
+    get_canonical_array,
+    image_to_nifti,
+    nifti_to_image,
+)
+from .sovTaskRunner import TaskCancelledError, task_cancelled, task_progress
+from .sovUtils import sov_log, time_and_log
+
+# The nnU-Net models making up each TotalSegmentator task, the isotropic
+# spacing (in mm) the input of the task must be resampled to, and the
+# TotalSegmentator task (class map) and fast mode the models correspond to
+TOTAL_SEGMENTATOR_TASKS = {
+    'total': {
+        'task_ids': [291, 292, 293, 294, 295],
+        'trainer': 'nnUNetTrainerNoMirroring',
+        'plans': 'nnUNetPlans',
+        'model': '3d_fullres',
+        'folds': [0],
+        'spacing': 1.5,
+        'class_map': 'total',
+        'fast': False,
+    },
+    'total_fast': {
+        'task_ids': [297],
+        'trainer': 'nnUNetTrainer_4000epochs_NoMirroring',
+        'plans': 'nnUNetPlans',
+        'model': '3d_fullres',
+        'folds': [0],
+        'spacing': 3.0,
+        'class_map': 'total',
+        'fast': True,
+    },
+}
+
+
+def get_model_version(task='total'):
+    """Get a string identifying the models that segment a task.
+
+    Used to invalidate cached segmentations when TotalSegmentator, or the
+    models of the task, change.
+
+    Args:
+        task (str?): The TotalSegmentator task.  Defaults to 'total'.
+
+    Returns:
+        str: The TotalSegmentator version and the description of the task.
+    """
+    try:
+        version = importlib.metadata.version('TotalSegmentator')
+    except importlib.metadata.PackageNotFoundError:
+        version = 'unknown'
+    task_info = TOTAL_SEGMENTATOR_TASKS.get(task, {})
+    return f'TotalSegmentator {version} {task} {sorted(task_info.items())}'
+
+
+def _get_device(device_name):
+    import torch
+
+    if device_name in ('', 'auto'):
+        device_name = 'cuda' if torch.cuda.is_available() else 'cpu'
+    return torch.device(device_name)
+
+
+def _load_task_predictors(task, device):
+    """Build the nnU-Net predictors of a task, downloading weights if needed.
+
+    Returns:
+        list: The (task id, predictor) of each model of the task.
+    """
+    from nnunetv2.inference.predict_from_raw_data import nnUNetPredictor
+    from nnunetv2.utilities.file_path_utilities import get_output_folder
+    from totalsegmentator.config import setup_nnunet
+    from totalsegmentator.libs import download_pretrained_weights
+
+    setup_nnunet()
+    task_info = TOTAL_SEGMENTATOR_TASKS[task]
+    predictors = []
+    for task_id in task_info['task_ids']:
+        download_pretrained_weights(task_id)
+        predictor = nnUNetPredictor(
+            tile_step_size=0.5,
+            use_gaussian=True,
+            use_mirroring=False,
+            perform_everything_on_device=device.type == 'cuda',
+            device=device,
+            verbose=False,
+            verbose_preprocessing=False,
+            allow_tqdm=False,
+        )
+        predictor.initialize_from_trained_model_folder(
+            get_output_folder(
+                task_id,
+                task_info['trainer'],
+                task_info['plans'],
+                task_info['model'],
+            ),
+            use_folds=task_info['folds'],
+            checkpoint_name='checkpoint_final.pth',
+        )
+        predictors.append((task_id, predictor))
+    return predictors
+
+
+def _predict_with_predictors(
+    predictors, task, input_array, spacing, roi_subset=None
+):
+    """Segment a (z, y, x) array with the predictors of a task.
+
+    The array must be in the closest canonical (RAS) orientation, as the
+    models were trained, with spacing its (x, y, z) spacing.
+
+    The labels of the models of a multi-model task are combined into the
+    labels of the task, as done by TotalSegmentator.  When roi_subset is
+    given, only the models segmenting those structures are run, and the
+    labels of the other structures are removed.
+    """
+    from totalsegmentator import map_to_binary
+
+    task_info = TOTAL_SEGMENTATOR_TASKS[task]
+    task_id_to_part = getattr(
+        map_to_binary,
+        'map_taskid_to_partname_ct',
+        getattr(map_to_binary, 'map_taskid_to_partname', {}),
+    )
+    task_class_ids = {
+        name: label
+        for label, name in map_to_binary.class_map[
+            task_info['class_map']
+        ].items()
+    }
+    is_multi_model = len(task_info['task_ids']) > 1
+
+    subset_class_ids = None
+    if roi_subset:
+        unknown_names = [
+            name for name in roi_subset if name not in task_class_ids
+        ]
+        if len(unknown_names) > 0:
+            raise ValueError(f'Unknown structures: {", ".join(unknown_names)}')
+        subset_class_ids = [task_class_ids[name] for name in roi_subset]
+        if is_multi_model:
+            predictors = [
+                (task_id, predictor)
+                for task_id, predictor in predictors
+                if not set(roi_subset).isdisjoint(
+                    map_to_binary.class_map_parts[
+                        task_id_to_part[task_id]
+                    ].values()
+                )
+            ]
+
+    input_array = np.ascontiguousarray(input_array[None], dtype=np.float32)
+    properties = {'spacing': list(spacing[::-1])}
+    label_array = np.zeros(input_array.shape[1:], dtype=np.uint8)
+    for task_id, predictor in predictors:
+        part_array = predictor.predict_single_npy_array(
+            input_array, properties, None, None, False
+        )
+        if not is_multi_model:
+            label_array[...] = part_array
+            continue
+        part_classes = map_to_binary.class_map_parts[task_id_to_part[task_id]]
+        for part_label, class_name in part_classes.items():
+            label_array[part_array == part_label] = task_class_ids[class_name]
+
+    if subset_class_ids is not None:
+        label_array[~np.isin(label_array, subset_class_ids)] = 0
+    return label_array
+
+
+def _predict_with_python_api(
+    task, input_image, device, roi_subset=None, number_of_workers=0
+):
+    """Segment an image with TotalSegmentator's python_api.
+
+    The image is passed to TotalSegmentator as a NIfTI view of its buffer,
+    with its full affine, and the labels are read back in their stored dtype.
+    """
+    from totalsegmentator.python_api import totalsegmentator
+
+    task_info = TOTAL_SEGMENTATOR_TASKS[task]
+    worker_options = {}
+    if number_of_workers > 0:
+        worker_options['nr_thr_resamp'] = number_of_workers
+        worker_options['nr_thr_saving'] = number_of_workers
+    seg_nifti = totalsegmentator(
+        input=image_to_nifti(input_image),
+        output=None,
+        task=task_info['class_map'],
+        fast=task_info['fast'],
+        roi_subset=roi_subset if roi_subset else None,
+        device='gpu' if device.type == 'cuda' else 'cpu',
+        **worker_options,
+    )
+    return nifti_to_image(seg_nifti, reference_image=input_image)
+
+
+def _session_main(job_queue, result_queue, device_name, num_threads):
+    """The main loop of the session's worker process."""
+    import torch
+
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+        torch.set_num_interop_threads(max(1, num_threads // 4))
+    device = _get_device(device_name)
+
+    task_predictors = {}
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        job_id, task, input_metadata, options = job
+        try:
+            info = {'device': str(device), 'load_seconds': 0.0}
+            input_image = image_from_shared(input_metadata)
+
+            if task not in task_predictors:
+                start_time = time.perf_counter()
+                try:
+                    task_predictors[task] = _load_task_predictors(task, device)
+                except (ImportError, AttributeError, TypeError):
+                    task_predictors[task] = None
+                info['load_seconds'] = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            if task_predictors[task] is not None:
+                canonical_array, spacing, orientation = get_canonical_array(
+                    input_image
+                )
+                label_array = _predict_with_predictors(
+                    task_predictors[task],
+                    task,
+                    canonical_array,
+                    spacing,
+                    roi_subset=options['roi_subset'],
+                )
+                label_array = array_from_canonical(label_array, orientation)
+                label_image = itk.GetImageViewFromArray(label_array)
+                label_image.CopyInformation(input_image)
+            else:
+                info['fallback'] = True
+                label_image = _predict_with_python_api(
+                    task, input_image, device, **options
+                )
+            info['predict_seconds'] = time.perf_counter() - start_time
+
+            output_shm, output_metadata = share_image(
+                label_image, track=False, name=options['output_name']
+            )
+            output_shm.close()
+            result_queue.put((job_id, output_metadata, None, info))
+        except Exception:
+            result_queue.put((job_id, None, traceback.format_exc(), None))
+
+
+def release_stale_result(result):
+    """Unlink the output of a segmentation that is not waited for.
+
+    Args:
+        result (tuple): The (job id, output metadata, error, info) put in the
+            result queue by the worker.
+    """
+    if result[1] is not None:
+        release_shared(result[1])
+
+
+class TotalSegmentatorSession:
+    def __init__(self, device=None, num_threads=None):
+        """Initialize the session.
+
+        The worker process is started by the first segmentation.
+
+        Args:
+            device (str?): 'cpu', 'cuda', or '' to use CUDA when available.
+                Defaults to the ai_device of the compute settings.
+            num_threads (int?): The number of PyTorch threads, 0 keeps
+                PyTorch's default.  Defaults to the ai_threads of the compute
+                settings.
+        """
+        compute_config = get_compute_config()
+        self.device = compute_config['ai_device'] if device is None else device
+        self.num_threads = (
+            compute_config['ai_threads'] if num_threads is None else num_threads
+        )
+
+        self.process = None
+        self.job_queue = None
+        self.result_queue = None
+        self.job_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def is_running(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        """Start the worker process, if it is not running."""
+        if self.is_running():
+            return
+        context = multiprocessing.get_context('spawn')
+        self.job_queue = context.Queue()
+        self.result_queue = context.Queue()
+        self.process = context.Process(
+            target=_session_main,
+            args=(
+                self.job_queue,
+                self.result_queue,
+                self.device,
+                self.num_threads,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+        sov_log('TotalSegmentator session started.')
+
+    @time_and_log
+    def segment(
+        self, image, task='total', roi_subset=None, number_of_workers=0
+    ):
+        """Segment an image in the session's worker process.
+
+        The image must already have the isotropic spacing of the task.  If
+        the calling task is cancelled, the worker is stopped (its models are
+        reloaded by the next segmentation).
+
+        Args:
+            image: The image to be segmented.
+            task (str?): A key of TOTAL_SEGMENTATOR_TASKS.  Defaults to
+                'total'.
+            roi_subset (list?): The names of the structures to be segmented.
+                Defaults to all the structures of the task.
+            number_of_workers (int?): The number of resampling and saving
+                workers used by the python_api fallback.  Defaults to 0, for
+                TotalSegmentator's default.
+
+        Returns:
+            The uint8 label image, with the geometry of image.
+        """
+        with self.lock:
+            self.start()
+            input_shm, input_metadata = share_image(image)
+            try:
+                job_id = next(self.job_ids)
+                # Named by the session, so that the output of a cancelled
+                # segmentation can be unlinked once the worker is stopped
+                output_name = f'minder3d_ts_{os.getpid()}_{job_id}'
+                options = {
+                    'roi_subset': list(roi_subset) if roi_subset else None,
+                    'number_of_workers': number_of_workers,
+                    'output_name': output_name,
+                }
+                self.job_queue.put((job_id, task, input_metadata, options))
+                task_progress(0, 'Segmenting...')
+                while True:
+                    if task_cancelled():
+                        self.stop(wait=False)
+                        release_shared({'name': output_name})
+                        raise TaskCancelledError()
+                    if not self.process.is_alive():
+                        raise RuntimeError(
+                            'The TotalSegmentator session stopped unexpectedly.'
+                        )
+                    try:
+                        result = self.result_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    if result[0] == job_id:
+                        break
+                    # The output of a segmentation whose caller stopped
+                    # waiting for it
+                    release_stale_result(result)
+            finally:
+                input_shm.close()
+                input_shm.unlink()
+
+        _, output_metadata, error, info = result
+        if error is not None:
+            raise RuntimeError(error)
+        sov_log(f'TotalSegmentator session: {info}')
+        try:
+            return image_from_shared(output_metadata)
+        finally:
+            release_shared(output_metadata)
+
+    def stop(self, wait=True):
+        """Stop the worker process.
+
+        Args:
+            wait (bool?): Let the worker finish its current segmentation,
+                rather than terminating it.  Defaults to True.
+        """
+        if self.process is None:
+            return
+        if wait and self.process.is_alive():
+            self.job_queue.put(None)
+            self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.process = None
+
+        # Unlink the outputs no longer waited for
+        while True:
+            try:
+                result = self.result_queue.get_nowait()
+            except (queue.Empty, EOFError, OSError):
+                break
+            release_stale_result(result)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_total_segmentator_session():
+    """Get the application's TotalSegmentator session, creating it if needed.
+
+    Returns:
+        TotalSegmentatorSession: The session shared by the AI panels.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = TotalSegmentatorSession()
+        return _session
+
+
+def stop_total_segmentator_session():
+    """Stop the application's TotalSegmentator session, if it was started."""
+    with _session_lock:
+        if _session is not None:
+            _session.stop(wait=False)
@@ -10,9 +10,11 @@ Functions:
     write_group: Writes a group to a file.
 """
 
+import collections
 import functools
 import logging
 import os
+import re
 import time
 
 import itk
@@ -20,6 +22,7 @@ import numpy as np
 from PySide6.QtWidgets import QMainWindow, QTextEdit
 
 from .sovColorMapUtils import short_colormap, short_colormap_scale_factor
+from .sovROIUtils import extract_roi, get_label_statistics
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -192,21 +195,39 @@ def resample_overlay_to_match_image(input_overlay, match_image) -> itk.Image:
 
 
 @time_and_log
-def add_objects_in_mask_image_to_scene(mask_image, scene):
+def add_objects_in_mask_image_to_scene(
+    mask_image, scene, label_statistics=None
+):
     """Adds objects in a mask to a scene.
 
     It extracts the objects from the input mask image and adds them to the provided scene.
+    Each object uses its label as mask value, and holds the region of the
+    mask image around its label, so rendering, surface extraction and
+    picking cost time proportional to the extent of the object, not to the
+    size of the mask image.
 
     Args:
         mask_image (itk.Image): The mask image containing objects to be added to the scene.
         scene: The scene to which the objects will be added.
+        label_statistics (dict?): The labels of the mask image, as returned
+            by sovROIUtils.get_label_statistics().  Computed if not given.
+
+    Returns:
+        list: The objects added, one per non-zero label.
     """
-    mask_array = itk.GetArrayFromImage(mask_image)
-    mask_ids = np.unique(mask_array)
-    for mask_num, mask_id in enumerate(mask_ids):
+    if label_statistics is None:
+        label_statistics = get_label_statistics(
+            itk.GetArrayViewFromImage(mask_image)
+        )
+    mask_objects = []
+    for mask_num, mask_id in enumerate(label_statistics):
         if mask_id == 0:
             continue
-        mask_so = itk.ImageMaskSpatialObject[3].New(Image=mask_image)
+        # Padded by a voxel, so surfaces are closed
+        mask_roi, _ = label_statistics[mask_id]
+        mask_so = itk.ImageMaskSpatialObject[3].New(
+            Image=extract_roi(mask_image, mask_roi, pad=1)
+        )
         color_name = list(short_colormap)[
             int((mask_num + 1) % len(short_colormap))
         ]
@@ -220,43 +241,176 @@ def add_objects_in_mask_image_to_scene(mask_image, scene):
         mask_so.SetUseMaskValue(True)
         mask_so.SetMaskValue(int(mask_id))
         scene.AddChild(mask_so)
+        mask_objects.append(mask_so)
+    return mask_objects
+
+
+# The start of the names of the mask objects of saved scenes, followed by
+# '<id of the object holding the label image>:<mask value>:<name>', the mask
+# value being 'all' for the objects using every label of their image
+MASK_REFERENCE_PREFIX = 'minder3D mask '
+
+
+def get_object_name(so):
+    """Get the name of an object.
+
+    The MetaIO reader stores the names of the objects it reads in their
+    property, whose GetName() cannot be called from Python, rather than in
+    their 'Name' tag, so the name is taken from the printed property when
+    the tag is empty.
+
+    Args:
+        so: The spatial object.
+    Returns:
+        str: The name of the object, or ''.
+    """
+    name = str(so.GetProperty().GetTagStringValue('Name'))
+    if name == '':
+        match = re.search(r'^\s+Name: (.*)$', str(so), re.MULTILINE)
+        if match is not None:
+            name = match.group(1)
+    return name
+
+
+def set_object_name(so, name):
+    """Set the name of an object.
+
+    The name is stored in the 'Name' tag of the object, read by the panels,
+    and in the name of its property, written to MetaIO files.
+
+    Args:
+        so: The spatial object.
+        name (str): The name.
+    """
+    so.GetProperty().SetTagStringValue('Name', name)
+    so.GetProperty().SetName(name)
+
+
+def make_mask_reference(image_object_id, mask_value, name):
+    """Make the name replacing the name of a mask object when saving.
+
+    The scene files do not store the mask values of the objects, so the name
+    stores the reference to the object holding the label image, the mask
+    value, and the name of the object.
+
+    Args:
+        image_object_id (int): The id of the object holding the label image.
+        mask_value (str): The mask value, or 'all'.
+        name (str): The name of the mask object.
+    Returns:
+        str: The reference.
+    """
+    return f'{MASK_REFERENCE_PREFIX}{image_object_id}:{mask_value}:{name}'
+
+
+def get_mask_reference(name):
+    """Get the reference stored by make_mask_reference().
+
+    Args:
+        name (str): The name of a mask object.
+    Returns:
+        tuple: The id of the object holding the label image (int), the mask
+            value (str), and the name of the object (str), or None if the
+            name is not a reference.
+    """
+    match = re.match(
+        re.escape(MASK_REFERENCE_PREFIX) + r'(\d+):(all|-?\d+):(.*)$',
+        name,
+        re.DOTALL,
+    )
+    if match is None:
+        return None
+    return int(match.group(1)), match.group(2), match.group(3)
+
+
+def make_placeholder_image(image):
+    """Make the image replacing the label image of a mask object when saving.
+
+    Args:
+        image (itk.Image): The label image, whose geometry is copied.
+    Returns:
+        itk.Image: A single voxel image.
+    """
+    placeholder_image = itk.GetImageFromArray(np.zeros((1, 1, 1), np.uint8))
+    placeholder_image.SetSpacing(image.GetSpacing())
+    placeholder_image.SetOrigin(image.GetOrigin())
+    placeholder_image.SetDirection(image.GetDirection())
+    return placeholder_image
 
 
 @time_and_log
 def compress_scene_for_saving(scene):
     """Compresses a scene for saving.
 
-    It compresses the input scene by removing unnecessary objects and compressing the scene.
+    Mask objects may share one label image (e.g., the objects of scenes
+    saved by earlier versions, one per label of a segmentation), but the
+    scene writer writes the image of every object.  This function adds one
+    object per label image shared by several mask objects to the scene,
+    holding that image, and replaces the image of those mask objects by a
+    single voxel image.  Mask objects with their own label image (e.g., the
+    cropped images of add_objects_in_mask_image_to_scene()) keep it.  The
+    name of every mask object is replaced by a reference to the object
+    holding its image, storing its mask value and its name.
+
+    The scene is modified in place; uncompress_scene_after_loading() restores
+    it, and so must be called once the scene is written.
 
     Args:
         scene: The scene to be compressed.
     Returns:
-        new_scene: A compressed copy of the scene.
+        scene: The compressed scene.
     """
-    # HERE HERE HERE
     mask_objects = get_children_as_list(scene, 'ImageMask')
-    print('Num mask objects = ', len(mask_objects))
-    mask_image_pointers = list(
-        np.unique([id(mask.GetImage()) for mask in mask_objects])
+    image_counts = collections.Counter(
+        int(mask_object.GetImage().this) for mask_object in mask_objects
     )
-    print('Num mask object pointers = ', len(mask_image_pointers))
-    print('Mask image pointers = ', mask_image_pointers)
+    image_object_ids = {}
     for mask_object in mask_objects:
-        imgPntr = id(mask_object.GetImage())
-        print('Mask object image pointer = ', imgPntr)
-        if imgPntr not in mask_image_pointers:
-            print('Removing mask object with image pointer = ', imgPntr)
-            # mask_object.GetParent().RemoveChild(mask_object)
+        image = mask_object.GetImage()
+        image_key = int(image.this)
+        if image_counts[image_key] == 1:
+            image_object_ids[image_key] = mask_object.GetId()
+        elif image_key not in image_object_ids:
+            image_object = itk.ImageMaskSpatialObject[3].New(Image=image)
+            image_object.SetId(scene.GetNextAvailableId())
+            scene.AddChild(image_object)
+            image_object_ids[image_key] = image_object.GetId()
+
+        if mask_object.GetUseMaskValue():
+            mask_value = str(int(mask_object.GetMaskValue()))
         else:
-            print('Keeping mask object with image pointer = ', imgPntr)
-            # mask_image_pointers.remove(id)
+            mask_value = 'all'
+        set_object_name(
+            mask_object,
+            make_mask_reference(
+                image_object_ids[image_key],
+                mask_value,
+                get_object_name(mask_object),
+            ),
+        )
+        if image_object_ids[image_key] != mask_object.GetId():
+            mask_object.SetImage(make_placeholder_image(image))
+    sov_log(
+        f'Saving {len(mask_objects)} mask objects with'
+        f' {len(image_object_ids)} distinct label images.'
+    )
     return scene
 
 
+@time_and_log
 def uncompress_scene_after_loading(scene):
     """Uncompresses a scene after loading.
 
-    It uncompresses the input scene by adding necessary objects and uncompressing the scene.
+    The mask objects of a scene compressed by compress_scene_for_saving()
+    get their label image and mask value back, and the objects added to
+    hold the shared label images are removed.  The mask objects sharing a label image when
+    the scene was saved share it again.
+
+    Mask objects of scenes saved by earlier versions hold a copy of their
+    label image, and no mask value.  The objects with identical label images
+    are replaced by one object per label of that image, so loading takes a
+    time linear in the number of objects.  Mask objects using a mask value
+    are left unchanged, so uncompressing a scene again does nothing.
 
     Args:
         scene: The scene to be uncompressed.
@@ -264,11 +418,65 @@ def uncompress_scene_after_loading(scene):
         scene: The uncompressed scene.
     """
     mask_objects = get_children_as_list(scene, 'ImageMask')
-    print('Num mask objects = ', len(mask_objects))
+    mask_objects_by_id = {so.GetId(): so for so in mask_objects}
+
+    mask_references = {}
     for mask_object in mask_objects:
+        mask_reference = get_mask_reference(get_object_name(mask_object))
+        if (
+            mask_reference is not None
+            and mask_reference[0] in mask_objects_by_id
+        ):
+            mask_references[mask_object.GetId()] = mask_reference
+
+    images = {}
+    for image_object_id, _, _ in mask_references.values():
+        if image_object_id not in images:
+            image_object = mask_objects_by_id[image_object_id]
+            images[image_object_id] = image_object.GetImage()
+            if image_object_id not in mask_references:
+                image_object.GetParent().RemoveChild(image_object)
+
+    # The label images of the objects of scenes saved by earlier versions,
+    # by geometry
+    legacy_images = {}
+    for mask_object in mask_objects:
+        so_id = mask_object.GetId()
+        if so_id in images and so_id not in mask_references:
+            continue
+        if so_id in mask_references:
+            image_object_id, mask_value, name = mask_references[so_id]
+            set_object_name(mask_object, name)
+            mask_object.SetImage(images[image_object_id])
+            if mask_value == 'all':
+                mask_object.SetUseMaskValue(False)
+            else:
+                mask_object.SetUseMaskValue(True)
+                mask_object.SetMaskValue(int(mask_value))
+            continue
+
+        # The mask objects of scenes saved by earlier versions do not use a
+        # mask value; those using one are already uncompressed.
+        if mask_object.GetUseMaskValue():
+            continue
+        image = mask_object.GetImage()
+        image_array = itk.GetArrayViewFromImage(image)
+        geometry_key = (
+            image_array.shape,
+            image_array.dtype.str,
+            tuple(image.GetSpacing()),
+            tuple(image.GetOrigin()),
+            tuple(itk.array_from_matrix(image.GetDirection()).flatten()),
+        )
         parent = mask_object.GetParent()
         parent.RemoveChild(mask_object)
-        add_objects_in_mask_image_to_scene(mask_object.GetImage(), parent)
+        same_geometry_arrays = legacy_images.setdefault(geometry_key, [])
+        if not any(
+            np.array_equal(image_array, legacy_array)
+            for legacy_array in same_geometry_arrays
+        ):
+            same_geometry_arrays.append(image_array)
+            add_objects_in_mask_image_to_scene(image, parent)
     return scene
 
 
@@ -87,7 +87,9 @@ class View2DPanelWidget(QWidget, Ui_View2DPanelWidget):
             lambda: self.update_mouse_mode(7)
         )
         self.view2DCropModeButton.setIcon(QIcon(':view2D/icons/tool_crop.svg'))
-        self.view2DPointModeButton.setToolTip('Crop')
+        self.view2DCropModeButton.setToolTip(
+            'Crop: drag to set the region of interest, click to clear it'
+        )
 
         self.vtk2DViewWidget = View2DRenderWindowInteractor(gui, state, self)
         self.view2DLayout.addWidget(self.vtk2DViewWidget)
@@ -277,7 +279,11 @@ class View2DPanelWidget(QWidget, Ui_View2DPanelWidget):
 
     @time_and_log
     def create_new_image(self):
-        auto_range = np.quantile(self.state.image_array[-1], [0.05, 0.99])
+        # The intensity window of the overview is estimated from the coarsest
+        # pyramid level, which is much faster than using every voxel.
+        auto_range = np.quantile(
+            self.state.image_pyramid[-1].get_coarsest_level(), [0.05, 0.99]
+        )
         self.state.view2D_intensity_window_min.append(auto_range[0])
         self.state.view2D_intensity_window_max.append(auto_range[1])
 
@@ -330,7 +336,12 @@ class View2DPanelWidget(QWidget, Ui_View2DPanelWidget):
                 - 1
             )
 
-            auto_range = np.quantile(self.state.image_array[-1], [0.05, 0.99])
+            auto_range = np.quantile(
+                self.state.image_pyramid[
+                    self.state.current_image_num
+                ].get_coarsest_level(),
+                [0.05, 0.99],
+            )
             self.state.view2D_intensity_window_min[
                 self.state.current_image_num
             ] = auto_range[0]
@@ -1,5 +1,5 @@
 import numpy as np
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 from vtk import (
     VTK_UNSIGNED_CHAR,
     vtkImageBlend,
@@ -11,6 +11,8 @@ from vtk import (
 from vtk.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
 from vtk.util.numpy_support import numpy_to_vtk
 
+from .sovImagePyramid import get_level_offset, get_view_index
+from .sovROIUtils import get_image_size, get_roi_array_slices
 from .sovUtils import time_and_log
 
 
@@ -24,6 +26,10 @@ class View2DRenderWindowInteractor(QVTKRenderWindowInteractor):
         self.view2D = None
         self.cornerAnnotationTextActor = None
 
+        # Downsampling factor of the image pyramid level being displayed
+        self.view_pyramid_factor = 1
+        self.view_pyramid_update_pending = False
+
         self.mouse_modes = {
             0: 'Point',
             1: 'Select',
@@ -41,6 +47,8 @@ class View2DRenderWindowInteractor(QVTKRenderWindowInteractor):
         self.mouse_start = []
         self.win_start = 0
         self.lvl_start = 0
+        self.roi_start_index = []
+        self.roi_dragged = False
 
     @time_and_log
     def getWorldPosition(self, x, y):
@@ -53,21 +61,15 @@ class View2DRenderWindowInteractor(QVTKRenderWindowInteractor):
 
         picker = vtkWorldPointPicker()
         picker.Pick(x, y, 0, self.view2D.GetRenderer())
-        vtk_world_xy = picker.GetPickPosition()
-        vtk_world = [vtk_world_xy[0], vtk_world_xy[1], 0]
-        z = self.state.view2D_slice[img_num][axis[2]]
-        if self.state.view2D_flip[img_num][axis[2]]:
-            z = int(size[axis[2]] - z - 1)
-        vtk_world[2] = z * spacing[axis[2]]
-        vtk_indx = [int(vtk_world[axis.index(i)]) for i in range(3)]
-
-        indx = [int(vtk_indx[i] / spacing[i] + 0.5) for i in range(3)]
-        # y-axis is flipped
-        if not self.state.view2D_flip[img_num][axis[1]]:
-            indx[1] = int(size[1] - indx[1] - 1)
-        for i in [0, 2]:
-            if self.state.view2D_flip[img_num][axis[i]]:
-                indx[axis[i]] = int(size[axis[i]] - indx[axis[i]] - 1)
+        vtk_world = picker.GetPickPosition()
+        indx = [0, 0, 0]
+        for i in range(2):
+            # vtk y-axis is flipped, so flip the flip
+            flipped = self.state.view2D_flip[img_num][axis[i]] != (i == 1)
+            indx[axis[i]] = get_view_index(
+                vtk_world[i], size[axis[i]], spacing[axis[i]], flipped
+            )
+        indx[axis[2]] = int(self.state.view2D_slice[img_num][axis[2]])
         pos = self.state.image[img_num].TransformIndexToPhysicalPoint(indx)
         return indx, pos
 
@@ -92,6 +94,12 @@ class View2DRenderWindowInteractor(QVTKRenderWindowInteractor):
             self.state.current_pixel_index = indx
             self.state.current_pixel_position = pos
             self.gui.update_pixel()
+        elif self.current_mouse_mode == 7:
+            self.mouse_pressed = True
+            x, y = self.GetEventPosition()
+            indx, pos = self.getWorldPosition(x, y)
+            self.roi_start_index = indx
+            self.roi_dragged = False
         elif self.current_mouse_mode == 2:
             self.mouse_pressed = True
             self.mouse_start = [event.x(), event.y()]
@@ -113,6 +121,16 @@ class View2DRenderWindowInteractor(QVTKRenderWindowInteractor):
     @time_and_log
     def mouseReleaseEvent(self, event):
         if event.button() == Qt.LeftButton:
+            if (
+                self.mouse_pressed
+                and self.current_mouse_mode == 7
+                and not self.roi_dragged
+                and len(self.state.image) > 0
+            ):
+                # A click without a drag clears the ROI
+                self.state.roi[self.state.current_image_num] = None
+                self.gui.log('ROI cleared.')
+                self.update_view()
             self.mouse_pressed = False
         super().mouseReleaseEvent(event)
 
@@ -184,6 +202,95 @@ class View2DRenderWindowInteractor(QVTKRenderWindowInteractor):
                 self.state.current_image_num
             ] = new_max
             self.update_view()
+        elif self.current_mouse_mode == 7:
+            x, y = self.GetEventPosition()
+            indx, pos = self.getWorldPosition(x, y)
+            self.update_roi(indx)
+            self.update_view()
+
+    @time_and_log
+    def update_roi(self, end_index):
+        """Set the ROI of the current image to the box being dragged.
+
+        The in-plane extent of the ROI spans from where the drag started to
+        end_index.  Its through-plane extent is kept from the previous ROI,
+        or spans the whole image if there was none, so the box can be
+        refined by dragging in the other view planes.
+
+        Args:
+            end_index (list): The (x, y, z) index under the mouse.
+        """
+        img_num = self.state.current_image_num
+        view_image_axis = self.state.view2D_image_axis_order[img_num][2]
+        size = get_image_size(self.state.image[img_num])
+        roi = self.state.roi[img_num]
+
+        start = list(self.roi_start_index)
+        end = list(end_index)
+        if roi is not None:
+            start[view_image_axis] = roi[0][view_image_axis]
+            end[view_image_axis] = roi[1][view_image_axis]
+        else:
+            start[view_image_axis] = 0
+            end[view_image_axis] = size[view_image_axis] - 1
+        start = [int(min(max(v, 0), s - 1)) for v, s in zip(start, size)]
+        end = [int(min(max(v, 0), s - 1)) for v, s in zip(end, size)]
+        if start == end:
+            return
+
+        self.roi_dragged = True
+        self.state.roi[img_num] = [
+            [min(start[i], end[i]) for i in range(3)],
+            [max(start[i], end[i]) for i in range(3)],
+        ]
+
+    def get_pixels_per_voxel(self):
+        """Get the number of screen pixels spanned by a full-res voxel.
+
+        The 2D view uses a parallel projection, so the camera's parallel
+        scale (half of the visible world height) and the height of the
+        window define the current zoom.
+
+        Returns:
+            float: Screen pixels per voxel along the vertical view axis.
+        """
+        img_num = self.state.current_image_num
+        spacing = self.state.image[img_num].GetSpacing()
+        view_axis_y = self.state.view2D_image_axis_order[img_num][1]
+        camera = self.view2D.GetRenderer().GetActiveCamera()
+        parallel_scale = camera.GetParallelScale()
+        if parallel_scale <= 0:
+            return 1.0
+        winsize = self.GetRenderWindow().GetSize()
+        return winsize[1] * spacing[view_axis_y] / (2.0 * parallel_scale)
+
+    def get_view_pyramid_factor(self):
+        """Get the pyramid level that matches the current zoom.
+
+        Returns:
+            int: The downsampling factor of the level to be displayed.
+        """
+        img_num = self.state.current_image_num
+        return self.state.image_pyramid[img_num].select_factor(
+            self.get_pixels_per_voxel()
+        )
+
+    def camera_modified(self, obj, event):
+        """Switch pyramid levels when zooming changes the screen resolution.
+
+        The redraw is deferred to the Qt event loop, since the camera is
+        modified from within VTK's interaction and render calls.
+        """
+        if (
+            self.view2D is None
+            or self.view_pyramid_update_pending
+            or self.state.current_image_num < 0
+            or self.state.current_image_num >= len(self.state.image)
+        ):
+            return
+        if self.get_view_pyramid_factor() != self.view_pyramid_factor:
+            self.view_pyramid_update_pending = True
+            QTimer.singleShot(0, self.update_view)
 
     @time_and_log
     def reset_camera(self):
@@ -206,46 +313,170 @@ class View2DRenderWindowInteractor(QVTKRenderWindowInteractor):
             self.view2D = vtkImageViewer2()
             self.view2D.SetupInteractor(self)
             self.view2D.SetRenderWindow(self.GetRenderWindow())
-            self.update_view()
+            # The initial overview is rendered from the coarsest level; the
+            # camera observer then picks the level that matches the zoom.
+            img_num = self.state.current_image_num
+            self.update_view(self.state.image_pyramid[img_num].factors[-1])
+            self.view2D.GetRenderer().GetActiveCamera().AddObserver(
+                'ModifiedEvent', self.camera_modified
+            )
             self.view2D.GetRenderer().ResetCamera()
             self.view2D.Render()
             self.view2D.GetRenderWindow().Render()
         else:
             self.update_view()
 
+    def get_overlay_slice(
+        self, overlay_slice_rgba, img_num, view_image_axis, slice_num
+    ):
+        """Draw the overlay preview and the ROI over an overlay slice.
+
+        Args:
+            overlay_slice_rgba (np.ndarray): The full resolution RGBA slice.
+            img_num (int): The number of the image being viewed.
+            view_image_axis (int): The image axis normal to the slice.
+            slice_num (int): The number of the slice.
+
+        Returns:
+            np.ndarray: The RGBA slice to be displayed.
+        """
+        overlay_slice_rgba = self.apply_overlay_preview(
+            overlay_slice_rgba, img_num, view_image_axis, slice_num
+        )
+        return self.apply_overlay_roi(
+            overlay_slice_rgba, img_num, view_image_axis, slice_num
+        )
+
+    def apply_overlay_roi(
+        self, overlay_slice_rgba, img_num, view_image_axis, slice_num
+    ):
+        """Draw the outline of the ROI, if it crosses the slice.
+
+        The outline is as thick as the pyramid level's downsampling factor,
+        so it remains visible when the slice is downsampled for display.
+        """
+        roi = self.state.roi[img_num]
+        if roi is None:
+            return overlay_slice_rgba
+        view_array_axis = 2 - view_image_axis
+        roi_slices = get_roi_array_slices(
+            roi, get_image_size(self.state.image[img_num])
+        )
+        if not (
+            roi_slices[view_array_axis].start
+            <= slice_num
+            < roi_slices[view_array_axis].stop
+        ):
+            return overlay_slice_rgba
+        rows, cols = [roi_slices[i] for i in range(3) if i != view_array_axis]
+
+        overlay_slice_rgba = overlay_slice_rgba.copy()
+        color = np.array([255, 255, 0, 255], dtype=overlay_slice_rgba.dtype)
+        width = max(1, self.view_pyramid_factor)
+        overlay_slice_rgba[rows.start : rows.start + width, cols] = color
+        overlay_slice_rgba[
+            max(rows.start, rows.stop - width) : rows.stop, cols
+        ] = color
+        overlay_slice_rgba[rows, cols.start : cols.start + width] = color
+        overlay_slice_rgba[
+            rows, max(cols.start, cols.stop - width) : cols.stop
+        ] = color
+        return overlay_slice_rgba
+
+    def apply_overlay_preview(
+        self, overlay_slice_rgba, img_num, view_image_axis, slice_num
+    ):
+        """Draw the overlay preview, if any, over an overlay slice.
+
+        Args:
+            overlay_slice_rgba (np.ndarray): The full resolution RGBA slice.
+            img_num (int): The number of the image being viewed.
+            view_image_axis (int): The image axis normal to the slice.
+            slice_num (int): The number of the slice.
+
+        Returns:
+            np.ndarray: The RGBA slice with the preview's non-transparent
+                pixels drawn over it.
+        """
+        preview = self.state.view2D_overlay_preview
+        if (
+            preview is None
+            or preview[0] != img_num
+            or preview[1] != view_image_axis
+            or preview[2] != slice_num
+            or preview[3].shape != overlay_slice_rgba.shape
+        ):
+            return overlay_slice_rgba
+        preview_slice_rgba = preview[3]
+        return np.where(
+            preview_slice_rgba[:, :, 3:] > 0,
+            preview_slice_rgba,
+            overlay_slice_rgba,
+        )
+
     @time_and_log
-    def update_view(self):
+    def update_view(self, pyramid_factor=None):
+        self.view_pyramid_update_pending = False
         if (
             self.view2D is not None
             and self.state.image is not None
             and self.state.current_image_num >= 0
             and self.state.current_image_num < len(self.state.image)
         ):
-            current_image_array = self.state.image_array[
-                self.state.current_image_num
-            ]
-            current_overlay_array = self.state.overlay_array[
-                self.state.current_image_num
-            ]
+            img_num = self.state.current_image_num
+
+            # Display the pyramid level that matches the screen resolution,
+            # full resolution is only used when zoomed in.
+            if pyramid_factor is None:
+                pyramid_factor = self.get_view_pyramid_factor()
+            self.view_pyramid_factor = pyramid_factor
+            current_overlay_array = self.state.overlay_array[img_num]
 
             view_slice = []
             overlay_slice_rgba = []
 
-            img_num = self.state.current_image_num
             view_image_axis = self.state.view2D_image_axis_order[img_num][2]
+            view_array_axis = 2 - view_image_axis
+
+            # The level is only downsampled in-plane, along the view axis
+            pyramid = self.state.image_pyramid[img_num]
+            current_image_array = pyramid.get_level(
+                pyramid_factor, view_array_axis
+            )
+            level_factors = pyramid.get_level_factors(
+                pyramid_factor, view_array_axis
+            )
+            in_plane_array_axes = [i for i in range(3) if i != view_array_axis]
+            in_plane_factors = [level_factors[i] for i in in_plane_array_axes]
 
             slice_num = self.state.view2D_slice[img_num][view_image_axis]
+            level_slice_num = min(
+                slice_num // level_factors[view_array_axis],
+                current_image_array.shape[view_array_axis] - 1,
+            )
 
-            if current_image_array.shape[2 - view_image_axis] == 1:
+            rows_reversed = current_image_array.shape[view_array_axis] == 1
+            if rows_reversed:
                 view_slice = current_image_array[0, ::-1, :]
-                overlay_slice_rgba = current_overlay_array[0, ::-1, :]
+                overlay_slice_rgba = self.get_overlay_slice(
+                    current_overlay_array[0], img_num, view_image_axis, 0
+                )[:: -in_plane_factors[0], :: in_plane_factors[1]][
+                    : view_slice.shape[0], : view_slice.shape[1]
+                ]
             else:
                 view_slice = np.take(
-                    current_image_array, slice_num, axis=2 - view_image_axis
-                )
-                overlay_slice_rgba = np.take(
-                    current_overlay_array, slice_num, axis=2 - view_image_axis
+                    current_image_array, level_slice_num, axis=view_array_axis
                 )
+                overlay_slice_rgba = self.get_overlay_slice(
+                    np.take(
+                        current_overlay_array, slice_num, axis=view_array_axis
+                    ),
+                    img_num,
+                    view_image_axis,
+                    slice_num,
+                )[:: in_plane_factors[0], :: in_plane_factors[1]][
+                    : view_slice.shape[0], : view_slice.shape[1]
+                ]
                 if (
                     self.state.view2D_image_axis_order[img_num][0]
                     > self.state.view2D_image_axis_order[img_num][1]
@@ -287,8 +518,24 @@ class View2DRenderWindowInteractor(QVTKRenderWindowInteractor):
             view_slice_rgba[:, :, 3] = np.ones(view_slice.shape) * 255
 
             # Import image directly to gray RGBA
-            spacing = np.array(self.state.image[img_num].GetSpacing())
+            full_spacing = np.array(self.state.image[img_num].GetSpacing())
+            spacing = full_spacing * np.array(level_factors[::-1])
+            # Center the voxels of the level on the full resolution voxels
+            # they average, as displayed by the flips above
+            origin = [0.0, 0.0, 0.0]
+            for i in range(2):
+                image_axis = self.state.view2D_image_axis_order[img_num][i]
+                flipped = self.state.view2D_flip[img_num][image_axis]
+                if i == 1:
+                    flipped = flipped == rows_reversed
+                origin[i] = full_spacing[image_axis] * get_level_offset(
+                    pyramid.image_array.shape[2 - image_axis],
+                    current_image_array.shape[2 - image_axis],
+                    level_factors[2 - image_axis],
+                    flipped,
+                )
             view_slice_vtk = vtkImageData()
+            view_slice_vtk.SetOrigin(origin)
             view_slice_vtk.SetSpacing(
                 spacing[self.state.view2D_image_axis_order[img_num][0]],
                 spacing[self.state.view2D_image_axis_order[img_num][1]],
@@ -319,6 +566,7 @@ class View2DRenderWindowInteractor(QVTKRenderWindowInteractor):
 
             # Import overlay to RGBA
             overlay_slice_vtk = vtkImageData()
+            overlay_slice_vtk.SetOrigin(origin)
             overlay_slice_vtk.SetSpacing(
                 spacing[self.state.view2D_image_axis_order[img_num][0]],
                 spacing[self.state.view2D_image_axis_order[img_num][1]],
@@ -1,6 +1,13 @@
 import itk
 import numpy as np
 
+from .sovROIUtils import (
+    clamp_roi,
+    get_image_size,
+    get_overlapping_roi,
+    get_roi_array_slices,
+)
+from .sovSceneFile import load_scene_object
 from .sovUtils import get_children_as_list, time_and_log
 
 
@@ -17,6 +24,7 @@ def render_tube_in_overlay_array(tube, image, overlay_array, color=None):
         color: A tuple representing the color of the tube. If not provided, the color from the tube properties is used.
     """
 
+    load_scene_object(tube)
     spacing = image.GetSpacing()
     point_list = tube.GetPoints()
     if color is None:
@@ -90,25 +98,45 @@ def render_tube_in_overlay_array(tube, image, overlay_array, color=None):
 
 @time_and_log
 def render_mask_in_overlay_array(mask, image, overlay_array, color=None):
-    resample = itk.ResampleImageFilter.New(mask.GetImage())
-    resample.SetReferenceImage(image)
-    resample.SetUseReferenceImage(True)
-    interpolator = itk.NearestNeighborInterpolateImageFunction.New(
-        mask.GetImage()
-    )
+    """Render a mask in an overlay array.
+
+    Only the region of the overlay array overlapped by the mask's image is
+    resampled and updated.
+
+    Args:
+        mask: The mask object.
+        image: The image of the overlay.
+        overlay_array: The (z, y, x, RGBA) overlay array.
+        color: The color of the mask. If not provided, the color from the mask properties is used.
+    """
+    load_scene_object(mask)
+    mask_image = mask.GetImage()
+    roi = get_overlapping_roi(mask_image, image)
+    if roi is None:
+        return
+    start, size = clamp_roi(roi, get_image_size(image))
+
+    resample = itk.ResampleImageFilter.New(mask_image)
+    resample.SetOutputSpacing(image.GetSpacing())
+    resample.SetOutputDirection(image.GetDirection())
+    resample.SetOutputOrigin(image.TransformIndexToPhysicalPoint(start))
+    resample.SetSize(size)
+    interpolator = itk.NearestNeighborInterpolateImageFunction.New(mask_image)
     resample.SetInterpolator(interpolator)
     resample.Update()
-    matched_mask = resample.GetOutput()
-    mask_array = itk.GetArrayFromImage(matched_mask)
+    mask_array = itk.GetArrayViewFromImage(resample.GetOutput())
     if color is None:
         color = mask.GetProperty().GetColor() * 255
+    overlay_region = overlay_array[
+        get_roi_array_slices(roi, get_image_size(image))
+    ]
     # overlay_array_sum = np.sum(overlay_array, axis=-1)
     id = mask.GetMaskValue()
     blend_conditional = mask_array == id  # & (overlay_array_sum == 0)
     for i in range(4):
         if color[i] > 0:
-            overlay_array[:, :, :, i] = np.where(
-                blend_conditional, color[i], overlay_array[:, :, :, i]
+            overlay_region[:, :, :, i] = np.where(
+                blend_conditional, color[i], overlay_region[:, :, :, i]
             )
 
 
@@ -9,6 +9,7 @@ from vtkmodules.vtkRenderingCore import (
 
 from .sovUtils import get_tag_value_index_in_list_of_dict, time_and_log
 from .sovView3DUtils import (
+    convert_object_to_surface,
     convert_scene_to_surfaces,
     get_closest_point_in_world_space,
 )
@@ -77,31 +78,46 @@ class View3DRenderWindowInteractor(QVTKRenderWindowInteractor):
             self: The object instance.
         """
 
-        point_data = convert_scene_to_surfaces(self.state.scene)
+        surfaces = convert_scene_to_surfaces(self.state.scene)
         self.scene_renderer.RemoveAllViewProps()
         self.scene_renderer.Render()
         for scene_idx, so in enumerate(self.state.scene_list):
-            actor = vtkActor()
-            color_by = self.state.scene_list_properties[scene_idx]['ColorBy']
-            self.state.scene_list_properties[scene_idx]['Actor'] = actor
-            mapper = vtkPolyDataMapper()
-            mapper.SetInputData(point_data[scene_idx])
-            color = so.GetProperty().GetColor()
-            selected = so.GetId() in self.state.selected_ids
-            if selected and self.state.highlight_selected:
-                color = [0, 1, 0, 1]
-            actor.GetProperty().SetColor(color[0], color[1], color[2])
-            actor.GetProperty().SetOpacity(color[3])
-            if color_by == 'Solid Color':
-                mapper.ScalarVisibilityOff()
-            else:
-                point_data[scene_idx].GetPointData().SetActiveScalars(color_by)
-                mapper.ScalarVisibilityOn()
-            actor.SetMapper(mapper)
-            self.scene_renderer.AddActor(actor)
+            self.add_object_actor(scene_idx, so, surfaces[scene_idx])
             self.scene_renderer.Render()
         self.reset_camera()
 
+    @time_and_log
+    def add_object_actor(self, scene_idx, so, surface):
+        """Add the actor of an object to the renderer.
+
+        Args:
+            scene_idx (int): The index of the object in the scene list.
+            so: The object.
+            surface (vtkPolyData): The surface of the object, or None if the
+                object has no surface (e.g., groups).
+        """
+        if surface is None:
+            self.state.scene_list_properties[scene_idx]['Actor'] = None
+            return
+        actor = vtkActor()
+        color_by = self.state.scene_list_properties[scene_idx]['ColorBy']
+        self.state.scene_list_properties[scene_idx]['Actor'] = actor
+        mapper = vtkPolyDataMapper()
+        mapper.SetInputData(surface)
+        color = so.GetProperty().GetColor()
+        selected = so.GetId() in self.state.selected_ids
+        if selected and self.state.highlight_selected:
+            color = [0, 1, 0, 1]
+        actor.GetProperty().SetColor(color[0], color[1], color[2])
+        actor.GetProperty().SetOpacity(color[3])
+        if color_by == 'Solid Color':
+            mapper.ScalarVisibilityOff()
+        else:
+            surface.GetPointData().SetActiveScalars(color_by)
+            mapper.ScalarVisibilityOn()
+        actor.SetMapper(mapper)
+        self.scene_renderer.AddActor(actor)
+
     @time_and_log
     def redraw_actor(self, actor, so, color=None):
         """Redraws the given actor with the specified state object and color.
@@ -226,5 +242,12 @@ class View3DRenderWindowInteractor(QVTKRenderWindowInteractor):
         so_id = so.GetId()
         scene_idx = self.state.scene_list_ids.index(so_id)
         actor = self.state.scene_list_properties[scene_idx].get('Actor')
+        if actor is None:
+            # Objects of lazily loaded scenes are converted to surfaces when
+            # first drawn
+            self.add_object_actor(scene_idx, so, convert_object_to_surface(so))
+            actor = self.state.scene_list_properties[scene_idx]['Actor']
+            if actor is None:
+                return
         self.redraw_actor(actor, so)
         self.GetRenderWindow().Render()
@@ -3,6 +3,7 @@ from vtkmodules.vtkCommonCore import vtkDoubleArray, vtkPoints
 from vtkmodules.vtkCommonDataModel import vtkCellArray, vtkPolyData, vtkPolyLine
 from vtkmodules.vtkFiltersCore import vtkSurfaceNets3D, vtkTubeFilter
 
+from .sovSceneFile import load_scene_object
 from .sovUtils import get_children_as_list, time_and_log
 
 
@@ -184,27 +185,44 @@ def convert_masks_to_surfaces(mask_list):
     return mask_surfaces
 
 
+@time_and_log
+def convert_object_to_surface(so):
+    """Convert a tube or a mask to a surface.
+
+    The geometry of objects of lazily loaded scenes is loaded first.
+
+    Args:
+        so: The object.
+
+    Returns:
+        vtkPolyData: The surface, or None if the object is not a tube or a
+            mask.
+    """
+    if 'Tube' in so.GetTypeName():
+        load_scene_object(so)
+        return convert_tubes_to_surfaces([so])[0]
+    if 'Mask' in so.GetTypeName():
+        load_scene_object(so)
+        return convert_masks_to_surfaces([so])[0]
+    return None
+
+
 @time_and_log
 def convert_scene_to_surfaces(scene):
     """Convert the given scene into a list of surfaces.
 
-    This function takes a scene as input and converts the tubes and masks within the scene into surfaces. It first retrieves the tubes and masks from the scene and then converts them to surfaces.
+    This function takes a scene as input and converts the tubes and masks within the scene into surfaces.
 
     Args:
         scene (object): The scene object containing tubes and masks.
 
     Returns:
-        list: A list of surfaces extracted from the tubes and masks in the scene.
+        list: The surfaces of the objects of the scene, in the order of
+            get_children_as_list(scene), and None for the objects that are
+            not tubes or masks (e.g., groups).
     """
 
-    surfaces = []
-    tube_list = get_children_as_list(scene, 'Tube')
-    if len(tube_list) > 0:
-        surfaces = surfaces + convert_tubes_to_surfaces(tube_list)
-    mask_list = get_children_as_list(scene, 'Mask')
-    if len(mask_list) > 0:
-        surfaces = surfaces + convert_masks_to_surfaces(mask_list)
-    return surfaces
+    return [convert_object_to_surface(so) for so in get_children_as_list(scene)]
 
 
 @time_and_log
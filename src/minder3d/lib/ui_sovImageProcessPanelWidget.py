@@ -68,6 +68,9 @@ class Ui_ImageProcessPanelWidget(object):
         self.imageProcessCreateNewImageCheckBox.setObjectName(u"imageProcessCreateNewImageCheckBox")
         self.imageProcessCreateNewImageCheckBox.setGeometry(QRect(20, 0, 161, 20))
         self.imageProcessCreateNewImageCheckBox.setChecked(True)
+        self.imageProcessAllImagesCheckBox = QCheckBox(ImageProcessPanelWidget)
+        self.imageProcessAllImagesCheckBox.setObjectName(u"imageProcessAllImagesCheckBox")
+        self.imageProcessAllImagesCheckBox.setGeometry(QRect(200, 0, 161, 20))
 
         self.retranslateUi(ImageProcessPanelWidget)
 
@@ -82,5 +85,6 @@ class Ui_ImageProcessPanelWidget(object):
         self.imageProcessClipWindowLevelButton.setText(QCoreApplication.translate("ImageProcessPanelWidget", u"Clip to Window and Level", None))
         self.imageProcessMedianFilterButton.setText(QCoreApplication.translate("ImageProcessPanelWidget", u"Median Filter", None))
         self.imageProcessCreateNewImageCheckBox.setText(QCoreApplication.translate("ImageProcessPanelWidget", u"Create New Image", None))
+        self.imageProcessAllImagesCheckBox.setText(QCoreApplication.translate("ImageProcessPanelWidget", u"Process All Images", None))
     # retranslateUi
 
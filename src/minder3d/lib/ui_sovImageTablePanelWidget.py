@@ -16,8 +16,8 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
     QImage, QKeySequence, QLinearGradient, QPainter,
     QPalette, QPixmap, QRadialGradient, QTransform)
 from PySide6.QtWidgets import (QAbstractItemView, QApplication, QHBoxLayout, QHeaderView,
-    QPushButton, QSizePolicy, QSpacerItem, QTableWidget,
-    QTableWidgetItem, QVBoxLayout, QWidget)
+    QLineEdit, QPushButton, QSizePolicy, QSpacerItem,
+    QTableView, QVBoxLayout, QWidget)
 
 class Ui_ImageTablePanelWidget(object):
     def setupUi(self, ImageTablePanelWidget):
@@ -36,10 +36,17 @@ class Ui_ImageTablePanelWidget(object):
         self.horizontalLayout.setContentsMargins(3, 3, 3, 3)
         self.verticalLayout = QVBoxLayout()
         self.verticalLayout.setObjectName(u"verticalLayout")
-        self.imageTableWidget = QTableWidget(ImageTablePanelWidget)
+        self.imageTableFilterLineEdit = QLineEdit(ImageTablePanelWidget)
+        self.imageTableFilterLineEdit.setObjectName(u"imageTableFilterLineEdit")
+        self.imageTableFilterLineEdit.setClearButtonEnabled(True)
+
+        self.verticalLayout.addWidget(self.imageTableFilterLineEdit)
+
+        self.imageTableWidget = QTableView(ImageTablePanelWidget)
         self.imageTableWidget.setObjectName(u"imageTableWidget")
         self.imageTableWidget.setAlternatingRowColors(True)
         self.imageTableWidget.setSelectionMode(QAbstractItemView.NoSelection)
+        self.imageTableWidget.setSortingEnabled(True)
         self.imageTableWidget.horizontalHeader().setVisible(True)
         self.imageTableWidget.verticalHeader().setVisible(False)
 
@@ -140,6 +147,7 @@ class Ui_ImageTablePanelWidget(object):
 
     def retranslateUi(self, ImageTablePanelWidget):
         ImageTablePanelWidget.setWindowTitle(QCoreApplication.translate("ImageTablePanelWidget", u"Form", None))
+        self.imageTableFilterLineEdit.setPlaceholderText(QCoreApplication.translate("ImageTablePanelWidget", u"Filter by label, filename, or modality", None))
         self.imageTableImportExportButton.setText(QCoreApplication.translate("ImageTablePanelWidget", u"Import / Save / Export", None))
         self.imageTableLoadButton.setText(QCoreApplication.translate("ImageTablePanelWidget", u"Load", None))
         self.imageTableUnloadButton.setText(QCoreApplication.translate("ImageTablePanelWidget", u"Unload", None))
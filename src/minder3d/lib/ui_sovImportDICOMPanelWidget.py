@@ -16,7 +16,8 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
     QImage, QKeySequence, QLinearGradient, QPainter,
     QPalette, QPixmap, QRadialGradient, QTransform)
 from PySide6.QtWidgets import (QApplication, QCheckBox, QLabel, QLineEdit,
-    QPushButton, QSizePolicy, QTextEdit, QWidget)
+    QProgressBar, QPushButton, QSizePolicy, QTextEdit,
+    QWidget)
 
 class Ui_ImportDICOMPanelWidget(object):
     def setupUi(self, ImportDICOMPanelWidget):
@@ -57,8 +58,18 @@ class Ui_ImportDICOMPanelWidget(object):
         self.importDICOMAutoRegisterCheckBox.setFont(font)
         self.importDICOMRunButton = QPushButton(ImportDICOMPanelWidget)
         self.importDICOMRunButton.setObjectName(u"importDICOMRunButton")
-        self.importDICOMRunButton.setGeometry(QRect(580, 100, 75, 24))
+        self.importDICOMRunButton.setGeometry(QRect(500, 100, 75, 24))
         self.importDICOMRunButton.setFont(font)
+        self.importDICOMCancelButton = QPushButton(ImportDICOMPanelWidget)
+        self.importDICOMCancelButton.setObjectName(u"importDICOMCancelButton")
+        self.importDICOMCancelButton.setEnabled(False)
+        self.importDICOMCancelButton.setGeometry(QRect(580, 100, 75, 24))
+        self.importDICOMCancelButton.setFont(font)
+        self.importDICOMProgressBar = QProgressBar(ImportDICOMPanelWidget)
+        self.importDICOMProgressBar.setObjectName(u"importDICOMProgressBar")
+        self.importDICOMProgressBar.setGeometry(QRect(330, 130, 325, 16))
+        self.importDICOMProgressBar.setFont(font)
+        self.importDICOMProgressBar.setValue(0)
 
         self.retranslateUi(ImportDICOMPanelWidget)
 
@@ -74,13 +85,14 @@ class Ui_ImportDICOMPanelWidget(object):
 "<p style=\" margin-top:12px; margin-bottom:12px; margin-left:0px; margin-right:0px; -qt-block-indent:0; text-indent:0px;\"><span style=\" font-family:'Segoe UI'; font-weight:700;\">Import DICOM</span></p>\n"
 "<p style=\" margin-top:12px; margin-bottom:12px; margin-left:0px; margin-right:0px; -qt-block-indent:0; text-indent:0px;\"><span style=\" font-family:'Segoe UI';\">Select an input directory that contains the DICOM objects. That input directory and its subdirectories will be searched for DICOM objects that can be converted to images.</span></p>\n"
 "<p style=\" margin-top:12px; margin-bottom:12px; margin-left:0px; margin-right:0px; -qt-block-indent:0;"
-                        " text-indent:0px;\"><span style=\" font-family:'Segoe UI';\">Select an output directory for storing the converted images. A hierarchy of subdirectories will be automatically created that correspond to the &lt;PatientName&gt;/&lt;StudyID&gt;-&lt;StudyDescription&gt;-&lt;StudyDate&gt;/&lt;Modality&gt;/&lt;SeriesNumber&gt;-&lt;SeriesDescription&gt;-&lt;InstanceNumber&gt;.dcm</span></p>\n"
-"<p style=\" margin-top:12px; margin-bottom:12px; margin-left:0px; margin-right:0px; -qt-block-indent:0; text-indent:0px;\"><span style=\" font-family:'Segoe UI';\">Optionally, the data can be automatically registered with Minder3D and made available for one-click loading via the image browser table.</span></p></body></html>", None))
+                        " text-indent:0px;\"><span style=\" font-family:'Segoe UI';\">Select an output directory for storing the converted images. A hierarchy of subdirectories will be automatically created that correspond to the &lt;PatientName&gt;/&lt;StudyID&gt;-&lt;StudyDescription&gt;-&lt;StudyDate&gt;/&lt;Modality&gt;/&lt;SeriesNumber&gt;-&lt;SeriesDescription&gt;/&lt;InstanceNumber&gt;.dcm. The DICOM files are linked, or copied, into that hierarchy, and each series is converted to a single compressed volume, &lt;SeriesNumber&gt;-&lt;SeriesDescription&gt;.nii.gz, next to its directory.</span></p>\n"
+"<p style=\" margin-top:12px; margin-bottom:12px; margin-left:0px; margin-right:0px; -qt-block-indent:0; text-indent:0px;\"><span style=\" font-family:'Segoe UI';\">Optionally, the converted volumes can be automatically registered with Minder3D and made available for one-click loading via the image browser table.</span></p></body></html>", None))
         self.importDICOMInputDirectoryLabel.setText(QCoreApplication.translate("ImportDICOMPanelWidget", u"Input Directory:", None))
         self.importDICOMInputDirectorySelectButton.setText(QCoreApplication.translate("ImportDICOMPanelWidget", u"...", None))
         self.importDICOMOutputDirectorySelectButton.setText(QCoreApplication.translate("ImportDICOMPanelWidget", u"...", None))
         self.importDICOMOutputDirectoryLabel.setText(QCoreApplication.translate("ImportDICOMPanelWidget", u"Output Directory:", None))
         self.importDICOMAutoRegisterCheckBox.setText(QCoreApplication.translate("ImportDICOMPanelWidget", u"Automatically register", None))
         self.importDICOMRunButton.setText(QCoreApplication.translate("ImportDICOMPanelWidget", u"Run", None))
+        self.importDICOMCancelButton.setText(QCoreApplication.translate("ImportDICOMPanelWidget", u"Cancel", None))
     # retranslateUi
 
@@ -32,10 +32,6 @@ class Ui_NewTaskPanelWidget(object):
         self.newTaskImageProcessButton.setObjectName(u"newTaskImageProcessButton")
         self.newTaskImageProcessButton.setGeometry(QRect(380, 20, 151, 24))
         self.newTaskImageProcessButton.setFont(font)
-        self.newTaskIndexedOrgansButton = QPushButton(NewTaskPanelWidget)
-        self.newTaskIndexedOrgansButton.setObjectName(u"newTaskIndexedOrgansButton")
-        self.newTaskIndexedOrgansButton.setGeometry(QRect(20, 50, 171, 24))
-        self.newTaskIndexedOrgansButton.setFont(font)
         self.newTaskTotalSegmentatorButton = QPushButton(NewTaskPanelWidget)
         self.newTaskTotalSegmentatorButton.setObjectName(u"newTaskTotalSegmentatorButton")
         self.newTaskTotalSegmentatorButton.setGeometry(QRect(20, 20, 171, 24))
@@ -50,7 +46,6 @@ class Ui_NewTaskPanelWidget(object):
         NewTaskPanelWidget.setWindowTitle(QCoreApplication.translate("NewTaskPanelWidget", u"Form", None))
         self.newTaskOtsuButton.setText(QCoreApplication.translate("NewTaskPanelWidget", u"Otsu Threshold", None))
         self.newTaskImageProcessButton.setText(QCoreApplication.translate("NewTaskPanelWidget", u"Image Preprocessing", None))
-        self.newTaskIndexedOrgansButton.setText(QCoreApplication.translate("NewTaskPanelWidget", u"Indexed Organ Statistics", None))
         self.newTaskTotalSegmentatorButton.setText(QCoreApplication.translate("NewTaskPanelWidget", u"Total Segmentator", None))
     # retranslateUi
 
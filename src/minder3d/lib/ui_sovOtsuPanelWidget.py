@@ -15,8 +15,8 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
     QFont, QFontDatabase, QGradient, QIcon,
     QImage, QKeySequence, QLinearGradient, QPainter,
     QPalette, QPixmap, QRadialGradient, QTransform)
-from PySide6.QtWidgets import (QApplication, QLabel, QPushButton, QSizePolicy,
-    QSpinBox, QWidget)
+from PySide6.QtWidgets import (QApplication, QCheckBox, QLabel, QPushButton,
+    QSizePolicy, QSpinBox, QWidget)
 
 class Ui_OtsuPanelWidget(object):
     def setupUi(self, OtsuPanelWidget):
@@ -34,6 +34,9 @@ class Ui_OtsuPanelWidget(object):
         self.otsuNumberOfThresholdsLabel = QLabel(OtsuPanelWidget)
         self.otsuNumberOfThresholdsLabel.setObjectName(u"otsuNumberOfThresholdsLabel")
         self.otsuNumberOfThresholdsLabel.setGeometry(QRect(20, 13, 131, 16))
+        self.otsuPreviewCheckBox = QCheckBox(OtsuPanelWidget)
+        self.otsuPreviewCheckBox.setObjectName(u"otsuPreviewCheckBox")
+        self.otsuPreviewCheckBox.setGeometry(QRect(220, 10, 141, 22))
 
         self.retranslateUi(OtsuPanelWidget)
 
@@ -44,5 +47,6 @@ class Ui_OtsuPanelWidget(object):
         OtsuPanelWidget.setWindowTitle(QCoreApplication.translate("OtsuPanelWidget", u"Form", None))
         self.otsuRunButton.setText(QCoreApplication.translate("OtsuPanelWidget", u"Run Otsu Threshold", None))
         self.otsuNumberOfThresholdsLabel.setText(QCoreApplication.translate("OtsuPanelWidget", u"Number of thresholds:", None))
+        self.otsuPreviewCheckBox.setText(QCoreApplication.translate("OtsuPanelWidget", u"Preview Slice", None))
     # retranslateUi
 
@@ -15,7 +15,9 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
     QFont, QFontDatabase, QGradient, QIcon,
     QImage, QKeySequence, QLinearGradient, QPainter,
     QPalette, QPixmap, QRadialGradient, QTransform)
-from PySide6.QtWidgets import (QApplication, QPushButton, QSizePolicy, QWidget)
+from PySide6.QtWidgets import (QApplication, QCheckBox, QComboBox, QLabel,
+    QLineEdit, QPushButton, QSizePolicy, QSpinBox,
+    QWidget)
 
 class Ui_TotalSegmentatorPanelWidget(object):
     def setupUi(self, TotalSegmentatorPanelWidget):
@@ -28,6 +30,38 @@ class Ui_TotalSegmentatorPanelWidget(object):
         font = QFont()
         font.setPointSize(7)
         self.totalSegmentatorStep1Button.setFont(font)
+        self.totalSegmentatorFastCheckBox = QCheckBox(TotalSegmentatorPanelWidget)
+        self.totalSegmentatorFastCheckBox.setObjectName(u"totalSegmentatorFastCheckBox")
+        self.totalSegmentatorFastCheckBox.setGeometry(QRect(10, 5, 121, 20))
+        self.totalSegmentatorCropCheckBox = QCheckBox(TotalSegmentatorPanelWidget)
+        self.totalSegmentatorCropCheckBox.setObjectName(u"totalSegmentatorCropCheckBox")
+        self.totalSegmentatorCropCheckBox.setGeometry(QRect(140, 5, 121, 20))
+        self.totalSegmentatorWorkersLabel = QLabel(TotalSegmentatorPanelWidget)
+        self.totalSegmentatorWorkersLabel.setObjectName(u"totalSegmentatorWorkersLabel")
+        self.totalSegmentatorWorkersLabel.setGeometry(QRect(270, 5, 51, 20))
+        self.totalSegmentatorWorkersSpinBox = QSpinBox(TotalSegmentatorPanelWidget)
+        self.totalSegmentatorWorkersSpinBox.setObjectName(u"totalSegmentatorWorkersSpinBox")
+        self.totalSegmentatorWorkersSpinBox.setGeometry(QRect(320, 4, 42, 22))
+        self.totalSegmentatorWorkersSpinBox.setMaximum(256)
+        self.totalSegmentatorROISubsetLabel = QLabel(TotalSegmentatorPanelWidget)
+        self.totalSegmentatorROISubsetLabel.setObjectName(u"totalSegmentatorROISubsetLabel")
+        self.totalSegmentatorROISubsetLabel.setGeometry(QRect(10, 62, 51, 20))
+        self.totalSegmentatorROISubsetLineEdit = QLineEdit(TotalSegmentatorPanelWidget)
+        self.totalSegmentatorROISubsetLineEdit.setObjectName(u"totalSegmentatorROISubsetLineEdit")
+        self.totalSegmentatorROISubsetLineEdit.setGeometry(QRect(60, 60, 311, 22))
+        self.totalSegmentatorInterpolatorLabel = QLabel(TotalSegmentatorPanelWidget)
+        self.totalSegmentatorInterpolatorLabel.setObjectName(u"totalSegmentatorInterpolatorLabel")
+        self.totalSegmentatorInterpolatorLabel.setGeometry(QRect(10, 92, 61, 20))
+        self.totalSegmentatorInterpolatorComboBox = QComboBox(TotalSegmentatorPanelWidget)
+        self.totalSegmentatorInterpolatorComboBox.addItem("")
+        self.totalSegmentatorInterpolatorComboBox.addItem("")
+        self.totalSegmentatorInterpolatorComboBox.addItem("")
+        self.totalSegmentatorInterpolatorComboBox.addItem("")
+        self.totalSegmentatorInterpolatorComboBox.setObjectName(u"totalSegmentatorInterpolatorComboBox")
+        self.totalSegmentatorInterpolatorComboBox.setGeometry(QRect(70, 90, 121, 22))
+        self.totalSegmentatorKeepImageCheckBox = QCheckBox(TotalSegmentatorPanelWidget)
+        self.totalSegmentatorKeepImageCheckBox.setObjectName(u"totalSegmentatorKeepImageCheckBox")
+        self.totalSegmentatorKeepImageCheckBox.setGeometry(QRect(210, 90, 161, 22))
 
         self.retranslateUi(TotalSegmentatorPanelWidget)
 
@@ -37,5 +71,35 @@ class Ui_TotalSegmentatorPanelWidget(object):
     def retranslateUi(self, TotalSegmentatorPanelWidget):
         TotalSegmentatorPanelWidget.setWindowTitle(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Form", None))
         self.totalSegmentatorStep1Button.setText(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Run Total Segmentator", None))
+#if QT_CONFIG(tooltip)
+        self.totalSegmentatorFastCheckBox.setToolTip(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Use the 3 mm models: much faster, less accurate", None))
+#endif // QT_CONFIG(tooltip)
+        self.totalSegmentatorFastCheckBox.setText(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Fast (3 mm)", None))
+#if QT_CONFIG(tooltip)
+        self.totalSegmentatorCropCheckBox.setToolTip(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Segment only the region of interest of the image", None))
+#endif // QT_CONFIG(tooltip)
+        self.totalSegmentatorCropCheckBox.setText(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Crop to ROI", None))
+        self.totalSegmentatorWorkersLabel.setText(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Workers:", None))
+#if QT_CONFIG(tooltip)
+        self.totalSegmentatorWorkersSpinBox.setToolTip(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Number of resampling threads (0 for the compute settings)", None))
+#endif // QT_CONFIG(tooltip)
+        self.totalSegmentatorROISubsetLabel.setText(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Organs:", None))
+#if QT_CONFIG(tooltip)
+        self.totalSegmentatorROISubsetLineEdit.setToolTip(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Comma-separated TotalSegmentator structures, e.g., liver, spleen", None))
+#endif // QT_CONFIG(tooltip)
+        self.totalSegmentatorROISubsetLineEdit.setPlaceholderText(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"All organs", None))
+        self.totalSegmentatorInterpolatorLabel.setText(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Resampler:", None))
+        self.totalSegmentatorInterpolatorComboBox.setItemText(0, QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Linear", None))
+        self.totalSegmentatorInterpolatorComboBox.setItemText(1, QCoreApplication.translate("TotalSegmentatorPanelWidget", u"BSpline", None))
+        self.totalSegmentatorInterpolatorComboBox.setItemText(2, QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Sinc", None))
+        self.totalSegmentatorInterpolatorComboBox.setItemText(3, QCoreApplication.translate("TotalSegmentatorPanelWidget", u"NearestNeighbor", None))
+
+#if QT_CONFIG(tooltip)
+        self.totalSegmentatorInterpolatorComboBox.setToolTip(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Interpolator used to resample the image for the models", None))
+#endif // QT_CONFIG(tooltip)
+#if QT_CONFIG(tooltip)
+        self.totalSegmentatorKeepImageCheckBox.setToolTip(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Add the resampled image to the image list", None))
+#endif // QT_CONFIG(tooltip)
+        self.totalSegmentatorKeepImageCheckBox.setText(QCoreApplication.translate("TotalSegmentatorPanelWidget", u"Keep Iso Image", None))
     # retranslateUi
 
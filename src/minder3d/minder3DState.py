@@ -29,6 +29,10 @@ class Minder3DState:
         self.image_filename = []
         self.image_thumbnail = []
         self.image_label = []
+        self.image_pyramid = []
+        # Region of interest of each image, [[x0, y0, z0], [x1, y1, z1]]
+        # inclusive index bounds, or None for the whole image
+        self.roi = []
         self.csa_to_image_axis = []
 
         # Overlay
@@ -49,6 +53,9 @@ class Minder3DState:
         self.view2D_image_axis_order = []
         self.view2D_overlay_opacity = 0.5
         self.view2D_overlay_auto_update = True
+        # (image num, view image axis, slice num, RGBA slice array) drawn
+        # over the overlay of that slice only, e.g., by the Otsu preview
+        self.view2D_overlay_preview = None
 
         # 3D View settings
         self.view3D_scene_auto_update = True
@@ -4,30 +4,40 @@ import itk
 import itk.itkGDCMImageIOPython
 import numpy as np
 import vtk
-from PySide6.QtCore import QCoreApplication, QFileInfo
+from PySide6.QtCore import QCoreApplication, QFileInfo, Qt
 from PySide6.QtWidgets import (
     QFileDialog,
     QInputDialog,
     QMainWindow,
+    QMenu,
     QSizePolicy,
     QTabBar,
 )
 
+from .lib.sovImageProcessExecutor import ImageProcessExecutor
+from .lib.sovImagePyramid import ImagePyramid
 from .lib.sovImageTablePanelWidget import ImageTablePanelWidget
 from .lib.sovImportExportPanelWidget import ImportExportPanelWidget
 from .lib.sovInfoTablePanelWidget import InfoTablePanelWidget
 from .lib.sovNewTaskPanelWidget import NewTaskPanelWidget
 from .lib.sovObjectPanelWidget import ObjectPanelWidget
+from .lib.sovSceneFile import (
+    SCENE_FILE_FILTER,
+    apply_scene_objects,
+    discard_unloaded_scene_objects,
+    read_scene,
+    read_scene_objects,
+    write_scene,
+)
+from .lib.sovTaskRunner import TaskRunner
+from .lib.sovTotalSegmentatorSession import stop_total_segmentator_session
 from .lib.sovUtils import (
     LogWindow,
     add_objects_in_mask_image_to_scene,
-    compress_scene_for_saving,
     get_children_as_list,
-    read_group,
     resample_overlay_to_match_image,
+    sov_log,
     time_and_log,
-    uncompress_scene_after_loading,
-    write_group,
 )
 from .lib.sovView2DPanelWidget import View2DPanelWidget
 from .lib.sovView3DPanelWidget import View3DPanelWidget
@@ -35,6 +45,9 @@ from .lib.sovVisualizationPanelWidget import VisualizationPanelWidget
 from .minder3DState import Minder3DState
 from .ui_minder3DWindow import Ui_MainWindow
 
+# The maximum time to wait for cancelled tasks to stop when closing
+TASK_SHUTDOWN_MSECS = 5000
+
 
 class Minder3DWindow(QMainWindow, Ui_MainWindow):
     def __init__(self, parent=None):
@@ -108,7 +121,6 @@ class Minder3DWindow(QMainWindow, Ui_MainWindow):
         self.importDICOMPanel = None
         self.importExportPanel = None
         self.totalSegmentatorPanel = None
-        self.indexedOrgansPanel = None
         self.otsuPanel = None
         self.imageProcessPanel = None
 
@@ -128,6 +140,22 @@ class Minder3DWindow(QMainWindow, Ui_MainWindow):
 
         self.statusText.setText('Ready')
 
+        # Long panel actions run off the GUI thread; the status bar shows
+        # the queued and running jobs.
+        self.task_runner = TaskRunner(parent=self)
+        self.task_runner.jobs_changed.connect(self.update_task_status)
+        self.task_runner.job_progress.connect(self.update_task_progress)
+        # The jobs are cancelled from the context menu of the progress bar
+        self.statusProgressBar.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.statusProgressBar.customContextMenuRequested.connect(
+            self.show_task_menu
+        )
+        self.image_process_executor = ImageProcessExecutor()
+        # Missing thumbnails are made by the executor's worker processes
+        self.imageTablePanel.settings.thumbnail_cache.set_executor(
+            self.image_process_executor
+        )
+
         self.file_dialog = None
 
         self.show()
@@ -141,6 +169,17 @@ class Minder3DWindow(QMainWindow, Ui_MainWindow):
         tab.close()
 
     def closeEvent(self, QCloseEvent):
+        # Jobs busy in a long step are not waited for: main() exits the
+        # process without waiting for their threads.
+        running_job_names = self.task_runner.shutdown(TASK_SHUTDOWN_MSECS)
+        if len(running_job_names) > 0:
+            sov_log(
+                'Exiting while tasks are still running: '
+                + ', '.join(running_job_names),
+                'warning',
+            )
+        self.image_process_executor.shutdown(wait=len(running_job_names) == 0)
+        stop_total_segmentator_session()
         super().closeEvent(QCloseEvent)
         self.view2DPanel.close()
         self.view3DPanel.close()
@@ -164,6 +203,63 @@ class Minder3DWindow(QMainWindow, Ui_MainWindow):
         self.statusText.update()
         self.log_window.log(message, level)
 
+    def update_task_status(self, num_queued, num_running, name):
+        """Show the number of queued and running jobs in the status bar.
+
+        Args:
+            num_queued (int): The number of jobs waiting to run.
+            num_running (int): The number of jobs running.
+            name (str): The name of the job that changed state.
+        """
+        if num_queued + num_running == 0:
+            self.statusProgressBar.setRange(0, 100)
+            self.statusProgressBar.setValue(0)
+            self.statusProgressBar.setTextVisible(False)
+            self.statusProgressBar.setToolTip('')
+            return
+        status = f'{name}: {num_running} running, {num_queued} queued'
+        # Busy indicator until the job reports its progress
+        self.statusProgressBar.setRange(0, 0)
+        self.statusProgressBar.setFormat(status)
+        self.statusProgressBar.setTextVisible(True)
+        self.statusProgressBar.setToolTip(f'{status} (right-click to cancel)')
+
+    def show_task_menu(self, pos):
+        """Show the queued and running jobs, to cancel them.
+
+        Args:
+            pos (QPoint): The position of the click in the progress bar.
+        """
+        job_names = self.task_runner.get_job_names()
+        if len(job_names) == 0:
+            return
+        menu = QMenu(self)
+        for job_id, name in job_names.items():
+            action = menu.addAction(f'Cancel {name}')
+            action.triggered.connect(
+                lambda checked=False, job_id=job_id: self.task_runner.cancel(
+                    job_id
+                )
+            )
+        menu.addSeparator()
+        menu.addAction('Cancel All').triggered.connect(
+            self.task_runner.cancel_all
+        )
+        menu.exec(self.statusProgressBar.mapToGlobal(pos))
+
+    def update_task_progress(self, job_id, fraction, message):
+        """Show the progress reported by a running job.
+
+        Args:
+            job_id (int): The id of the job.
+            fraction (float): The fraction of the job completed.
+            message (str): A short description of the current step.
+        """
+        self.statusProgressBar.setRange(0, 100)
+        self.statusProgressBar.setValue(int(fraction * 100))
+        if message != '':
+            self.log(message)
+
     def file_dir_dialog_switcher(self, str):
         """Open a file dialog to select a directory or a file.
 
@@ -262,20 +358,45 @@ class Minder3DWindow(QMainWindow, Ui_MainWindow):
         """
         if not filename:
             filename, _ = QFileDialog.getOpenFileName(
-                self, 'Open File', self.state.scene_filename, 'All Files (*)'
+                self,
+                'Open File',
+                self.state.scene_filename,
+                SCENE_FILE_FILTER,
             )
         if filename:
             filename = os.path.abspath(filename)
             self.state.scene_filename = filename
-            self.state.scene = read_group(filename)
+            self.state.scene = read_scene(filename, lazy=True)
             if self.state.scene is None:
                 self.log('Scene could not be loaded.', 'error')
                 return
+            discard_unloaded_scene_objects(self.state.scene_list)
 
-            self.state.scene = uncompress_scene_after_loading(self.state.scene)
-            self.update_scene()
-
+            # List the objects immediately, and render them once their
+            # geometry has been loaded in the background.  Objects selected
+            # in the meantime are loaded first.
+            self.update_scene(update_views=False)
             self.imageTablePanel.load_scene()
+            # The geometry is read by the task, and set on the objects of
+            # the scene on the GUI thread, which renders them.
+            scene = self.state.scene
+            self.task_runner.submit(
+                read_scene_objects,
+                scene,
+                name='Load Scene',
+                on_result=lambda so_geometry_list: self.load_scene_done(
+                    so_geometry_list, scene, filename
+                ),
+            )
+
+    @time_and_log
+    def load_scene_done(self, so_geometry_list, scene, filename):
+        if scene is not self.state.scene:
+            return
+        apply_scene_objects(so_geometry_list)
+        self.update_scene_views()
+        # Replace the thumbnail taken before the objects were rendered
+        self.imageTablePanel.save_scene(filename)
 
     @time_and_log
     def save_image(self, filename=None):
@@ -376,13 +497,15 @@ class Minder3DWindow(QMainWindow, Ui_MainWindow):
         """
         if not filename:
             filename, _ = QFileDialog.getSaveFileName(
-                self, 'Save File', self.state.scene_filename, 'All Files (*)'
+                self,
+                'Save File',
+                self.state.scene_filename,
+                SCENE_FILE_FILTER,
             )
         if filename:
             self.state.scene_filename = os.path.abspath(filename)
             self.log(f'Saving scene to {filename}')
-            new_scene = compress_scene_for_saving(self.state.scene)
-            write_group(new_scene, filename)
+            write_scene(self.state.scene, filename)
             self.imageTablePanel.save_scene(filename)
 
     @time_and_log
@@ -420,6 +543,10 @@ class Minder3DWindow(QMainWindow, Ui_MainWindow):
         self.state.image_array.append(
             itk.GetArrayFromImage(self.state.image[-1])
         )
+        self.state.image_pyramid.append(
+            ImagePyramid(self.state.image_array[-1])
+        )
+        self.state.roi.append(None)
         self.state.image_min.append(float(np.min(self.state.image_array[-1])))
         self.state.image_max.append(float(np.max(self.state.image_array[-1])))
 
@@ -479,6 +606,10 @@ class Minder3DWindow(QMainWindow, Ui_MainWindow):
         self.state.image[num] = img
 
         self.state.image_array[num] = itk.GetArrayFromImage(img)
+        self.state.image_pyramid[num] = ImagePyramid(
+            self.state.image_array[num]
+        )
+        self.state.roi[num] = None
         self.state.image_min[num] = float(np.min(self.state.image_array[num]))
         self.state.image_max[num] = float(np.max(self.state.image_array[num]))
 
@@ -509,7 +640,7 @@ class Minder3DWindow(QMainWindow, Ui_MainWindow):
         self.view2DPanel.update_overlay()
 
     @time_and_log
-    def update_scene(self):
+    def update_scene(self, update_views=True):
         """Update the scene with the latest changes.
 
         This method updates the scene by updating the scene list, scene list
@@ -520,6 +651,8 @@ class Minder3DWindow(QMainWindow, Ui_MainWindow):
 
         Args:
             self: The object instance.
+            update_views (bool?): Update the 2D and 3D views.  Defaults to
+                True.
         """
 
         self.state.scene_list = get_children_as_list(self.state.scene)
@@ -538,12 +671,18 @@ class Minder3DWindow(QMainWindow, Ui_MainWindow):
                     'Name', f'{so.GetTypeName()} {so.GetId()}'
                 )
 
+        if update_views:
+            self.update_scene_views()
+        self.imageTablePanel.update_scene()
+        self.objectPanel.update_scene()
+
+    @time_and_log
+    def update_scene_views(self):
+        """Update the 2D and 3D views of the scene, if auto-updated."""
         if self.state.view2D_overlay_auto_update:
             self.view2DPanel.update_scene()
         if self.state.view3D_scene_auto_update:
             self.view3DPanel.update_scene()
-        self.imageTablePanel.update_scene()
-        self.objectPanel.update_scene()
 
     @time_and_log
     def redraw_object(
@@ -587,6 +726,8 @@ class Minder3DWindow(QMainWindow, Ui_MainWindow):
 
         self.state.image.pop(img_num)
         self.state.image_array.pop(img_num)
+        self.state.image_pyramid.pop(img_num)
+        self.state.roi.pop(img_num)
         self.state.image_min.pop(img_num)
         self.state.image_max.pop(img_num)
         self.state.image_filename.pop(img_num)
@@ -619,6 +760,7 @@ class Minder3DWindow(QMainWindow, Ui_MainWindow):
         """
         This function deletes the all objects from the scene
         """
+        discard_unloaded_scene_objects(self.state.scene_list)
         for scene_idx in range(len(self.state.scene_list)):
             so_id = self.state.scene_list_ids[scene_idx]
             if so_id == -1:
@@ -22,6 +22,53 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         '--load-scene', type=str, required=False, help='Path to scene'
     )
+    parser.add_argument(
+        '--itk-threads',
+        type=int,
+        required=False,
+        help="ITK's global default number of threads",
+    )
+    parser.add_argument(
+        '--itk-work-units',
+        type=int,
+        required=False,
+        help='Number of work units of ITK filters',
+    )
+    parser.add_argument(
+        '--vtk-smp-backend',
+        type=str,
+        required=False,
+        help='vtkSMPTools backend (STDThread, TBB, OpenMP, or Sequential)',
+    )
+    parser.add_argument(
+        '--vtk-smp-threads',
+        type=int,
+        required=False,
+        help='Number of threads of vtkSMPTools',
+    )
+    parser.add_argument(
+        '--blas-threads',
+        type=int,
+        required=False,
+        help='Number of threads of NumPy/BLAS',
+    )
+    parser.add_argument(
+        '--ai-threads',
+        type=int,
+        required=False,
+        help='Number of threads of the AI segmentation session',
+    )
+    parser.add_argument(
+        '--ai-device',
+        type=str,
+        required=False,
+        help='Device of the AI segmentation session (cpu or cuda)',
+    )
+    parser.add_argument(
+        '--save-compute-settings',
+        action='store_true',
+        help='Store the given thread settings as the new defaults',
+    )
 
     args = parser.parse_args()
 
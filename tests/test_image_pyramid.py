@@ -0,0 +1,58 @@
+"""Check that the pyramid levels are displayed where their voxels are."""
+
+import numpy as np
+import pytest
+
+sovImagePyramid = pytest.importorskip('minder3d.lib.sovImagePyramid')
+
+
+def get_displayed_value(pyramid, factor, position, spacing, flipped):
+    """Get the value of the level voxel displayed at a position along x.
+
+    The level row is displayed as done by the 2D view: flipped if needed,
+    with its first voxel at the level offset and the level spacing.
+    """
+    size = pyramid.image_array.shape[2]
+    level_row = pyramid.get_level(factor)[0, 0]
+    level_factor = pyramid.get_level_factors(factor)[2]
+    if flipped:
+        level_row = level_row[::-1]
+    origin = spacing * sovImagePyramid.get_level_offset(
+        size, len(level_row), level_factor, flipped
+    )
+    displayed_num = int(
+        np.floor((position - origin) / (spacing * level_factor) + 0.5)
+    )
+    if displayed_num < 0 or displayed_num >= len(level_row):
+        return None
+    return level_row[displayed_num]
+
+
+@pytest.mark.parametrize('size', [64, 66, 67, 71])
+@pytest.mark.parametrize('flipped', [False, True])
+def test_pick_at_coarse_level_matches_full_resolution(size, flipped):
+    spacing = 0.7
+    image_array = np.arange(size, dtype=np.float32).reshape(1, 1, size)
+    image_array = np.repeat(np.repeat(image_array, 8, axis=0), 8, axis=1)
+    pyramid = sovImagePyramid.ImagePyramid(image_array)
+
+    for position in np.linspace(-spacing, size * spacing, 1000):
+        index = sovImagePyramid.get_view_index(position, size, spacing, flipped)
+        if index < 0 or index >= size:
+            continue
+        # The full resolution voxel displayed is the one picked
+        assert (
+            get_displayed_value(pyramid, 1, position, spacing, flipped) == index
+        )
+        # The level voxel displayed averages the voxel picked
+        for factor in (2, 4, 8):
+            value = get_displayed_value(
+                pyramid, factor, position, spacing, flipped
+            )
+            if value is None:
+                # Past the voxels dropped at the far edge of the level
+                assert index >= (size // factor) * factor
+                continue
+            block_start = int(value - (factor - 1) / 2)
+            assert block_start % factor == 0
+            assert block_start <= index < block_start + factor
@@ -0,0 +1,128 @@
+"""Check that MetaIO scenes read lazily match the ITK reader."""
+
+import numpy as np
+import pytest
+
+itk = pytest.importorskip('itk')
+sovSceneFile = pytest.importorskip('minder3d.lib.sovSceneFile')
+sovUtils = pytest.importorskip('minder3d.lib.sovUtils')
+
+POINT_DIM = (
+    'id x y z red green blue alpha mark r rn mn bn cv lv ro in '
+    'tx ty tz v1x v1y v1z v2x v2y v2z a1 a2 a3'
+)
+
+
+def make_tube(tube_id, parent_id, spacing, points, last=False):
+    lines = [
+        'ObjectType = Tube',
+        'NDims = 3',
+        f'Name = vessel {tube_id}',
+        f'ID = {tube_id}',
+        f'ParentID = {parent_id}',
+        f'Color = 0 1 0.5 1',
+        'BinaryData = False',
+        'TransformMatrix = 1 0 0 0 1 0 0 0 1',
+        'Offset = 0 0 0',
+        'CenterOfRotation = 0 0 0',
+        f'ElementSpacing = {spacing}',
+        'Root = True',
+        'Artery = True',
+        f'PointDim = {POINT_DIM}',
+        f'NPoints = {len(points)}',
+        'Points = ',
+    ]
+    lines += [' '.join(str(value) for value in point) for point in points]
+    text = '\n'.join(lines)
+    return text if last else text + '\n'
+
+
+def make_points(number_of_points, seed):
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0, 10, (number_of_points, 29)).round(3)
+    points[:, 0] = -1
+    return points
+
+
+def write_metaio_scene(filename, tubes):
+    text = (
+        'ObjectType = Scene\nNDims = 3\n'
+        f'NObjects = {len(tubes) + 2}\n'
+        'ObjectType = Group\nNDims = 3\nBinaryData = False\n'
+        'TransformMatrix = 1 0 0 0 1 0 0 0 1\nOffset = 0 0 0\n'
+        'ElementSpacing = 1 1 1\nEndGroup = \n'
+        'ObjectType = Group\nNDims = 3\nName = vessels\nID = 0\n'
+        'BinaryData = False\nElementSpacing = 1 1 1\nEndGroup = \n'
+    )
+    for tube_num, (spacing, points) in enumerate(tubes):
+        text += make_tube(
+            tube_num + 1,
+            0,
+            spacing,
+            points,
+            last=tube_num == len(tubes) - 1,
+        )
+    with open(filename, 'w') as metaio_file:
+        metaio_file.write(text)
+
+
+def get_tubes_by_id(scene):
+    return {
+        so.GetId(): so
+        for so in sovUtils.get_children_as_list(scene)
+        if so.GetTypeName() == 'TubeSpatialObject'
+    }
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_metaio_scene_matches_itk_reader(tmp_path, lazy):
+    filename = str(tmp_path / 'vessels.tre')
+    write_metaio_scene(
+        filename,
+        [
+            ('1 1 1', make_points(5, 0)),
+            ('0.5 2 3', make_points(3000, 1)),
+            ('1 1 1', make_points(0, 2)),
+            ('2 2 2', make_points(7, 3)),
+        ],
+    )
+    reader = itk.SpatialObjectReader[3].New()
+    reader.SetFileName(filename)
+    reader.Update()
+    expected_tubes = get_tubes_by_id(reader.GetGroup())
+
+    scene = sovSceneFile.read_metaio_scene_file(filename, lazy=lazy)
+    tubes = get_tubes_by_id(scene)
+    assert sorted(tubes) == sorted(expected_tubes)
+    if lazy:
+        assert not sovSceneFile.is_scene_object_loaded(tubes[2])
+        assert len(tubes[2].GetPoints()) == 0
+        sovSceneFile.load_scene_object(tubes[2])
+        assert sovSceneFile.is_scene_object_loaded(tubes[2])
+        sovSceneFile.load_scene_objects(scene)
+    for tube_id, tube in tubes.items():
+        expected_tube = expected_tubes[tube_id]
+        assert tube.GetParentId() == 0
+        assert sovUtils.get_object_name(tube) == sovUtils.get_object_name(
+            expected_tube
+        )
+        np.testing.assert_allclose(
+            list(tube.GetProperty().GetColor()),
+            list(expected_tube.GetProperty().GetColor()),
+        )
+        assert tube.GetRoot()
+        np.testing.assert_allclose(
+            sovSceneFile.get_tube_point_array(tube),
+            sovSceneFile.get_tube_point_array(expected_tube),
+            rtol=1e-6,
+        )
+
+
+def test_metaio_scene_with_other_objects_is_not_indexed(tmp_path):
+    filename = str(tmp_path / 'image.tre')
+    with open(filename, 'w') as metaio_file:
+        metaio_file.write(
+            'ObjectType = Scene\nNDims = 3\nNObjects = 1\n'
+            'ObjectType = Image\nNDims = 3\nID = 1\n'
+        )
+    assert sovSceneFile.read_metaio_scene_file(filename) is None
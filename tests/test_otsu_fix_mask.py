@@ -0,0 +1,70 @@
+"""Check that OtsuLogic.fix_mask() matches the original np.where relabeling."""
+
+import numpy as np
+import pytest
+
+itk = pytest.importorskip('itk')
+sovOtsuLogic = pytest.importorskip('minder3d.lib.sovOtsuLogic')
+
+
+def fix_mask_array_oracle(mask_arr):
+    """The np.where implementation fix_mask() replaced."""
+    mask_values = np.unique(mask_arr)
+
+    new_mask_arr = mask_arr.copy()
+
+    for i in range(len(mask_values)):
+        indexes = np.where(mask_arr == mask_values[i])
+        new_mask_arr[indexes] = i
+    corner_value = new_mask_arr[0, 0, 0]
+    if corner_value != 0:
+        indexes_wrong_bg = np.where(new_mask_arr == 0)
+        indexes_wrong_fg = np.where(new_mask_arr == corner_value)
+        new_mask_arr[indexes_wrong_bg] = corner_value
+        new_mask_arr[indexes_wrong_fg] = 0
+    return new_mask_arr
+
+
+def make_mask_array(values, dtype, corner_value, seed=0):
+    rng = np.random.default_rng(seed)
+    mask_arr = rng.choice(np.array(values, dtype=dtype), size=(6, 7, 8))
+    mask_arr[0, 0, 0] = corner_value
+    return mask_arr
+
+
+@pytest.mark.parametrize(
+    'values, dtype, corner_value',
+    [
+        ([0, 1, 2], np.uint8, 0),
+        ([0, 1, 2, 3], np.uint8, 2),
+        ([3, 7, 200, 255], np.uint8, 200),
+        ([1, 2], np.uint8, 1),
+        ([-500, -3, 0, 42, 1000], np.int16, 42),
+        ([-7, 5, 900], np.int16, -7),
+        ([0.0, 0.5, 2.25, 10.0], np.float32, 2.25),
+        ([-1.5, 3.0, 8.0], np.float32, 8.0),
+    ],
+)
+def test_fix_mask_matches_oracle(values, dtype, corner_value):
+    mask_arr = make_mask_array(values, dtype, corner_value)
+    expected = fix_mask_array_oracle(mask_arr)
+
+    mask_img = itk.GetImageFromArray(mask_arr)
+    mask_img.SetSpacing([0.5, 1.0, 2.0])
+    mask_img.SetOrigin([1.0, -2.0, 3.0])
+    new_img = sovOtsuLogic.OtsuLogic().fix_mask(mask_img)
+    new_arr = itk.GetArrayViewFromImage(new_img)
+
+    assert new_arr.dtype == expected.dtype
+    np.testing.assert_array_equal(new_arr, expected)
+    assert new_arr[0, 0, 0] == 0
+    assert tuple(new_img.GetSpacing()) == tuple(mask_img.GetSpacing())
+    assert tuple(new_img.GetOrigin()) == tuple(mask_img.GetOrigin())
+
+
+def test_fix_mask_single_value():
+    mask_arr = np.full((3, 4, 5), 9, dtype=np.uint8)
+    new_img = sovOtsuLogic.OtsuLogic().fix_mask(itk.GetImageFromArray(mask_arr))
+    np.testing.assert_array_equal(
+        itk.GetArrayViewFromImage(new_img), fix_mask_array_oracle(mask_arr)
+    )
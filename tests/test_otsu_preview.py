@@ -0,0 +1,67 @@
+"""Check that the Otsu preview shows the labels that run() commits."""
+
+import numpy as np
+import pytest
+
+itk = pytest.importorskip('itk')
+sovOtsuLogic = pytest.importorskip('minder3d.lib.sovOtsuLogic')
+
+
+def make_image(array):
+    image = itk.GetImageFromArray(array)
+    image.SetSpacing([0.5, 1.0, 2.0])
+    return image
+
+
+def check_preview_matches_run(image, number_of_thresholds, roi=None):
+    logic = sovOtsuLogic.OtsuLogic()
+    label_array = itk.GetArrayFromImage(
+        logic.run(image, number_of_thresholds, roi=roi)
+    )
+    input_array = logic.get_input_array(image, roi)
+    for z in range(input_array.shape[0]):
+        np.testing.assert_array_equal(
+            logic.preview_slice(
+                image, input_array[z], number_of_thresholds, roi
+            ),
+            label_array[z],
+        )
+
+    # The labels are consecutive, with the corner voxel as background
+    raw_array = np.digitize(
+        input_array,
+        logic.compute_thresholds(image, number_of_thresholds, roi),
+    ).astype(np.uint8)
+    fixed_image = logic.fix_mask(itk.GetImageFromArray(raw_array))
+    np.testing.assert_array_equal(
+        itk.GetArrayViewFromImage(fixed_image), label_array
+    )
+    return label_array
+
+
+@pytest.mark.parametrize('number_of_thresholds', [1, 2, 3, 5])
+def test_preview_matches_run_with_empty_classes(number_of_thresholds):
+    # Few distinct values, so several classes are empty
+    rng = np.random.default_rng(1)
+    array = rng.choice(
+        np.array([0, 10, 11, 250], dtype=np.uint8), size=(8, 9, 10)
+    )
+    array[0, 0, 0] = 250
+    label_array = check_preview_matches_run(
+        make_image(array), number_of_thresholds
+    )
+    assert label_array[0, 0, 0] == 0
+
+
+def test_preview_matches_run_on_bin_edges():
+    # Integer values falling exactly on the edges of the histogram bins
+    array = np.tile(np.arange(256, dtype=np.int16), (4, 4, 1))
+    array[0, 0, 0] = 128
+    check_preview_matches_run(make_image(array), 3)
+
+
+def test_preview_matches_run_in_roi():
+    rng = np.random.default_rng(2)
+    array = rng.normal(100, 30, size=(10, 12, 14)).astype(np.float32)
+    array[2:6, 3:8, 4:9] += 200
+    check_preview_matches_run(make_image(array), 4, roi=[[2, 3, 1], [9, 8, 7]])